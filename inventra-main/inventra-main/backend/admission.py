@@ -0,0 +1,246 @@
+import os
+import math
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from flask import request, jsonify
+
+# Detections running at once per server process. Inference is serialized per
+# model anyway, so more only moves the wait from the queue into the model
+DETECT_CONCURRENCY = int(os.getenv('INVENTRA_DETECT_CONCURRENCY', 1))
+# Detections waiting for a slot per process. Keep concurrency + queue below the
+# threads per worker so inventory requests always find a free thread
+DETECT_QUEUE_SIZE = int(os.getenv('INVENTRA_DETECT_QUEUE_SIZE', 2))
+# Longest a detection may wait for a slot, in seconds; requests expected to
+# wait longer are rejected right away instead of timing out on the client
+DETECT_LATENCY_BUDGET = float(os.getenv('INVENTRA_DETECT_LATENCY_BUDGET', 10))
+# Sustained detections per second and burst allowed per client (0 disables).
+# Off by default: clients behind a reverse proxy or a shared NAT all look alike
+DETECT_RATE_LIMIT = float(os.getenv('INVENTRA_DETECT_RATE_LIMIT', 0))
+DETECT_RATE_BURST = int(os.getenv('INVENTRA_DETECT_RATE_BURST', 5))
+# Request header identifying the client for the rate limit (e.g. a device or
+# user ID set by the frontend or the proxy); the client address when unset
+DETECT_RATE_KEY_HEADER = os.getenv('INVENTRA_DETECT_RATE_KEY_HEADER', '')
+
+# Idle clients are forgotten once this many are tracked
+MAX_TRACKED_CLIENTS = 10000
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is not admitted.
+    """
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded wait queue and per-client rate limits.
+    
+    A request gets a slot right away if one is free, and otherwise waits in
+    the queue. It is rejected immediately (503) when the queue is full or its
+    expected wait, estimated from the recent time a slot is held, exceeds the
+    latency budget, and with 429 when its client exceeds the rate limit.
+    Rejections carry a Retry-After estimate.
+    """
+    def __init__(self, concurrency=DETECT_CONCURRENCY, queue_size=DETECT_QUEUE_SIZE,
+                 latency_budget=DETECT_LATENCY_BUDGET, rate=DETECT_RATE_LIMIT, burst=DETECT_RATE_BURST):
+        """
+        Args:
+            concurrency (int): Requests served at once
+            queue_size (int): Requests allowed to wait for a slot
+            latency_budget (float): Longest wait for a slot in seconds
+            rate (float): Requests per second per client (0 disables rate limiting)
+            burst (int): Requests a client may make at once after being idle
+        """
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.latency_budget = latency_budget
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.active = 0
+        self.waiting = 0
+        # Moving average of the seconds a request holds a slot
+        self.service_time = None
+        self.counts = {'admitted': 0, 'rate_limited': 0, 'shed': 0, 'timed_out': 0}
+        self._buckets = {}
+        self._condition = threading.Condition()
+    
+    def _expected_wait(self, position):
+        if self.service_time is None:
+            return 0.0
+        return position / self.concurrency * self.service_time
+    
+    def _take_token(self, client, now):
+        tokens, last = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            self.counts['rate_limited'] += 1
+            raise AdmissionRejected(429, 'Too many detection requests', (1 - tokens) / self.rate)
+        self._buckets[client] = (tokens - 1, now)
+        
+        if len(self._buckets) > MAX_TRACKED_CLIENTS:
+            # A client whose bucket has refilled is the same as a new one
+            self._buckets = {
+                key: (tokens, last) for key, (tokens, last) in self._buckets.items()
+                if tokens + (now - last) * self.rate < self.burst
+            }
+    
+    def _shed_if_backlogged(self):
+        # Called with the condition held, when no slot is free
+        expected_wait = self._expected_wait(self.waiting + 1)
+        if self.waiting >= self.queue_size:
+            self.counts['shed'] += 1
+            raise AdmissionRejected(503, 'Detection queue is full', expected_wait)
+        if expected_wait > self.latency_budget:
+            self.counts['shed'] += 1
+            raise AdmissionRejected(503, 'Detection backlog exceeds the latency budget', expected_wait)
+    
+    def check(self, client=None):
+        """
+        Reject a request that would not get a slot in time, without taking
+        one: charge the client's rate limit and check the queue. Lets a
+        request be turned away before its body is read.
+        
+        Args:
+            client (str): Client the rate limit applies to (e.g. its address)
+        
+        Raises:
+            AdmissionRejected: If the request is rate limited or shed
+        """
+        with self._condition:
+            if self.rate > 0 and client is not None:
+                self._take_token(client, time.monotonic())
+            if self.active < self.concurrency and self.waiting == 0:
+                return
+            self._shed_if_backlogged()
+    
+    def acquire(self, client=None):
+        """
+        Wait for a slot.
+        
+        Args:
+            client (str): Client the rate limit applies to (e.g. its address)
+        
+        Raises:
+            AdmissionRejected: If the request is rate limited or shed
+        """
+        with self._condition:
+            now = time.monotonic()
+            if self.rate > 0 and client is not None:
+                self._take_token(client, now)
+            
+            # Queued requests go first when a slot frees up
+            if self.active < self.concurrency and self.waiting == 0:
+                self.active += 1
+                self.counts['admitted'] += 1
+                return
+            
+            self._shed_if_backlogged()
+            
+            deadline = now + self.latency_budget
+            self.waiting += 1
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counts['timed_out'] += 1
+                        raise AdmissionRejected(
+                            503, 'Detection backlog exceeds the latency budget', self._expected_wait(self.waiting)
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.counts['admitted'] += 1
+    
+    def release(self, duration):
+        """
+        Free a slot.
+        
+        Args:
+            duration (float): Seconds the slot was held
+        """
+        with self._condition:
+            self.active -= 1
+            if self.service_time is None:
+                self.service_time = duration
+            else:
+                self.service_time = 0.8 * self.service_time + 0.2 * duration
+            self._condition.notify()
+    
+    @contextmanager
+    def slot(self):
+        """
+        Hold a slot for the duration of a with block (see acquire).
+        
+        Raises:
+            AdmissionRejected: If the request is shed
+        """
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+    
+    def status(self):
+        """
+        Returns:
+            dict: Active and waiting requests, limits, the average service
+                time and the admission counts
+        """
+        with self._condition:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'concurrency': self.concurrency,
+                'queue_size': self.queue_size,
+                'service_time': round(self.service_time, 4) if self.service_time is not None else None,
+                **self.counts
+            }
+
+def rate_limit_key():
+    """
+    Get the client of the current request for the rate limit: the
+    DETECT_RATE_KEY_HEADER value if set and present, otherwise the client
+    address (see INVENTRA_TRUSTED_PROXIES in app.py for proxied deployments).
+    """
+    if DETECT_RATE_KEY_HEADER:
+        key = request.headers.get(DETECT_RATE_KEY_HEADER, '').strip()
+        if key:
+            return key
+    return request.remote_addr
+
+def rejection_response(e):
+    """
+    Build the response for a rejected request.
+    
+    Args:
+        e (AdmissionRejected): The rejection
+    """
+    return jsonify({'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+
+def admission_controlled(controller):
+    """
+    Decorate a Flask view so every request passes the controller's quick
+    checks (see AdmissionController.check) before the request body is read.
+    The view takes a slot itself, with controller.slot(), around the work
+    the slot limits, so uploads are read without holding one.
+    
+    Args:
+        controller (AdmissionController): Controller for the view
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                controller.check(rate_limit_key())
+            except AdmissionRejected as e:
+                return rejection_response(e)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
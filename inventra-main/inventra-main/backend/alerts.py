@@ -0,0 +1,294 @@
+import os
+import json
+import argparse
+import threading
+import urllib.request
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from bson import ObjectId
+
+# Set to 0 to stop queueing low stock alerts
+ALERTS_ENABLED = os.getenv('INVENTRA_ALERTS', '1') == '1'
+# Notifier settings
+ALERT_INTERVAL = float(os.getenv('INVENTRA_ALERT_INTERVAL', 5))
+ALERT_BATCH_SIZE = int(os.getenv('INVENTRA_ALERT_BATCH_SIZE', 100))
+# An item is alerted at most once per window, however often it crosses its threshold
+ALERT_DEDUP_WINDOW = float(os.getenv('INVENTRA_ALERT_DEDUP_WINDOW', 6 * 3600))
+ALERT_MAX_ATTEMPTS = int(os.getenv('INVENTRA_ALERT_MAX_ATTEMPTS', 5))
+# Seconds after which alerts claimed by a notifier that died are delivered by another one
+ALERT_CLAIM_TIMEOUT = float(os.getenv('INVENTRA_ALERT_CLAIM_TIMEOUT', 300))
+# Delivery channels; an empty value disables the channel
+ALERT_WEBHOOK_URL = os.getenv('INVENTRA_ALERT_WEBHOOK_URL', '')
+ALERT_EMAIL_DIR = os.getenv('INVENTRA_ALERT_EMAIL_DIR', 'alert_mail')
+ALERT_EMAIL_FROM = os.getenv('INVENTRA_ALERT_EMAIL_FROM', 'inventra@localhost')
+ALERT_EMAIL_TO = os.getenv('INVENTRA_ALERT_EMAIL_TO', 'inventory@localhost')
+
+def is_low_stock(item):
+    """
+    Check whether an item is below its threshold.
+    """
+    try:
+        return item['quantity'] < (item.get('threshold') or 0)
+    except TypeError:
+        # Non-numeric quantity stored by a client
+        return False
+
+def threshold_crossings(changes):
+    """
+    Build a low stock alert for every item that fell below its threshold.
+    
+    Args:
+        changes (list): (item before the write, item after the write) tuples;
+            items that did not exist before the write are None
+    
+    Returns:
+        list: Alert documents for the outbox
+    """
+    alerts = []
+    now = datetime.now()
+    for previous, current in changes:
+        if previous is None or current is None:
+            continue
+        if is_low_stock(previous) or not is_low_stock(current):
+            continue
+        alerts.append({
+            'type': 'low_stock',
+            'item_id': str(current['_id']),
+            'item_name': current['name'],
+            'quantity': current['quantity'],
+            'previous_quantity': previous['quantity'],
+            'threshold': current.get('threshold'),
+            'unit': current.get('unit'),
+            'status': 'pending',
+            'attempts': 0,
+            'created_at': now
+        })
+    return alerts
+
+def alert_payload(alert):
+    """
+    Get the fields of an alert that are delivered to the channels.
+    """
+    return {
+        'id': str(alert['_id']),
+        'type': alert['type'],
+        'item_id': alert.get('item_id'),
+        'item_name': alert['item_name'],
+        'quantity': alert['quantity'],
+        'previous_quantity': alert.get('previous_quantity'),
+        'threshold': alert['threshold'],
+        'unit': alert.get('unit'),
+        'location': alert.get('location'),
+        'created_at': alert['created_at'].isoformat()
+    }
+
+class WebhookChannel:
+    """
+    Posts each batch of alerts as one JSON request.
+    """
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+    
+    def send(self, alerts):
+        body = json.dumps({'alerts': [alert_payload(alert) for alert in alerts]}).encode('utf-8')
+        request = urllib.request.Request(
+            self.url, data=body, headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        # Error statuses raise HTTPError, so the batch is retried
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+class EmailFileChannel:
+    """
+    Writes each batch of alerts as one email message (.eml file) to a
+    directory, for a mail relay to pick up or to read directly.
+    """
+    def __init__(self, directory, sender=ALERT_EMAIL_FROM, recipient=ALERT_EMAIL_TO):
+        self.directory = directory
+        self.sender = sender
+        self.recipient = recipient
+    
+    def send(self, alerts):
+        message = EmailMessage()
+        if len(alerts) == 1:
+            subject = f"Low stock: {alerts[0]['item_name']}"
+        else:
+            subject = f"Low stock: {len(alerts)} items"
+        # Each notifier delivers the alerts of one location
+        location = alerts[0].get('location')
+        message['Subject'] = f"[{location}] {subject}" if location else subject
+        message['From'] = self.sender
+        message['To'] = self.recipient
+        message['Date'] = formatdate(localtime=True)
+        message.set_content('\n'.join(
+            f"{alert['item_name']}: {alert['quantity']} {alert.get('unit') or ''} left "
+            f"(threshold {alert['threshold']})"
+            for alert in alerts
+        ) + '\n')
+        
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{datetime.now():%Y%m%d-%H%M%S}-{ObjectId()}.eml")
+        # Write under a temporary name so readers never see a partial message
+        with open(path + '.tmp', 'wb') as f:
+            f.write(bytes(message))
+        os.replace(path + '.tmp', path)
+
+def default_channels():
+    """
+    Get the delivery channels configured by the environment.
+    
+    Returns:
+        list: Channels with a send(alerts) method
+    """
+    channels = []
+    if ALERT_WEBHOOK_URL:
+        channels.append(WebhookChannel(ALERT_WEBHOOK_URL))
+    if ALERT_EMAIL_DIR:
+        channels.append(EmailFileChannel(ALERT_EMAIL_DIR))
+    return channels
+
+class AlertNotifier:
+    """
+    Delivers low stock alerts from the outbox in batches.
+    
+    InventoryManager queues an alert whenever a write moves an item below its
+    threshold. The notifier claims pending alerts in batches, keeps the latest
+    alert per item, suppresses items that were already alerted within the
+    dedup window and sends the rest to every channel in one call each.
+    Failed batches are retried until ALERT_MAX_ATTEMPTS.
+    """
+    def __init__(self, inventory_manager, channels=None, interval=ALERT_INTERVAL, batch_size=ALERT_BATCH_SIZE,
+                 dedup_window=ALERT_DEDUP_WINDOW, max_attempts=ALERT_MAX_ATTEMPTS, claim_timeout=ALERT_CLAIM_TIMEOUT):
+        """
+        Args:
+            inventory_manager (InventoryManager): Inventory whose outbox is delivered
+            channels (list): Delivery channels (default: from the environment)
+            interval (float): Seconds between outbox checks
+            batch_size (int): Maximum alerts claimed at once
+            dedup_window (float): Seconds during which an item is alerted only once
+            max_attempts (int): Delivery attempts before an alert is marked failed
+            claim_timeout (float): Seconds after which a claimed alert is taken over
+        """
+        self.inventory_manager = inventory_manager
+        self.channels = channels if channels is not None else default_channels()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.dedup_window = dedup_window
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def dispatch(self):
+        """
+        Deliver one batch of pending alerts.
+        
+        Returns:
+            dict: Number of alerts 'claimed', 'sent', 'suppressed' and 'failed'
+        """
+        storage = self.inventory_manager.storage
+        now = datetime.now()
+        alerts = storage.claim_alerts(self.batch_size, now - timedelta(seconds=self.claim_timeout))
+        result = {'claimed': len(alerts), 'sent': 0, 'suppressed': 0, 'failed': 0}
+        if not alerts:
+            return result
+        
+        # Alerts are claimed oldest first, so the last one per item is the latest
+        latest = {}
+        for alert in alerts:
+            latest[alert['item_name']] = alert
+        recently_alerted = storage.alerted_items(latest, now - timedelta(seconds=self.dedup_window))
+        to_send = [alert for name, alert in latest.items() if name not in recently_alerted]
+        send_ids = {alert['_id'] for alert in to_send}
+        suppressed = [alert['_id'] for alert in alerts if alert['_id'] not in send_ids]
+        storage.finish_alerts(suppressed, 'suppressed')
+        result['suppressed'] = len(suppressed)
+        
+        if not to_send:
+            return result
+        try:
+            for channel in self.channels:
+                channel.send(to_send)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error sending alerts: {e}")
+            retry = [alert['_id'] for alert in to_send if alert.get('attempts', 0) + 1 < self.max_attempts]
+            failed = [alert['_id'] for alert in to_send if alert.get('attempts', 0) + 1 >= self.max_attempts]
+            storage.finish_alerts(retry, 'pending')
+            storage.finish_alerts(failed, 'failed')
+            result['failed'] = len(failed)
+            return result
+        
+        self.last_error = None
+        storage.finish_alerts(list(send_ids), 'sent')
+        result['sent'] = len(send_ids)
+        return result
+    
+    def start(self):
+        """
+        Deliver alerts periodically in a background thread.
+        
+        Returns:
+            threading.Thread: The notifier thread
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='alert-notifier', daemon=True)
+            self._thread.start()
+        return self._thread
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Drain the outbox before waiting again
+                while self.dispatch()['claimed'] >= self.batch_size and self.last_error is None:
+                    pass
+            except Exception as e:
+                print(f"Error delivering alerts: {e}")
+            self._stop_event.wait(self.interval)
+
+class WebhookSink(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the alert webhook that prints the alerts it receives.
+    """
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            for alert in json.loads(body).get('alerts', []):
+                print(f"[{alert['created_at']}] Low stock: {alert['item_name']} "
+                      f"{alert['quantity']} {alert.get('unit') or ''} (threshold {alert['threshold']})")
+        except (ValueError, KeyError, AttributeError) as e:
+            print(f"Error reading alerts: {e}")
+            self.send_response(400)
+            self.end_headers()
+            return
+        self.send_response(204)
+        self.end_headers()
+    
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the low stock alert webhook')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    args = parser.parse_args()
+    
+    server = HTTPServer((args.host, args.port), WebhookSink)
+    print(f"Listening for alerts on http://{args.host}:{args.port}/ "
+          f"(set INVENTRA_ALERT_WEBHOOK_URL to this address)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
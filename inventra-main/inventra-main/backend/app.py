@@ -1,37 +1,118 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, g
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
-import json
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
+from datetime import datetime
 
 # Import custom modules
-from object_detection import FoodDetector
+from object_detection import MAX_UPLOAD_BYTES, ModelNotReadyError
+from model_registry import ModelRegistry
+from admission import AdmissionController, AdmissionRejected, admission_controlled, rejection_response
+from image_store import annotated_images
 from inventory_manager import InventoryManager
+from locations import LocationRegistry, UnknownLocationError
+from import_inventory import detect_format, import_inventory
+from search import SEARCH_KINDS
+from json_provider import OrjsonProvider
+from compression import compress_response
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+app.json = OrjsonProvider(app)
 
-# Configure upload folder
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Reverse proxies in front of the server. Their X-Forwarded-For entries are
+# trusted, so request.remote_addr (used by the detection rate limit) is the
+# real client address rather than the proxy's
+TRUSTED_PROXIES = int(os.getenv('INVENTRA_TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES, x_host=TRUSTED_PROXIES)
+
+@app.after_request
+def compress(response):
+    # gzip/brotli for JSON and text responses, as negotiated by Accept-Encoding
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
+# Largest request body accepted, in bytes (0 for no limit). Bulk imports are
+# streamed, so this only stops runaway uploads; detection images have their own
+# limit (INVENTRA_DETECT_MAX_UPLOAD_BYTES)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('INVENTRA_MAX_CONTENT_LENGTH', 256 * 1024 * 1024)) or None
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
-# Initialize modules
-food_detector = FoodDetector(model_path='best.pt')
-inventory_manager = InventoryManager()
+# Seconds the dashboard summary is reused between inventory writes
+DASHBOARD_CACHE_TTL = float(os.getenv('INVENTRA_DASHBOARD_CACHE_TTL', '5'))
+
+# Initialize modules. The model and the indexes are loaded in the background
+# by start_background_tasks() so the server can start listening right away
+model_registry = ModelRegistry(model_path='best.pt', lazy=True)
+inventory_manager = InventoryManager(create_indexes=False)
+# Every location (INVENTRA_LOCATIONS) shares the default manager's connection
+locations = LocationRegistry(inventory_manager, dashboard_cache_ttl=DASHBOARD_CACHE_TTL)
+detection_admission = AdmissionController()
+
+def start_background_tasks():
+    """
+    Start loading (and warming up) the model, watching for new models,
+    creating the database indexes, syncing to the central database when
+    running on local storage, and the write-behind transaction log, periodic
+    inventory snapshots and low stock alert delivery of every location.
+    """
+    model_registry.load_async()
+    model_registry.start()
+    inventory_manager.ensure_indexes_async()
+    inventory_manager.start_sync()
+    locations.start_background_tasks()
 
 # Helper function to check allowed file extensions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.before_request
+def select_location():
+    # Requests work on the location named by the X-Inventra-Location header or
+    # the location query parameter, and on the default location otherwise
+    try:
+        g.location = locations.get(request.headers.get('X-Inventra-Location') or request.args.get('location'))
+    except UnknownLocationError as e:
+        return jsonify({'error': str(e)}), 404
+
 @app.route('/api/health', methods=['GET'])
+@app.route('/api/health/live', methods=['GET'])
 def health_check():
+    # Liveness: the process is up and serving requests
     return jsonify({'status': 'ok', 'message': 'Inventra API is running'})
 
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    # Readiness: the model is loaded and the database is reachable
+    checks = {
+        'model': model_registry.is_ready,
+        'database': inventory_manager.ping(),
+        'indexes': inventory_manager.indexes_ready
+    }
+    ready = checks['model'] and checks['database']
+    response = {'status': 'ready' if ready else 'not ready', 'checks': checks}
+    if model_registry.load_error:
+        response['model_error'] = model_registry.load_error
+    response['detection'] = detection_admission.status()
+    return jsonify(response), 200 if ready else 503
+
+@app.route('/api/locations', methods=['GET'])
+def get_locations():
+    return jsonify({'locations': locations.names, 'default': locations.default.name})
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({'error': 'Request body is too large'}), 413
+
 @app.route('/api/detect', methods=['POST'])
+@admission_controlled(detection_admission)
 def detect_food():
+    # Reject oversized images before the multipart body is parsed
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return jsonify({'error': f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
+    
     # Check if image file is present in request
     if 'image' not in request.files:
         return jsonify({'error': 'No image file provided'}), 400
@@ -44,31 +125,90 @@ def detect_food():
     
     # Check if file is allowed
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # The image is detected from memory instead of being saved to disk first.
+        # Read one byte past the limit to catch bodies sent without a Content-Length
+        image_data = file.read(MAX_UPLOAD_BYTES + 1)
+        if len(image_data) > MAX_UPLOAD_BYTES:
+            return jsonify({'error': f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
         
-        # Perform detection
+        # Perform detection. Only inference holds a detection slot; the upload
+        # was read without one
         try:
-            detection_results = food_detector.detect(filepath)
+            with detection_admission.slot():
+                detection_results = model_registry.detect_upload(image_data)
             
             # Update inventory based on detected items
-            inventory_updates = inventory_manager.update_inventory_from_detection(detection_results)
+            inventory_updates = g.location.inventory_manager.update_inventory_from_detection(detection_results)
+            
+            # Recipes that can no longer be made with the ingredients left
+            used = [update['name'] for update in inventory_updates.get('updates', [])]
+            unavailable_recipes = [
+                recipe for recipe in g.location.recipe_feasibility.for_ingredients(used)
+                if recipe['max_servings'] == 0
+            ] if used else []
             
             # Return detection results and inventory updates
             return jsonify({
                 'detection_results': detection_results,
-                'inventory_updates': inventory_updates
+                'inventory_updates': inventory_updates,
+                'unavailable_recipes': unavailable_recipes
             })
+        except AdmissionRejected as e:
+            return rejection_response(e)
+        except ModelNotReadyError as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     else:
         return jsonify({'error': 'File type not allowed'}), 400
 
+@app.route('/api/annotated/<key>.webp', methods=['GET'])
+def get_annotated_image(key):
+    path = annotated_images.lookup(key)
+    if path is None:
+        return jsonify({'error': 'Image not found'}), 404
+    
+    # The key is a content hash, so an image never changes once stored
+    response = send_file(os.path.abspath(path), mimetype='image/webp', etag=key, max_age=31536000, conditional=True)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/api/models', methods=['GET'])
+def get_models():
+    return jsonify(model_registry.status())
+
+@app.route('/api/models', methods=['PUT'])
+def configure_models():
+    try:
+        data = request.json
+        if not isinstance(data, dict) or not data.keys() & {'active', 'candidate', 'candidate_percent'}:
+            return jsonify({'error': 'Provide active, candidate or candidate_percent'}), 400
+        
+        manifest = model_registry.configure(**{
+            key: data[key] for key in ('active', 'candidate', 'candidate_percent') if key in data
+        })
+        return jsonify({'manifest': manifest, 'models': model_registry.status()}), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/models/promote', methods=['POST'])
+def promote_model():
+    try:
+        manifest = model_registry.promote()
+        return jsonify({'manifest': manifest, 'models': model_registry.status()}), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/inventory', methods=['GET'])
 def get_inventory():
     try:
-        inventory = inventory_manager.get_all_inventory()
+        inventory = g.location.inventory_manager.get_all_inventory()
         return jsonify({'inventory': inventory})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -80,7 +220,7 @@ def add_inventory_item():
         if not data or 'name' not in data or 'quantity' not in data or 'unit' not in data:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        result = inventory_manager.add_inventory_item(
+        result = g.location.inventory_manager.add_inventory_item(
             name=data['name'],
             quantity=data['quantity'],
             unit=data['unit'],
@@ -92,6 +232,62 @@ def add_inventory_item():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/inventory/import', methods=['POST'])
+def import_inventory_items():
+    try:
+        # Either a multipart upload ('file') or the raw CSV/NDJSON request body
+        if 'file' in request.files:
+            upload = request.files['file']
+            stream = upload.stream
+            fmt = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+        else:
+            stream = request.stream
+            fmt = request.args.get('format') or detect_format(content_type=request.mimetype)
+        
+        if fmt not in ('csv', 'ndjson'):
+            return jsonify({'error': 'Unknown file format; use a .csv or .ndjson file or pass ?format='}), 400
+        
+        summary = import_inventory(
+            g.location.inventory_manager, stream, fmt,
+            description=request.args.get('description', 'Bulk import')
+        )
+        return jsonify({'message': 'Inventory imported successfully', **summary})
+    except RequestEntityTooLarge:
+        raise  # Answered by request_too_large
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/inventory/history', methods=['GET'])
+def get_inventory_history():
+    try:
+        at = request.args.get('at')
+        if not at:
+            return jsonify({'error': 'Missing required parameter: at'}), 400
+        try:
+            when = datetime.fromisoformat(at)
+        except ValueError:
+            return jsonify({'error': 'Invalid time; use ISO 8601, e.g. 2024-05-01T18:00:00'}), 400
+        
+        report = g.location.snapshots.stock_at(when)
+        if report is None:
+            return jsonify({'error': 'No inventory history that early'}), 404
+        return jsonify(report)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/inventory/snapshots', methods=['POST'])
+def take_inventory_snapshot():
+    try:
+        snapshot = g.location.snapshots.take_snapshot(force=True)
+        return jsonify({
+            'message': 'Snapshot recorded',
+            'taken_at': snapshot['taken_at'].isoformat(),
+            'seq': snapshot['seq'],
+            'items': len(snapshot['items'])
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/inventory/<item_id>', methods=['PUT'])
 def update_inventory_item(item_id):
     try:
@@ -99,7 +295,7 @@ def update_inventory_item(item_id):
         if not data:
             return jsonify({'error': 'No update data provided'}), 400
         
-        result = inventory_manager.update_inventory_item(item_id, data)
+        result = g.location.inventory_manager.update_inventory_item(item_id, data)
         if result:
             return jsonify({'message': 'Inventory item updated successfully', 'item': result})
         else:
@@ -110,7 +306,7 @@ def update_inventory_item(item_id):
 @app.route('/api/inventory/<item_id>', methods=['DELETE'])
 def delete_inventory_item(item_id):
     try:
-        result = inventory_manager.delete_inventory_item(item_id)
+        result = g.location.inventory_manager.delete_inventory_item(item_id)
         if result:
             return jsonify({'message': 'Inventory item deleted successfully'})
         else:
@@ -121,11 +317,32 @@ def delete_inventory_item(item_id):
 @app.route('/api/recipes', methods=['GET'])
 def get_recipes():
     try:
-        recipes = inventory_manager.get_all_recipes()
+        recipes = g.location.inventory_manager.get_all_recipes()
         return jsonify({'recipes': recipes})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/recipes/feasibility', methods=['GET'])
+def get_recipe_feasibility():
+    try:
+        feasibility = g.location.recipe_feasibility.get()
+        return jsonify({'recipes': feasibility})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recipes/using', methods=['GET'])
+def get_recipes_using():
+    try:
+        # ?ingredient=cheese&ingredient=tomato
+        ingredients = [name for name in request.args.getlist('ingredient') if name]
+        if not ingredients:
+            return jsonify({'error': 'At least one ingredient is required'}), 400
+        
+        recipes = g.location.inventory_manager.get_recipes_using(ingredients)
+        return jsonify({'ingredients': ingredients, 'recipes': recipes})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/recipes', methods=['POST'])
 def add_recipe():
     try:
@@ -133,7 +350,7 @@ def add_recipe():
         if not data or 'name' not in data or 'ingredients' not in data:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        result = inventory_manager.add_recipe(
+        result = g.location.inventory_manager.add_recipe(
             name=data['name'],
             ingredients=data['ingredients'],
             instructions=data.get('instructions', ''),
@@ -151,7 +368,7 @@ def update_recipe(recipe_id):
         if not data:
             return jsonify({'error': 'No update data provided'}), 400
         
-        result = inventory_manager.update_recipe(recipe_id, data)
+        result = g.location.inventory_manager.update_recipe(recipe_id, data)
         if result:
             return jsonify({'message': 'Recipe updated successfully', 'recipe': result})
         else:
@@ -162,7 +379,7 @@ def update_recipe(recipe_id):
 @app.route('/api/recipes/<recipe_id>', methods=['DELETE'])
 def delete_recipe(recipe_id):
     try:
-        result = inventory_manager.delete_recipe(recipe_id)
+        result = g.location.inventory_manager.delete_recipe(recipe_id)
         if result:
             return jsonify({'message': 'Recipe deleted successfully'})
         else:
@@ -173,7 +390,7 @@ def delete_recipe(recipe_id):
 @app.route('/api/prepare-recipe/<recipe_id>', methods=['POST'])
 def prepare_recipe(recipe_id):
     try:
-        result = inventory_manager.prepare_recipe(recipe_id)
+        result = g.location.inventory_manager.prepare_recipe(recipe_id)
         if result['success']:
             return jsonify({
                 'message': 'Recipe prepared successfully', 
@@ -184,13 +401,98 @@ def prepare_recipe(recipe_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/prepare-recipes', methods=['POST'])
+def prepare_recipes():
+    try:
+        data = request.json
+        if not data or not isinstance(data.get('recipes'), list):
+            return jsonify({'error': 'Missing required fields'}), 400
+        if any(not isinstance(order, dict) or 'recipe_id' not in order for order in data['recipes']):
+            return jsonify({'error': 'Each recipe needs a recipe_id'}), 400
+        
+        result = g.location.inventory_manager.prepare_recipes(data['recipes'])
+        if result['success']:
+            return jsonify({
+                'message': result['message'],
+                'prepared': result['prepared'],
+                'inventory_updates': result['inventory_updates']
+            })
+        else:
+            response = {'error': result['message']}
+            for key in ('insufficient_ingredients', 'missing_recipes'):
+                if key in result:
+                    response[key] = result[key]
+            return jsonify(response), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+def search_by_name():
+    try:
+        query = request.args.get('q', '')
+        kind = request.args.get('type', 'all')
+        kinds = SEARCH_KINDS if kind == 'all' else [kind]
+        try:
+            limit = min(int(request.args.get('limit', 20)), 100)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        
+        results = g.location.search.search(query, kinds=kinds, limit=limit)
+        return jsonify({'query': query, **results})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    try:
+        return jsonify(g.location.dashboard_summary.get())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/low-stock', methods=['GET'])
 def get_low_stock_items():
     try:
-        low_stock_items = inventory_manager.get_low_stock_items()
+        low_stock_items = g.location.inventory_manager.get_low_stock_items()
         return jsonify({'low_stock_items': low_stock_items})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/alerts', methods=['GET'])
+def get_alerts():
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        alerts = g.location.inventory_manager.get_recent_alerts(limit)
+        return jsonify({'alerts': alerts})
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/reorder-suggestions', methods=['GET'])
+def get_reorder_suggestions():
+    try:
+        try:
+            lead_time_days = float(request.args.get('lead_time', 2))
+            cover_days = float(request.args.get('cover_days', 7))
+        except ValueError:
+            return jsonify({'error': 'lead_time and cover_days must be numbers'}), 400
+        method = request.args.get('method', 'ewma')
+        
+        suggestions = g.location.demand_forecaster.reorder_suggestions(
+            lead_time_days=lead_time_days,
+            cover_days=cover_days,
+            method=method,
+            include_all=request.args.get('all') == '1'
+        )
+        return jsonify({'suggestions': suggestions})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development server only; use serve.py in production
+    start_background_tasks()
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
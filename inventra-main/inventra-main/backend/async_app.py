@@ -0,0 +1,264 @@
+import os
+import asyncio
+from quart import Quart, request, jsonify, g
+from quart_cors import cors
+
+# Import custom modules
+from object_detection import MAX_UPLOAD_BYTES, ModelNotReadyError
+from model_registry import ModelRegistry
+from async_inventory_manager import AsyncInventoryManager
+from inventory_manager import InventoryManager
+from alerts import ALERTS_ENABLED, AlertNotifier
+from locations import LOCATIONS
+from json_provider import OrjsonProvider
+
+# Initialize Quart app (asyncio counterpart of app.py)
+app = Quart(__name__)
+app = cors(app)  # Enable CORS for all routes
+app.json = OrjsonProvider(app)
+
+# Largest request body accepted, in bytes (0 for no limit)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('INVENTRA_MAX_CONTENT_LENGTH', 256 * 1024 * 1024)) or None
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+# Initialize modules
+model_registry = ModelRegistry(model_path='best.pt', lazy=True)
+inventory_manager = AsyncInventoryManager()
+# Managers of every location served (see locations.py); they share the
+# default location's client
+inventory_managers = {inventory_manager.location: inventory_manager}
+for name in LOCATIONS:
+    if name not in inventory_managers:
+        inventory_managers[name] = AsyncInventoryManager(client=inventory_manager.client, location=name)
+# Deliver the low stock alerts the managers queue. The notifiers run in
+# threads, so they use a synchronous connection to the same locations
+alert_manager = InventoryManager(create_indexes=False, location=inventory_manager.location)
+alert_notifiers = [
+    AlertNotifier(alert_manager if name == alert_manager.location else
+                  InventoryManager(storage=alert_manager.storage, location=name, create_indexes=False))
+    for name in inventory_managers
+]
+
+# Helper function to check allowed file extensions
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+@app.before_serving
+async def start_background_tasks():
+    # Load the model in a thread, watch for new models and build indexes without delaying startup
+    model_registry.load_async()
+    model_registry.start()
+    app.add_background_task(inventory_manager.ensure_indexes)
+    if ALERTS_ENABLED:
+        for alert_notifier in alert_notifiers:
+            alert_notifier.start()
+
+@app.after_serving
+async def close_database():
+    for alert_notifier in alert_notifiers:
+        alert_notifier.stop()
+    alert_manager.close()
+    inventory_manager.close()
+
+@app.before_request
+async def select_location():
+    # Requests work on the location named by the X-Inventra-Location header or
+    # the location query parameter, and on the default location otherwise
+    name = request.headers.get('X-Inventra-Location') or request.args.get('location')
+    g.inventory_manager = inventory_managers.get(name or inventory_manager.location)
+    if g.inventory_manager is None:
+        return jsonify({'error': f"Unknown location: {name}"}), 404
+
+@app.route('/api/health', methods=['GET'])
+@app.route('/api/health/live', methods=['GET'])
+async def health_check():
+    return jsonify({'status': 'ok', 'message': 'Inventra API is running'})
+
+@app.route('/api/health/ready', methods=['GET'])
+async def readiness_check():
+    checks = {
+        'model': model_registry.is_ready,
+        'database': await inventory_manager.ping(),
+        'indexes': inventory_manager.indexes_ready
+    }
+    ready = checks['model'] and checks['database']
+    response = {'status': 'ready' if ready else 'not ready', 'checks': checks}
+    if model_registry.load_error:
+        response['model_error'] = model_registry.load_error
+    return jsonify(response), 200 if ready else 503
+
+@app.route('/api/detect', methods=['POST'])
+async def detect_food():
+    # Reject oversized images before the multipart body is read
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return jsonify({'error': f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
+    
+    files = await request.files
+    
+    # Check if image file is present in request
+    if 'image' not in files:
+        return jsonify({'error': 'No image file provided'}), 400
+    
+    file = files['image']
+    
+    # Check if filename is empty
+    if file.filename == '':
+        return jsonify({'error': 'No image selected'}), 400
+    
+    # Check if file is allowed
+    if file and allowed_file(file.filename):
+        # Detect from memory instead of saving the image to disk first
+        image_data = file.read(MAX_UPLOAD_BYTES + 1)
+        if len(image_data) > MAX_UPLOAD_BYTES:
+            return jsonify({'error': f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
+        
+        try:
+            # Decoding and inference are CPU/GPU bound, so keep them off the event loop
+            loop = asyncio.get_running_loop()
+            detection_results = await loop.run_in_executor(None, model_registry.detect_upload, image_data)
+            
+            inventory_updates = await g.inventory_manager.update_inventory_from_detection(detection_results)
+            
+            return jsonify({
+                'detection_results': detection_results,
+                'inventory_updates': inventory_updates
+            })
+        except ModelNotReadyError as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    else:
+        return jsonify({'error': 'File type not allowed'}), 400
+
+@app.route('/api/inventory', methods=['GET'])
+async def get_inventory():
+    try:
+        inventory = await g.inventory_manager.get_all_inventory()
+        return jsonify({'inventory': inventory})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/inventory', methods=['POST'])
+async def add_inventory_item():
+    try:
+        data = await request.get_json()
+        if not data or 'name' not in data or 'quantity' not in data or 'unit' not in data:
+            return jsonify({'error': 'Missing required fields'}), 400
+        
+        result = await g.inventory_manager.add_inventory_item(
+            name=data['name'],
+            quantity=data['quantity'],
+            unit=data['unit'],
+            category=data.get('category', 'Other'),
+            threshold=data.get('threshold', 10)
+        )
+        
+        return jsonify({'message': 'Inventory item added successfully', 'item': result})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/inventory/<item_id>', methods=['PUT'])
+async def update_inventory_item(item_id):
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'No update data provided'}), 400
+        
+        result = await g.inventory_manager.update_inventory_item(item_id, data)
+        if result:
+            return jsonify({'message': 'Inventory item updated successfully', 'item': result})
+        else:
+            return jsonify({'error': 'Item not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/inventory/<item_id>', methods=['DELETE'])
+async def delete_inventory_item(item_id):
+    try:
+        result = await g.inventory_manager.delete_inventory_item(item_id)
+        if result:
+            return jsonify({'message': 'Inventory item deleted successfully'})
+        else:
+            return jsonify({'error': 'Item not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recipes', methods=['GET'])
+async def get_recipes():
+    try:
+        recipes = await g.inventory_manager.get_all_recipes()
+        return jsonify({'recipes': recipes})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recipes', methods=['POST'])
+async def add_recipe():
+    try:
+        data = await request.get_json()
+        if not data or 'name' not in data or 'ingredients' not in data:
+            return jsonify({'error': 'Missing required fields'}), 400
+        
+        result = await g.inventory_manager.add_recipe(
+            name=data['name'],
+            ingredients=data['ingredients'],
+            instructions=data.get('instructions', ''),
+            category=data.get('category', 'Other')
+        )
+        
+        return jsonify({'message': 'Recipe added successfully', 'recipe': result})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recipes/<recipe_id>', methods=['PUT'])
+async def update_recipe(recipe_id):
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'No update data provided'}), 400
+        
+        result = await g.inventory_manager.update_recipe(recipe_id, data)
+        if result:
+            return jsonify({'message': 'Recipe updated successfully', 'recipe': result})
+        else:
+            return jsonify({'error': 'Recipe not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recipes/<recipe_id>', methods=['DELETE'])
+async def delete_recipe(recipe_id):
+    try:
+        result = await g.inventory_manager.delete_recipe(recipe_id)
+        if result:
+            return jsonify({'message': 'Recipe deleted successfully'})
+        else:
+            return jsonify({'error': 'Recipe not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/prepare-recipe/<recipe_id>', methods=['POST'])
+async def prepare_recipe(recipe_id):
+    try:
+        result = await g.inventory_manager.prepare_recipe(recipe_id)
+        if result['success']:
+            return jsonify({
+                'message': 'Recipe prepared successfully',
+                'inventory_updates': result['inventory_updates']
+            })
+        else:
+            return jsonify({'error': result['message']}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/low-stock', methods=['GET'])
+async def get_low_stock_items():
+    try:
+        low_stock_items = await g.inventory_manager.get_low_stock_items()
+        return jsonify({'low_stock_items': low_stock_items})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+if __name__ == '__main__':
+    # Development server only; use hypercorn in production
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,650 @@
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from inventory_manager import MONGO_URI
+from storage import DEFAULT_LOCATION, check_location, transaction_counter_id
+from alerts import ALERTS_ENABLED, threshold_crossings
+from json_provider import to_json_compatible
+
+class AsyncInventoryManager:
+    """
+    asyncio variant of InventoryManager backed by Motor.
+    
+    Methods mirror InventoryManager and return the same shapes, but independent
+    queries are issued concurrently instead of one round trip at a time.
+    Scripts such as init_db.py should keep using the synchronous InventoryManager.
+    Like MongoStorage, it only reads and writes the documents of one location.
+    """
+    def __init__(self, db_name='inventra', client=None, location=DEFAULT_LOCATION):
+        """
+        Initialize the inventory manager with a Motor connection.
+        
+        Args:
+            db_name (str): Name of the MongoDB database
+            client: Existing Motor client to use instead of connecting to MONGO_URI
+            location (str): Location whose inventory is managed
+        """
+        self.db_name = db_name
+        self.location = check_location(location)
+        self.indexes_ready = False
+        self.client = client if client is not None else AsyncIOMotorClient(MONGO_URI)
+        self.db = self.client[db_name]
+        self.inventory_collection = self.db['inventory']
+        self.recipes_collection = self.db['recipes']
+        self.transactions_collection = self.db['transactions']
+        self.counters_collection = self.db['counters']
+        self.alerts_collection = self.db['alerts']
+        self._transactions_supported = None
+    
+    def _scoped(self, query=None):
+        """
+        Restrict a query to the documents of this location.
+        """
+        return {'location': self.location, **(query or {})}
+    
+    async def ensure_indexes(self):
+        """
+        Create the indexes used by the inventory queries. Databases created
+        before locations are migrated by the synchronous MongoStorage.
+        """
+        await asyncio.gather(
+            self.inventory_collection.create_index([('location', 1), ('name', 1)], unique=True),
+            self.recipes_collection.create_index([('location', 1), ('name', 1)], unique=True),
+            self.recipes_collection.create_index([('location', 1), ('ingredients.name', 1)])
+        )
+        self.indexes_ready = True
+    
+    async def ping(self, timeout=1.0):
+        """
+        Check that the database is reachable.
+        
+        Args:
+            timeout (float): Maximum seconds to wait
+        
+        Returns:
+            bool: True if the database answered the ping
+        """
+        try:
+            await asyncio.wait_for(self.client.admin.command('ping'), timeout)
+            return True
+        except Exception:
+            return False
+    
+    def close(self):
+        """
+        Close the MongoDB connection.
+        """
+        self.client.close()
+    
+    async def _supports_transactions(self):
+        """
+        Whether the server runs multi-document transactions (see
+        MongoStorage._supports_transactions).
+        """
+        if self._transactions_supported is None:
+            try:
+                hello = await self.client.admin.command('hello')
+            except Exception:
+                return False
+            self._transactions_supported = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+        return self._transactions_supported
+    
+    async def get_all_inventory(self):
+        """
+        Get all inventory items.
+        
+        Returns:
+            list: List of inventory items
+        """
+        inventory = await self.inventory_collection.find(self._scoped()).to_list(length=None)
+        return to_json_compatible(inventory)
+    
+    async def add_inventory_item(self, name, quantity, unit, category='Other', threshold=10):
+        """
+        Add a new inventory item, or increase the quantity of an existing one.
+        
+        Args:
+            name (str): Name of the item
+            quantity (float): Quantity of the item
+            unit (str): Unit of measurement (e.g., g, kg, ml, l, piece)
+            category (str): Category of the item
+            threshold (float): Threshold for low stock alert
+        
+        Returns:
+            dict: The added inventory item
+        """
+        now = datetime.now()
+        new_item = {
+            '_id': ObjectId(),
+            'location': self.location,
+            'name': name,
+            'quantity': quantity,
+            'unit': unit,
+            'category': category,
+            'threshold': threshold,
+            'created_at': now,
+            'updated_at': now
+        }
+        
+        # Create the item or increase its quantity in one upsert, so concurrent
+        # requests adding the same new item do not both try to insert it
+        for attempt in range(2):
+            try:
+                previous_item = await self.inventory_collection.find_one_and_update(
+                    self._scoped({'name': name}),
+                    {
+                        '$inc': {'quantity': quantity},
+                        '$set': {'updated_at': now},
+                        '$setOnInsert': {
+                            key: new_item[key] for key in ('_id', 'unit', 'category', 'threshold', 'created_at')
+                        }
+                    },
+                    upsert=True
+                )
+                break
+            except DuplicateKeyError:
+                # Another request inserted the item first; the retry updates it
+                if attempt:
+                    raise
+        
+        if previous_item is None:
+            await self._record_transactions([self._transaction('add', name, quantity, unit, 'Initial stock', delta=quantity)])
+            return to_json_compatible(new_item)
+        
+        updated_item = {**previous_item, 'quantity': previous_item['quantity'] + quantity, 'updated_at': now}
+        await asyncio.gather(
+            self._record_transactions([self._transaction(
+                'add', name, quantity, previous_item.get('unit', unit), 'Added stock', delta=quantity
+            )]),
+            self._check_thresholds([(previous_item, updated_item)])
+        )
+        return to_json_compatible(updated_item)
+    
+    async def update_inventory_item(self, item_id, update_data):
+        """
+        Update an existing inventory item.
+        
+        Args:
+            item_id (str): ID of the item to update
+            update_data (dict): Data to update
+        
+        Returns:
+            dict: The updated inventory item or None if not found
+        """
+        try:
+            # An item stays at the location it was created at
+            update_data.pop('location', None)
+            update_data['updated_at'] = datetime.now()
+            previous_item = await self.inventory_collection.find_one_and_update(
+                self._scoped({'_id': ObjectId(item_id)}),
+                {'$set': update_data}
+            )
+            if previous_item:
+                updated_item = {**previous_item, **update_data}
+                await asyncio.gather(
+                    self._record_update(previous_item, updated_item),
+                    self._check_thresholds([(previous_item, updated_item)])
+                )
+                return to_json_compatible(updated_item)
+            return None
+        except Exception as e:
+            print(f"Error updating inventory item: {e}")
+            return None
+    
+    async def delete_inventory_item(self, item_id):
+        """
+        Delete an inventory item.
+        
+        Args:
+            item_id (str): ID of the item to delete
+        
+        Returns:
+            bool: True if deleted successfully, False otherwise
+        """
+        try:
+            item = await self.inventory_collection.find_one_and_delete(self._scoped({'_id': ObjectId(item_id)}))
+            if item is None:
+                return False
+            await self._record_transactions([self._transaction(
+                'delete', item['name'], item['quantity'], item.get('unit'), 'Item deleted', delta=-item['quantity']
+            )])
+            return True
+        except Exception as e:
+            print(f"Error deleting inventory item: {e}")
+            return False
+    
+    async def _find_items_by_name(self, names):
+        """
+        Fetch several inventory items in one query.
+        
+        Returns:
+            dict: Inventory items keyed by name
+        """
+        items = await self.inventory_collection.find(self._scoped({'name': {'$in': list(names)}})).to_list(length=None)
+        return {item['name']: item for item in items}
+    
+    async def _deduct_quantities(self, amounts):
+        """
+        Deduct an amount from the quantity of several items, all or nothing:
+        nothing is changed unless every item has at least its amount (see
+        StorageBackend.deduct_quantities).
+        
+        On a replica set the deductions run in a session transaction. A
+        standalone server has none, so the deductions are written concurrently
+        and, if any item falls short, the others are given back with their
+        previous update times; other requests can see such a partial deduction
+        until it is given back.
+        
+        Args:
+            amounts (dict): Amount to deduct by item _id
+        
+        Returns:
+            dict: The item before and after the deduction by _id, or None if
+                nothing was deducted
+        """
+        now = datetime.now()
+        
+        def deduction(item_id, amount, session=None):
+            return self.inventory_collection.find_one_and_update(
+                self._scoped({'_id': item_id, 'quantity': {'$gte': amount}}),
+                {'$inc': {'quantity': -amount}, '$set': {'updated_at': now}},
+                session=session
+            )
+        
+        if await self._supports_transactions():
+            async def deduct_in_transaction(session):
+                # Operations of one transaction run one after another
+                previous_items = []
+                for item_id, amount in amounts.items():
+                    previous_item = await deduction(item_id, amount, session)
+                    if previous_item is None:
+                        await session.abort_transaction()
+                        return None
+                    previous_items.append(previous_item)
+                return previous_items
+            
+            async with await self.client.start_session() as session:
+                previous_items = await session.with_transaction(deduct_in_transaction)
+            if previous_items is None:
+                return None
+        else:
+            previous_items = await asyncio.gather(*(deduction(item_id, amount) for item_id, amount in amounts.items()))
+            if any(item is None for item in previous_items):
+                await asyncio.gather(*(
+                    self.inventory_collection.update_one(
+                        self._scoped({'_id': item['_id']}),
+                        {'$inc': {'quantity': amounts[item['_id']]}, '$set': {'updated_at': item.get('updated_at')}}
+                    )
+                    for item in previous_items if item is not None
+                ))
+                return None
+        return {
+            item['_id']: (item, {**item, 'quantity': item['quantity'] - amounts[item['_id']], 'updated_at': now})
+            for item in previous_items
+        }
+    
+    async def _deduct_item(self, item_id, amount):
+        """
+        Deduct an amount from the quantity of an item, stopping at zero, in the
+        database rather than from a quantity read before (see
+        StorageBackend.deduct_item).
+        
+        Returns:
+            tuple: The item before and after the deduction, or (None, None) if
+                it does not exist
+        """
+        query = self._scoped({'_id': item_id})
+        while True:
+            now = datetime.now()
+            previous_item = await self.inventory_collection.find_one_and_update(
+                {**query, 'quantity': {'$gte': amount}},
+                {'$inc': {'quantity': -amount}, '$set': {'updated_at': now}}
+            )
+            if previous_item is not None:
+                return previous_item, {**previous_item, 'quantity': previous_item['quantity'] - amount, 'updated_at': now}
+            # Not enough left; empty the item instead
+            previous_item = await self.inventory_collection.find_one_and_update(
+                {**query, 'quantity': {'$not': {'$gte': amount}}},
+                {'$set': {'quantity': 0, 'updated_at': now}}
+            )
+            if previous_item is not None:
+                return previous_item, {**previous_item, 'quantity': 0, 'updated_at': now}
+            # Neither matched if the item was deleted, or restocked in between
+            if await self.inventory_collection.find_one(query) is None:
+                return None, None
+    
+    async def update_inventory_from_detection(self, detection_results):
+        """
+        Update inventory based on detected food items.
+        
+        Args:
+            detection_results (dict): Results from food detection
+        
+        Returns:
+            dict: Inventory update results
+        """
+        if 'ingredients_needed' not in detection_results:
+            return {'error': 'No ingredients found in detection results'}
+        
+        ingredients_needed = detection_results['ingredients_needed']
+        detected_summary = ', '.join(
+            f"{food['name']} (x{food['count']})" for food in detection_results['detected_foods']
+        )
+        
+        inventory_items = await self._find_items_by_name(ingredient['name'] for ingredient in ingredients_needed)
+        
+        # Add missing ingredients to inventory with zero quantity
+        missing = [ingredient for ingredient in ingredients_needed if ingredient['name'] not in inventory_items]
+        if missing:
+            await asyncio.gather(*(
+                self.add_inventory_item(ingredient['name'], 0, ingredient['unit']) for ingredient in missing
+            ))
+            inventory_items.update(await self._find_items_by_name(ingredient['name'] for ingredient in missing))
+        
+        # Subtract the used quantities in the database, concurrently; other
+        # requests may have changed them since they were read
+        deductions = await asyncio.gather(*(
+            self._deduct_item(inventory_items[ingredient['name']]['_id'], ingredient['quantity'])
+            for ingredient in ingredients_needed
+        ))
+        
+        transactions = []
+        changes = []
+        update_results = []
+        for ingredient, (previous_item, updated_item) in zip(ingredients_needed, deductions):
+            if previous_item is None:
+                # Deleted meanwhile
+                continue
+            name = ingredient['name']
+            changes.append((previous_item, updated_item))
+            current_quantity = previous_item['quantity']
+            new_quantity = updated_item['quantity']
+            transactions.append(self._transaction(
+                'subtract', name, ingredient['quantity'], ingredient['unit'],
+                f"Used in detected food: {detected_summary}", delta=new_quantity - current_quantity
+            ))
+            update_results.append({
+                'name': name,
+                'previous_quantity': current_quantity,
+                'used_quantity': ingredient['quantity'],
+                'new_quantity': new_quantity,
+                'unit': ingredient['unit']
+            })
+        
+        await asyncio.gather(self._record_transactions(transactions), self._check_thresholds(changes))
+        
+        return {
+            'success': True,
+            'updates': update_results
+        }
+    
+    async def get_all_recipes(self):
+        """
+        Get all recipes.
+        
+        Returns:
+            list: List of recipes
+        """
+        recipes = await self.recipes_collection.find(self._scoped()).to_list(length=None)
+        return to_json_compatible(recipes)
+    
+    async def add_recipe(self, name, ingredients, instructions='', category='Other'):
+        """
+        Add a new recipe.
+        
+        Args:
+            name (str): Name of the recipe
+            ingredients (list): List of ingredients with name, quantity, and unit
+            instructions (str): Cooking instructions
+            category (str): Category of the recipe
+        
+        Returns:
+            dict: The added recipe
+        """
+        existing_recipe = await self.recipes_collection.find_one(self._scoped({'name': name}))
+        if existing_recipe:
+            return to_json_compatible(existing_recipe)
+        
+        new_recipe = {
+            'location': self.location,
+            'name': name,
+            'ingredients': ingredients,
+            'instructions': instructions,
+            'category': category,
+            'created_at': datetime.now(),
+            'updated_at': datetime.now()
+        }
+        
+        result = await self.recipes_collection.insert_one(new_recipe)
+        new_recipe['_id'] = result.inserted_id
+        
+        return to_json_compatible(new_recipe)
+    
+    async def update_recipe(self, recipe_id, update_data):
+        """
+        Update an existing recipe.
+        
+        Args:
+            recipe_id (str): ID of the recipe to update
+            update_data (dict): Data to update
+        
+        Returns:
+            dict: The updated recipe or None if not found
+        """
+        try:
+            update_data.pop('location', None)
+            update_data['updated_at'] = datetime.now()
+            updated_recipe = await self.recipes_collection.find_one_and_update(
+                self._scoped({'_id': ObjectId(recipe_id)}),
+                {'$set': update_data},
+                return_document=ReturnDocument.AFTER
+            )
+            if updated_recipe:
+                return to_json_compatible(updated_recipe)
+            return None
+        except Exception as e:
+            print(f"Error updating recipe: {e}")
+            return None
+    
+    async def delete_recipe(self, recipe_id):
+        """
+        Delete a recipe.
+        
+        Args:
+            recipe_id (str): ID of the recipe to delete
+        
+        Returns:
+            bool: True if deleted successfully, False otherwise
+        """
+        try:
+            result = await self.recipes_collection.delete_one(self._scoped({'_id': ObjectId(recipe_id)}))
+            return result.deleted_count > 0
+        except Exception as e:
+            print(f"Error deleting recipe: {e}")
+            return False
+    
+    async def prepare_recipe(self, recipe_id):
+        """
+        Prepare a recipe and update inventory accordingly.
+        
+        Every ingredient is deducted only if the database still holds enough
+        of it when it is written; if any falls short, nothing is prepared
+        (see _deduct_quantities).
+        
+        Args:
+            recipe_id (str): ID of the recipe to prepare
+        
+        Returns:
+            dict: Result of the operation
+        """
+        try:
+            recipe = await self.recipes_collection.find_one(self._scoped({'_id': ObjectId(recipe_id)}))
+            if not recipe:
+                return {'success': False, 'message': 'Recipe not found'}
+            
+            # Total of every ingredient, in case the recipe lists one twice
+            required = {}
+            units = {}
+            for ingredient in recipe['ingredients']:
+                required[ingredient['name']] = required.get(ingredient['name'], 0) + ingredient['quantity']
+                units.setdefault(ingredient['name'], ingredient['unit'])
+            
+            # Fetch every ingredient in one query
+            inventory_items = await self._find_items_by_name(required)
+            missing = [name for name in required if name not in inventory_items]
+            if missing:
+                return {
+                    'success': False,
+                    'message': 'Insufficient ingredients',
+                    'insufficient_ingredients': [
+                        {'name': name, 'required': required[name], 'available': 0, 'unit': units[name]}
+                        for name in missing
+                    ]
+                }
+            
+            # Nothing is written if the stock just read is already short
+            short = [name for name, quantity in required.items() if inventory_items[name]['quantity'] < quantity]
+            deducted = None
+            if not short:
+                deducted = await self._deduct_quantities(
+                    {inventory_items[name]['_id']: quantity for name, quantity in required.items()}
+                )
+                if deducted is None:
+                    # Another request took the stock in between
+                    inventory_items = await self._find_items_by_name(required)
+                    short = [
+                        name for name, quantity in required.items()
+                        if inventory_items.get(name, {}).get('quantity', 0) < quantity
+                    ]
+            if deducted is None:
+                return {
+                    'success': False,
+                    'message': 'Insufficient ingredients',
+                    'insufficient_ingredients': [
+                        {
+                            'name': name,
+                            'required': required[name],
+                            'available': inventory_items[name]['quantity'] if name in inventory_items else 0,
+                            'unit': units[name]
+                        }
+                        for name in short
+                    ]
+                }
+            
+            transactions = [
+                self._transaction(
+                    'subtract', ingredient['name'], ingredient['quantity'], ingredient['unit'],
+                    f"Used in recipe: {recipe['name']}", delta=-ingredient['quantity']
+                )
+                for ingredient in recipe['ingredients']
+            ]
+            changes = [deducted[inventory_items[name]['_id']] for name in required]
+            inventory_updates = [
+                {
+                    'name': name,
+                    'previous_quantity': previous_item['quantity'],
+                    'used_quantity': quantity,
+                    'new_quantity': updated_item['quantity'],
+                    'unit': units[name]
+                }
+                for (name, quantity), (previous_item, updated_item) in zip(required.items(), changes)
+            ]
+            await asyncio.gather(self._record_transactions(transactions), self._check_thresholds(changes))
+            
+            return {
+                'success': True,
+                'message': f"Recipe '{recipe['name']}' prepared successfully",
+                'inventory_updates': inventory_updates
+            }
+        except Exception as e:
+            print(f"Error preparing recipe: {e}")
+            return {'success': False, 'message': str(e)}
+    
+    async def get_low_stock_items(self):
+        """
+        Get inventory items that are below their threshold.
+        
+        Returns:
+            list: List of low stock items
+        """
+        low_stock_items = await self.inventory_collection.find(self._scoped({
+            '$expr': {'$lt': ['$quantity', '$threshold']}
+        })).to_list(length=None)
+        
+        return to_json_compatible(low_stock_items)
+    
+    def _transaction(self, action, item_name, quantity, unit, description='', delta=None, previous_name=None):
+        """
+        Build an inventory transaction document (see InventoryManager._transaction).
+        """
+        transaction = {
+            'location': self.location,
+            'action': action,
+            'item_name': item_name,
+            'quantity': quantity,
+            'unit': unit,
+            'description': description,
+            'timestamp': datetime.now()
+        }
+        if delta is not None:
+            transaction['delta'] = delta
+        if previous_name is not None:
+            transaction['previous_name'] = previous_name
+        return transaction
+    
+    async def _record_update(self, previous_item, updated_item):
+        try:
+            quantity_delta = updated_item['quantity'] - previous_item['quantity']
+        except TypeError:
+            # Non-numeric quantity stored by a client; nothing to replay
+            quantity_delta = 0
+        renamed = updated_item['name'] != previous_item['name']
+        if quantity_delta or renamed:
+            await self._record_transactions([self._transaction(
+                'update', updated_item['name'], updated_item['quantity'], updated_item.get('unit'),
+                'Item updated', delta=quantity_delta,
+                previous_name=previous_item['name'] if renamed else None
+            )])
+    
+    async def _check_thresholds(self, changes):
+        """
+        Queue a low stock alert for every item a write moved below its
+        threshold, in the outbox InventoryManager uses (see
+        InventoryManager._check_thresholds).
+        
+        Args:
+            changes (list): (item before the write, item after the write) tuples
+        """
+        if not ALERTS_ENABLED:
+            return
+        alerts = threshold_crossings(changes)
+        if alerts:
+            for alert in alerts:
+                alert['location'] = self.location
+            # The inventory write already succeeded; a lost alert must not fail it
+            try:
+                await self.alerts_collection.insert_many(alerts)
+            except Exception as e:
+                print(f"Error queueing low stock alerts: {e}")
+    
+    async def _record_transactions(self, transactions):
+        """
+        Number several inventory transactions from the location's counter,
+        shared with InventoryManager so snapshots replay both, and record them.
+        
+        Args:
+            transactions (list): Documents built by _transaction
+        """
+        if transactions:
+            counter = await self.counters_collection.find_one_and_update(
+                {'_id': transaction_counter_id(self.location)}, {'$inc': {'seq': len(transactions)}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+            first_seq = counter['seq'] - len(transactions) + 1
+            for offset, transaction in enumerate(transactions):
+                transaction['seq'] = first_seq + offset
+            await self.transactions_collection.insert_many(transactions)
@@ -0,0 +1,468 @@
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_SIZES = [100, 10000]
+CATEGORIES = ['Meat', 'Bread', 'Vegetable', 'Dairy', 'Sauce', 'Spice', 'Drink', 'Other']
+
+
+class StubBox:
+    """
+    Single detection in the shape returned by ultralytics `Boxes.numpy()`.
+    """
+    def __init__(self, class_id, confidence, xyxy):
+        self.cls = np.array([class_id], dtype=np.float32)
+        self.conf = np.array([confidence], dtype=np.float32)
+        self.xyxy = np.array([xyxy], dtype=np.float32)
+
+
+class StubBoxes:
+    """
+    Minimal stand-in for ultralytics `Boxes` supporting `.cpu().numpy()` and iteration.
+    """
+    def __init__(self, boxes):
+        self._boxes = boxes
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+    def __iter__(self):
+        return iter(self._boxes)
+
+    def __len__(self):
+        return len(self._boxes)
+
+
+class StubResult:
+    def __init__(self, boxes):
+        self.boxes = StubBoxes(boxes)
+
+
+class StubYOLO:
+    """
+    Stub YOLO model returning deterministic synthetic boxes, so the detection
+    post-processing can be benchmarked without model weights or torch.
+    """
+    def __init__(self, num_boxes=5, num_classes=12, image_size=(640, 480), latency=0.0, seed=0):
+        """
+        Args:
+            num_boxes (int): Number of boxes returned per image
+            num_classes (int): Number of classes to draw class IDs from
+            image_size (tuple): (width, height) used to place the boxes
+            latency (float): Seconds to sleep per call to simulate inference
+            seed (int): Seed for the synthetic boxes
+        """
+        self.num_boxes = num_boxes
+        self.num_classes = num_classes
+        self.image_size = image_size
+        self.latency = latency
+        self.seed = seed
+
+    def _boxes(self, rng):
+        width, height = self.image_size
+        boxes = []
+        for _ in range(self.num_boxes):
+            x1 = rng.randint(0, width // 2)
+            y1 = rng.randint(20, height // 2)
+            x2 = rng.randint(x1 + 10, width - 1)
+            y2 = rng.randint(y1 + 10, height - 1)
+            boxes.append(StubBox(rng.randrange(self.num_classes), rng.uniform(0.25, 0.99), [x1, y1, x2, y2]))
+        return boxes
+
+    def __call__(self, source, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        rng = random.Random(self.seed)
+        sources = source if isinstance(source, list) else [source]
+        return [StubResult(self._boxes(rng)) for _ in sources]
+
+
+def summarize(latencies, elapsed=None):
+    """
+    Summarize a list of latencies (in seconds).
+
+    Args:
+        latencies (list): Per-operation latencies in seconds
+        elapsed (float): Wall-clock time for all operations; defaults to the sum of latencies
+
+    Returns:
+        dict: Count, throughput and latency percentiles in milliseconds
+    """
+    if not latencies:
+        return {'count': 0}
+    values = np.array(latencies) * 1000
+    elapsed = elapsed if elapsed is not None else float(np.sum(latencies))
+    return {
+        'count': len(latencies),
+        'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        'mean_ms': round(float(values.mean()), 4),
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p95_ms': round(float(np.percentile(values, 95)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4),
+        'max_ms': round(float(values.max()), 4)
+    }
+
+
+def measure(func, iterations, warmup=3):
+    """
+    Call func repeatedly and return the summary of its latencies.
+    """
+    for _ in range(min(warmup, iterations)):
+        func()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def write_synthetic_image(path, width=640, height=480, seed=0):
+    """
+    Write a random JPEG so detection can run without sample photos.
+    """
+    import cv2
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    cv2.imwrite(path, image)
+    return path
+
+
+def bench_detection(args):
+    """
+    Benchmark FoodDetector.detect and ingredient aggregation.
+    """
+    from object_detection import FoodDetector
+
+    model = None
+    if args.stub_model:
+        model = StubYOLO(num_boxes=args.boxes, latency=args.stub_latency)
+    detector = FoodDetector(model_path=args.model, model=model)
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='inventra-bench-')
+    try:
+        image_path = os.path.abspath(args.image) if args.image else write_synthetic_image(os.path.join(workdir, 'bench.jpg'))
+        # Annotated images are written relative to the working directory
+        with working_directory(workdir):
+            results['detect'] = measure(lambda: detector.detect(image_path), args.iterations)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rng = random.Random(0)
+    foods = list(detector.food_ingredients)
+    detected_foods = {rng.choice(foods): rng.randint(1, 4) for _ in range(args.boxes)}
+    results['calculate_ingredients'] = measure(
+        lambda: detector.calculate_ingredients(detected_foods), args.iterations * 100
+    )
+    return results
+
+
+def make_client(args):
+    """
+    Connect to MongoDB, or to an in-memory stand-in when --in-memory is given.
+    """
+    if args.in_memory:
+        import mongomock
+        return mongomock.MongoClient()
+    from pymongo import MongoClient
+    return MongoClient(args.mongo_uri)
+
+
+def seed_inventory(manager, size, chunk_size=10000):
+    """
+    Fill the inventory with `size` synthetic items.
+
+    Returns:
+        list: Names of the seeded items
+    """
+    now = datetime.now()
+    names = []
+    batch = []
+    for i in range(size):
+        name = f"item-{i:07d}"
+        names.append(name)
+        batch.append({
+            'name': name,
+            'quantity': 1000,
+            'unit': 'g',
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            # Roughly 5% of items are below their threshold
+            'threshold': 2000 if i % 20 == 0 else 100,
+            'created_at': now,
+            'updated_at': now
+        })
+        if len(batch) >= chunk_size:
+            manager.storage.insert_items(batch)
+            batch = []
+    if batch:
+        manager.storage.insert_items(batch)
+
+    return names
+
+
+def bench_inventory(args):
+    """
+    Benchmark InventoryManager operations at each requested inventory size.
+    """
+    from inventory_manager import InventoryManager
+    from storage import SQLiteStorage
+
+    client = None if args.sqlite else make_client(args)
+    workdir = tempfile.mkdtemp(prefix='inventra-bench-')
+    results = {}
+    for size in args.sizes:
+        db_name = f"inventra_bench_{size}"
+        if args.sqlite:
+            manager = InventoryManager(storage=SQLiteStorage(os.path.join(workdir, f"{db_name}.db")))
+        else:
+            client.drop_database(db_name)
+            manager = InventoryManager(db_name=db_name, client=client)
+
+        start = time.perf_counter()
+        names = seed_inventory(manager, size)
+        seed_seconds = time.perf_counter() - start
+
+        rng = random.Random(size)
+        ingredients = [
+            {'name': rng.choice(names), 'quantity': 1, 'unit': 'g'} for _ in range(6)
+        ]
+        item_ids = [str(item['_id']) for item in manager.storage.list_items(limit=1000)]
+        recipe = manager.add_recipe('bench recipe', ingredients)
+        detection_results = {
+            'ingredients_needed': ingredients,
+            'detected_foods': [{'name': 'burger', 'count': 1}]
+        }
+        # Full scans get expensive quickly; keep the run time bounded for large inventories
+        scan_iterations = max(1, min(args.iterations, 1000000 // max(size, 1)))
+
+        size_results = {'seed_seconds': round(seed_seconds, 3)}
+        size_results['add_inventory_item_existing'] = measure(
+            lambda: manager.add_inventory_item(rng.choice(names), 1, 'g'), args.iterations
+        )
+        size_results['update_inventory_item'] = measure(
+            lambda: manager.update_inventory_item(rng.choice(item_ids), {'quantity': rng.randint(500, 1500)}),
+            args.iterations
+        )
+        size_results['update_inventory_from_detection'] = measure(
+            lambda: manager.update_inventory_from_detection(detection_results), args.iterations
+        )
+        size_results['prepare_recipe'] = measure(
+            lambda: manager.prepare_recipe(recipe['_id']), args.iterations
+        )
+        size_results['get_low_stock_items'] = measure(manager.get_low_stock_items, scan_iterations, warmup=1)
+        size_results['get_all_inventory'] = measure(manager.get_all_inventory, scan_iterations, warmup=1)
+        results[str(size)] = size_results
+
+        manager.close()
+        if client is not None and not args.keep_data:
+            client.drop_database(db_name)
+    if not args.keep_data:
+        shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        print(f"SQLite benchmark databases kept in {workdir}")
+    return results
+
+
+def encode_multipart(field_name, filename, content, content_type='image/jpeg'):
+    boundary = f"----inventra{random.getrandbits(64):016x}"
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def build_request(args):
+    """
+    Build a factory for the HTTP requests sent by the load generator.
+    """
+    url = args.url.rstrip('/')
+    if args.route == 'detect':
+        if args.image:
+            with open(args.image, 'rb') as f:
+                content = f.read()
+        else:
+            workdir = tempfile.mkdtemp(prefix='inventra-bench-')
+            path = write_synthetic_image(os.path.join(workdir, 'load.jpg'))
+            with open(path, 'rb') as f:
+                content = f.read()
+            shutil.rmtree(workdir, ignore_errors=True)
+        body, content_type = encode_multipart('image', 'load.jpg', content)
+        return lambda: urllib.request.Request(
+            f"{url}/api/detect", data=body, method='POST', headers={'Content-Type': content_type}
+        )
+    paths = {'inventory': '/api/inventory', 'low-stock': '/api/low-stock', 'recipes': '/api/recipes', 'health': '/api/health'}
+    return lambda: urllib.request.Request(f"{url}{paths[args.route]}", method='GET')
+
+
+def bench_load(args):
+    """
+    Drive a running Inventra server with concurrent clients and report throughput and latency percentiles.
+    """
+    make_request = build_request(args)
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def client_loop():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(make_request(), timeout=args.timeout) as response:
+                    response.read()
+                status = None
+            except urllib.error.HTTPError as e:
+                status = str(e.code)
+            except Exception as e:
+                status = type(e).__name__
+            latency = time.perf_counter() - start
+            with lock:
+                if status is None:
+                    latencies.append(latency)
+                else:
+                    errors[status] = errors.get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(client_loop)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(latencies, elapsed)
+    summary.update({'route': args.route, 'concurrency': args.concurrency, 'errors': errors})
+    return {args.route: summary}
+
+
+def run_metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def flatten(results, prefix=''):
+    """
+    Flatten nested results into {'a.b.p50_ms': value} pairs for comparison.
+    """
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline_path):
+    """
+    Print the relative change of every latency/throughput metric against a previous run.
+    """
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f)['results'])
+    print(f"\nComparison against {baseline_path}:")
+    print("-" * 50)
+    for name, value in flatten(current).items():
+        if not name.endswith(('_ms', 'throughput_per_s')) or not baseline.get(name):
+            continue
+        change = (value - baseline[name]) / baseline[name] * 100
+        print(f"  {name}: {baseline[name]} -> {value} ({change:+.1f}%)")
+
+
+def print_results(results, indent=0):
+    for key, value in results.items():
+        if isinstance(value, dict) and any(isinstance(v, dict) for v in value.values()):
+            print(" " * indent + f"{key}:")
+            print_results(value, indent + 2)
+        elif isinstance(value, dict) and 'p50_ms' in value:
+            print(" " * indent + f"{key}: n={value['count']} "
+                  f"p50={value['p50_ms']}ms p95={value['p95_ms']}ms p99={value['p99_ms']}ms "
+                  f"throughput={value['throughput_per_s']}/s")
+        else:
+            print(" " * indent + f"{key}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Inventra detection and inventory hot paths')
+    parser.add_argument('--iterations', type=int, default=200, help='Iterations per micro-benchmark')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this path')
+    parser.add_argument('--compare', type=str, help='Compare against a previous JSON results file')
+    subparsers = parser.add_subparsers(dest='suite', required=True)
+
+    detect_parser = subparsers.add_parser('detect', help='FoodDetector.detect and ingredient aggregation')
+    detect_parser.add_argument('--model', type=str, default='best.pt', help='Path to the YOLOv8 model file')
+    detect_parser.add_argument('--stub-model', action='store_true', help='Use a stub model instead of loading weights')
+    detect_parser.add_argument('--stub-latency', type=float, default=0.0, help='Simulated inference time per image (s)')
+    detect_parser.add_argument('--boxes', type=int, default=5, help='Boxes returned per image by the stub model')
+    detect_parser.add_argument('--image', type=str, help='Image to run detection on (default: synthetic)')
+
+    inventory_parser = subparsers.add_parser('inventory', help='InventoryManager operations')
+    inventory_parser.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',')], default=DEFAULT_SIZES,
+                                  help='Comma-separated inventory sizes, e.g. 100,10000,1000000')
+    inventory_parser.add_argument('--mongo-uri', type=str, default=os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+    inventory_parser.add_argument('--in-memory', action='store_true', help='Use mongomock instead of a mongod')
+    inventory_parser.add_argument('--sqlite', action='store_true', help='Use the embedded SQLite storage backend')
+    inventory_parser.add_argument('--keep-data', action='store_true', help='Keep the benchmark databases')
+
+    load_parser = subparsers.add_parser('load', help='Load generator against a running server')
+    load_parser.add_argument('--url', type=str, default='http://localhost:5000')
+    load_parser.add_argument('--route', choices=['detect', 'inventory', 'low-stock', 'recipes', 'health'], default='inventory')
+    load_parser.add_argument('--concurrency', type=int, default=8)
+    load_parser.add_argument('--duration', type=float, default=30.0, help='Seconds to generate load for')
+    load_parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout (s)')
+    load_parser.add_argument('--image', type=str, help='Image uploaded for the detect route (default: synthetic)')
+
+    args = parser.parse_args()
+    suites = {'detect': bench_detection, 'inventory': bench_inventory, 'load': bench_load}
+    results = {args.suite: suites[args.suite](args)}
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': run_metadata(), 'args': vars(args), 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import time
+import threading
+
+class CachedValue:
+    """
+    A lazily computed value that is kept until it expires or is invalidated.
+    
+    Invalidation is generation based: a value computed while an invalidation
+    happened is returned to its caller but not cached, so a write that lands
+    during a slow computation is never hidden behind a stale result.
+    """
+    def __init__(self, compute, ttl=60.0):
+        """
+        Args:
+            compute (callable): Function returning the value
+            ttl (float): Seconds a computed value stays valid even without
+                invalidation (covers writes made by other processes)
+        """
+        self.compute = compute
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._value = None
+        self._expires_at = 0.0
+        self._has_value = False
+    
+    def get(self):
+        """
+        Return the cached value, computing it if needed.
+        """
+        with self._lock:
+            if self._has_value and time.monotonic() < self._expires_at:
+                return self._value
+            generation = self._generation
+        
+        value = self.compute()
+        
+        with self._lock:
+            if generation == self._generation:
+                self._value = value
+                self._has_value = True
+                self._expires_at = time.monotonic() + self.ttl
+        return value
+    
+    def invalidate(self, *args, **kwargs):
+        """
+        Drop the cached value. Accepts and ignores any arguments so it can be
+        registered directly as an InventoryManager write listener.
+        """
+        with self._lock:
+            self._generation += 1
+            self._has_value = False
+            self._value = None
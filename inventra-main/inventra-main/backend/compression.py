@@ -0,0 +1,88 @@
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Responses smaller than this many bytes are sent uncompressed; compressing them
+# costs more time than the bytes saved
+COMPRESSION_MIN_SIZE = int(os.getenv('INVENTRA_COMPRESSION_MIN_SIZE', 1024))
+# Fast settings suited to compressing every response on the fly
+GZIP_LEVEL = int(os.getenv('INVENTRA_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('INVENTRA_BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain'}
+
+def negotiate_encoding(accept_encoding):
+    """
+    Choose the content encoding for a response.
+    
+    Args:
+        accept_encoding (str): Accept-Encoding request header
+    
+    Returns:
+        str: 'br', 'gzip' or None to send the response uncompressed
+    """
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    
+    wildcard = accepted.get('*', 0.0)
+    # Brotli compresses JSON better than gzip at a similar speed, so it wins ties
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = None
+    best_quality = 0.0
+    for coding in candidates:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def compress_response(response, accept_encoding, min_size=COMPRESSION_MIN_SIZE):
+    """
+    Compress a response body with the best encoding the client accepts.
+    
+    Only buffered responses with a text or JSON body are compressed; files
+    sent with send_file (e.g. the WebP annotated images) and streamed
+    responses are left as they are.
+    
+    Args:
+        response (Response): Response to compress in place
+        accept_encoding (str): Accept-Encoding request header
+        min_size (int): Smallest body compressed, in bytes
+    
+    Returns:
+        Response: The response
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    
+    data = response.get_data()
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None or len(data) < min_size:
+        return response
+    
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
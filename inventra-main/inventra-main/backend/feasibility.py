@@ -0,0 +1,135 @@
+import os
+import numpy as np
+
+from cache import CachedValue
+
+# Seconds a feasibility result is reused. Local writes invalidate it right away;
+# the TTL bounds how stale it can get after writes made by other server processes
+FEASIBILITY_CACHE_TTL = float(os.getenv('INVENTRA_FEASIBILITY_CACHE_TTL', '30'))
+
+class RecipeFeasibility:
+    """
+    Computes how many servings of every recipe the current inventory allows.
+    
+    All recipes are evaluated in one vectorized pass: a recipe x ingredient
+    matrix of per-serving requirements is divided into the inventory vector,
+    and the row minimum gives the servings and the limiting ingredient.
+    """
+    def __init__(self, inventory_manager, ttl=FEASIBILITY_CACHE_TTL):
+        """
+        Args:
+            inventory_manager (InventoryManager): Source of recipes and inventory
+            ttl (float): Seconds a result is reused when no local write invalidated it
+        """
+        self.inventory_manager = inventory_manager
+        self._cache = CachedValue(self.compute, ttl=ttl)
+        # Any inventory or recipe write makes the cached result stale
+        inventory_manager.add_listener(self._cache.invalidate)
+    
+    def get(self):
+        """
+        Get the feasibility of every recipe, using the cached result when possible.
+        
+        Returns:
+            list: Feasibility for each recipe (see compute)
+        """
+        return self._cache.get()
+    
+    def invalidate(self):
+        """
+        Drop the cached result so the next call recomputes it.
+        """
+        self._cache.invalidate()
+    
+    def for_ingredients(self, ingredient_names):
+        """
+        Compute the feasibility of only the recipes using any of several
+        ingredients, e.g. those whose stock a detection just reduced.
+        
+        Args:
+            ingredient_names (iterable): Ingredient names
+            
+        Returns:
+            list: Feasibility for each recipe using the ingredients (see compute)
+        """
+        return self.compute(self.inventory_manager.get_recipes_using(ingredient_names))
+    
+    def compute(self, recipes=None):
+        """
+        Compute the feasibility of recipes from the current inventory.
+        
+        Args:
+            recipes (list): Recipes to evaluate (default: every recipe)
+        
+        Returns:
+            list: One dict per recipe with 'recipe_id', 'name', 'max_servings',
+                'limiting_ingredient' and 'insufficient_ingredients'
+        """
+        if recipes is None:
+            recipes = self.inventory_manager.storage.list_recipes()
+        
+        if not recipes:
+            return []
+        
+        # Column index for every ingredient used by any recipe
+        ingredient_index = {}
+        units = {}
+        for recipe in recipes:
+            for ingredient in recipe.get('ingredients', []):
+                ingredient_index.setdefault(ingredient['name'], len(ingredient_index))
+                units.setdefault(ingredient['name'], ingredient.get('unit'))
+        names = list(ingredient_index)
+        
+        # Per-serving requirements; repeated ingredients within a recipe add up
+        rows, cols, amounts = [], [], []
+        for row, recipe in enumerate(recipes):
+            for ingredient in recipe.get('ingredients', []):
+                rows.append(row)
+                cols.append(ingredient_index[ingredient['name']])
+                amounts.append(float(ingredient['quantity']))
+        requirements = np.zeros((len(recipes), len(names)))
+        np.add.at(requirements, (rows, cols), amounts)
+        
+        available = self._available(names, ingredient_index)
+        
+        # Servings each ingredient allows; ingredients a recipe does not use never limit it
+        used = requirements > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(used, available / np.where(used, requirements, 1.0), np.inf)
+        limiting = ratios.argmin(axis=1)
+        max_servings = np.floor(ratios[np.arange(len(recipes)), limiting])
+        has_ingredients = used.any(axis=1)
+        short = used & (available < requirements)
+        
+        results = []
+        for row, recipe in enumerate(recipes):
+            result = {
+                'recipe_id': str(recipe['_id']),
+                'name': recipe['name'],
+                'max_servings': int(max_servings[row]) if has_ingredients[row] else 0,
+                'limiting_ingredient': None,
+                'insufficient_ingredients': [names[col] for col in np.flatnonzero(short[row])]
+            }
+            if has_ingredients[row]:
+                col = limiting[row]
+                result['limiting_ingredient'] = {
+                    'name': names[col],
+                    'required': float(requirements[row, col]),
+                    'available': float(available[col]),
+                    'unit': units[names[col]]
+                }
+            results.append(result)
+        
+        return results
+    
+    def _available(self, names, ingredient_index):
+        # Quantities in stock, read from the in-memory inventory index when enabled
+        index = self.inventory_manager.inventory_index
+        if index is not None:
+            return np.maximum(index.quantities(names), 0.0)
+        available = np.zeros(len(names))
+        for item in self.inventory_manager.storage.list_items():
+            col = ingredient_index.get(item['name'])
+            if col is not None:
+                available[col] = max(float(item['quantity']), 0.0)
+        return available
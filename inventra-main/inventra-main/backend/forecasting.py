@@ -0,0 +1,174 @@
+import os
+from datetime import datetime, date, timedelta
+import numpy as np
+
+from cache import CachedValue
+
+# Days of consumption history the forecast is fitted on
+FORECAST_HISTORY_DAYS = int(os.getenv('INVENTRA_FORECAST_HISTORY_DAYS', 56))
+# Smoothing factor of the exponential smoothing model (higher reacts faster)
+FORECAST_ALPHA = float(os.getenv('INVENTRA_FORECAST_ALPHA', 0.3))
+# Seconds fitted consumption rates are reused; they change at most daily
+FORECAST_CACHE_TTL = float(os.getenv('INVENTRA_FORECAST_CACHE_TTL', 900))
+
+FORECAST_METHODS = ('ewma', 'moving_average')
+
+def exponential_smoothing(consumption, alpha):
+    """
+    Final level of simple exponential smoothing for every row at once.
+    
+    The recursion level = alpha * x + (1 - alpha) * level, started at the
+    first value, unrolls into fixed weights per day, so the whole matrix is
+    smoothed with one matrix-vector product.
+    
+    Args:
+        consumption (np.ndarray): Items x days matrix, oldest day first
+        alpha (float): Smoothing factor
+    
+    Returns:
+        np.ndarray: Smoothed daily consumption per item
+    """
+    days = consumption.shape[1]
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=float)
+    weights[0] = (1 - alpha) ** (days - 1)
+    return consumption @ weights
+
+def moving_average(consumption, window):
+    """
+    Mean daily consumption over the last window days for every row.
+    """
+    return consumption[:, -window:].mean(axis=1)
+
+class DemandForecaster:
+    """
+    Forecasts daily consumption of every item and suggests reorders.
+    
+    Consumption is read from the transaction log as one aggregation of daily
+    totals per item, arranged in an items x days matrix and fitted for all
+    items at once.
+    """
+    def __init__(self, inventory_manager, history_days=FORECAST_HISTORY_DAYS, alpha=FORECAST_ALPHA,
+                 cache_ttl=FORECAST_CACHE_TTL):
+        """
+        Args:
+            inventory_manager (InventoryManager): Source of transactions and stock levels
+            history_days (int): Days of history to fit on
+            alpha (float): Smoothing factor for exponential smoothing
+            cache_ttl (float): Seconds fitted rates are reused
+        """
+        self.inventory_manager = inventory_manager
+        self.history_days = history_days
+        self.alpha = alpha
+        self._rates = {
+            method: CachedValue(lambda method=method: self.daily_rates(method), ttl=cache_ttl)
+            for method in FORECAST_METHODS
+        }
+    
+    def consumption_matrix(self, today=None):
+        """
+        Get the daily consumption history of every item.
+        
+        Args:
+            today (date): Last day of the history (default: today)
+        
+        Returns:
+            tuple: (item names, items x days consumption matrix, oldest day first)
+        """
+        today = today or date.today()
+        first_day = today - timedelta(days=self.history_days - 1)
+        rows = self.inventory_manager.storage.daily_consumption(
+            datetime.combine(first_day, datetime.min.time())
+        )
+        
+        names = sorted({row['item_name'] for row in rows})
+        index = {name: i for i, name in enumerate(names)}
+        matrix = np.zeros((len(names), self.history_days))
+        if rows:
+            item_index = np.array([index[row['item_name']] for row in rows])
+            day_index = np.array([(date.fromisoformat(row['day']) - first_day).days for row in rows])
+            quantities = np.array([float(row['quantity']) for row in rows])
+            # Ignore rows outside the window (e.g. timestamps from a clock in the future)
+            inside = (day_index >= 0) & (day_index < self.history_days)
+            np.add.at(matrix, (item_index[inside], day_index[inside]), quantities[inside])
+        return names, matrix
+    
+    def daily_rates(self, method='ewma'):
+        """
+        Fit the forecast daily consumption of every item.
+        
+        Args:
+            method (str): 'ewma' (exponential smoothing) or 'moving_average'
+        
+        Returns:
+            dict: Forecast daily consumption by item name
+        """
+        names, matrix = self.consumption_matrix()
+        if not names:
+            return {}
+        if method == 'moving_average':
+            rates = moving_average(matrix, min(7, self.history_days))
+        else:
+            rates = exponential_smoothing(matrix, self.alpha)
+        return dict(zip(names, rates.tolist()))
+    
+    def reorder_suggestions(self, lead_time_days=2, cover_days=7, method='ewma', include_all=False):
+        """
+        Project when every item reaches its threshold and runs out, and how
+        much to order.
+        
+        An item needs reordering when it will fall below its threshold before
+        an order placed now arrives and covers the following cover_days.
+        
+        Args:
+            lead_time_days (float): Days between ordering and delivery
+            cover_days (float): Days of consumption an order should cover
+            method (str): Forecast method (see daily_rates)
+            include_all (bool): Include items that do not need reordering
+        
+        Returns:
+            list: Suggestions sorted by days until the threshold is reached
+        """
+        if method not in FORECAST_METHODS:
+            raise ValueError(f"Unknown forecast method: {method}")
+        rates_by_name = self._rates[method].get()
+        items = self.inventory_manager.storage.list_items()
+        if not items:
+            return []
+        
+        quantity = np.array([float(item['quantity']) for item in items])
+        threshold = np.array([float(item.get('threshold', 0) or 0) for item in items])
+        rate = np.array([rates_by_name.get(item['name'], 0.0) for item in items])
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            days_to_threshold = np.where(rate > 0, np.maximum(quantity - threshold, 0) / rate, np.inf)
+            days_to_stockout = np.where(rate > 0, np.maximum(quantity, 0) / rate, np.inf)
+        # Bring the stock up to the threshold plus lead time and cover period of demand
+        order_quantity = np.maximum(rate * (lead_time_days + cover_days) + threshold - quantity, 0)
+        needs_reorder = (days_to_threshold <= lead_time_days + cover_days) | (quantity < threshold)
+        
+        today = date.today()
+        suggestions = []
+        for i in np.argsort(days_to_threshold, kind='stable'):
+            if not include_all and not needs_reorder[i]:
+                continue
+            item = items[i]
+            suggestions.append({
+                'item_id': str(item['_id']),
+                'name': item['name'],
+                'unit': item.get('unit'),
+                'quantity': item['quantity'],
+                'threshold': item.get('threshold'),
+                'daily_usage': round(float(rate[i]), 3),
+                'days_to_threshold': round(float(days_to_threshold[i]), 1) if np.isfinite(days_to_threshold[i]) else None,
+                'threshold_date': self._date_after(today, days_to_threshold[i]),
+                'stockout_date': self._date_after(today, days_to_stockout[i]),
+                'suggested_order_quantity': round(float(order_quantity[i]), 2),
+                'reorder': bool(needs_reorder[i])
+            })
+        return suggestions
+    
+    @staticmethod
+    def _date_after(today, days):
+        if not np.isfinite(days):
+            return None
+        return (today + timedelta(days=int(np.floor(days)))).isoformat()
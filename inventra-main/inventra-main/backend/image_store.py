@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import cv2
+
+# Directory the annotated images are stored in
+ANNOTATED_DIR = os.getenv('INVENTRA_ANNOTATED_DIR', os.path.join('static', 'annotated'))
+# Longest side of a stored annotated image in pixels
+ANNOTATED_MAX_SIZE = int(os.getenv('INVENTRA_ANNOTATED_MAX_SIZE', 800))
+ANNOTATED_WEBP_QUALITY = int(os.getenv('INVENTRA_ANNOTATED_WEBP_QUALITY', 80))
+# Total bytes of annotated images kept; the least recently used are evicted beyond it
+ANNOTATED_DISK_BUDGET = int(os.getenv('INVENTRA_ANNOTATED_DISK_BUDGET', 256 * 1024 * 1024))
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+class AnnotatedImageStore:
+    """
+    Content-addressed store of annotated detection images.
+    
+    Images are keyed by a hash of the uploaded image, the detections and the
+    encoding settings, so a repeated upload reuses the stored image without
+    decoding or encoding anything, and uploads that share a file name never
+    overwrite each other. Images are stored as size-capped WebP thumbnails.
+    Reading an image refreshes its modification time, and when the directory
+    exceeds the disk budget the least recently used images are deleted.
+    """
+    def __init__(self, directory=ANNOTATED_DIR, max_size=ANNOTATED_MAX_SIZE, quality=ANNOTATED_WEBP_QUALITY,
+                 disk_budget=ANNOTATED_DISK_BUDGET):
+        """
+        Args:
+            directory (str): Directory the images are stored in
+            max_size (int): Longest side of a stored image in pixels
+            quality (int): WebP quality (1-100)
+            disk_budget (int): Total bytes of images kept
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.quality = quality
+        self.disk_budget = disk_budget
+        self._lock = threading.Lock()
+        self._total_size = None
+    
+    def key_for(self, image_data, detections):
+        """
+        Get the key of the annotated image for an upload.
+        
+        Args:
+            image_data (bytes): Contents of the uploaded image
+            detections (list): Detections drawn on the image
+        
+        Returns:
+            str: 32 hex digit key
+        """
+        sha = hashlib.sha256(image_data)
+        sha.update(json.dumps([detections, self.max_size, self.quality], sort_keys=True).encode('utf-8'))
+        return sha.hexdigest()[:32]
+    
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.webp")
+    
+    @staticmethod
+    def url(key):
+        """
+        Get the URL the API serves an image at.
+        """
+        return f"/api/annotated/{key}.webp"
+    
+    def touch(self, key):
+        """
+        Mark an image as recently used.
+        
+        Returns:
+            bool: True if the image is stored
+        """
+        try:
+            os.utime(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def lookup(self, key):
+        """
+        Get the path of a stored image and mark it as recently used.
+        
+        Returns:
+            str: Path of the image, or None if the key is invalid or not stored
+        """
+        if not KEY_PATTERN.match(key) or not self.touch(key):
+            return None
+        return self.path(key)
+    
+    def thumbnail(self, image):
+        """
+        Scale an image down so its longest side is at most max_size.
+        
+        Returns:
+            tuple: (scaled image, scale factor)
+        """
+        height, width = image.shape[:2]
+        scale = min(1.0, self.max_size / max(height, width))
+        if scale < 1.0:
+            image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        return image, scale
+    
+    def put(self, key, image):
+        """
+        Encode and store an annotated image.
+        
+        Args:
+            key (str): Key from key_for
+            image (np.ndarray): BGR image, already scaled with thumbnail()
+        
+        Returns:
+            str: Path of the stored image
+        """
+        ok, encoded = cv2.imencode('.webp', image, [cv2.IMWRITE_WEBP_QUALITY, self.quality])
+        if not ok:
+            raise ValueError('Could not encode the annotated image')
+        data = encoded.tobytes()
+        
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        # Write under a temporary name so the image is never served half-written
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+        
+        with self._lock:
+            if self._total_size is None:
+                self._total_size = self._disk_usage()
+            else:
+                self._total_size += len(data)
+            if self._total_size > self.disk_budget:
+                self._evict()
+        return path
+    
+    def _entries(self):
+        try:
+            with os.scandir(self.directory) as entries:
+                return [entry for entry in entries if entry.name.endswith('.webp') and entry.is_file()]
+        except FileNotFoundError:
+            return []
+    
+    def _disk_usage(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+    
+    def _evict(self):
+        # Rescan the directory, since other server processes write to it too,
+        # and evict down to 90% of the budget so eviction does not run on every write
+        files = sorted(
+            ((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self._entries())
+        )
+        total = sum(size for _, size, _ in files)
+        target = self.disk_budget * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Evicted by another process
+            total -= size
+        self._total_size = total
+
+# Shared by the detectors and the route serving the images
+annotated_images = AnnotatedImageStore()
@@ -0,0 +1,199 @@
+import os
+import io
+import math
+import csv
+import json
+import argparse
+
+from inventory_manager import InventoryManager
+
+# Number of lines applied per bulk write
+IMPORT_CHUNK_SIZE = int(os.getenv('INVENTRA_IMPORT_CHUNK_SIZE', 500))
+
+# Invalid lines are skipped; only the first ones are reported back
+MAX_REPORTED_ERRORS = 100
+
+FORMATS = ('csv', 'ndjson')
+
+def detect_format(filename=None, content_type=None):
+    """
+    Guess the import format from a file name or content type.
+    
+    Args:
+        filename (str): Name of the uploaded file
+        content_type (str): MIME type of the upload
+    
+    Returns:
+        str: 'csv' or 'ndjson', or None if unknown
+    """
+    if filename:
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.csv':
+            return 'csv'
+        if extension in ('.ndjson', '.jsonl', '.json'):
+            return 'ndjson'
+    if content_type:
+        content_type = content_type.split(';')[0].strip().lower()
+        if content_type in ('text/csv', 'application/csv'):
+            return 'csv'
+        if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json'):
+            return 'ndjson'
+    return None
+
+def parse_number(value, field):
+    """
+    Parse a numeric field, keeping whole numbers as integers.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid {field}: {value!r}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError(f"Invalid {field}: {value!r}")
+        return value
+    try:
+        text = str(value).strip()
+        number = float(text)
+    except ValueError:
+        raise ValueError(f"Invalid {field}: {value!r}")
+    # NaN and infinity are not quantities, and would break every total they end up in
+    if not math.isfinite(number):
+        raise ValueError(f"Invalid {field}: {value!r}")
+    return int(number) if number.is_integer() and '.' not in text else number
+
+def normalize_record(record):
+    """
+    Validate one import line and convert it to an inventory item.
+    
+    Args:
+        record (dict): Raw fields of the line
+    
+    Returns:
+        dict: Item with 'name', 'quantity', 'unit' and optionally 'category'
+            and 'threshold'
+    
+    Raises:
+        ValueError: If a required field is missing or invalid
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Expected an object')
+    record = {str(key).strip().lower(): value for key, value in record.items() if key is not None}
+    
+    for field in ('name', 'quantity', 'unit'):
+        if record.get(field) in (None, ''):
+            raise ValueError(f"Missing {field}")
+    
+    item = {
+        'name': str(record['name']).strip(),
+        'quantity': parse_number(record['quantity'], 'quantity'),
+        'unit': str(record['unit']).strip()
+    }
+    if item['quantity'] < 0:
+        raise ValueError('Quantity cannot be negative')
+    if record.get('category') not in (None, ''):
+        item['category'] = str(record['category']).strip()
+    if record.get('threshold') not in (None, ''):
+        item['threshold'] = parse_number(record['threshold'], 'threshold')
+    return item
+
+def read_records(stream, fmt):
+    """
+    Read the raw lines of a CSV (with a header row) or NDJSON file.
+    
+    Args:
+        stream: Text stream to read from
+        fmt (str): 'csv' or 'ndjson'
+    
+    Yields:
+        tuple: (line number, record dict or the ValueError for an unparseable line)
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e.msg}")
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+def import_inventory(inventory_manager, stream, fmt, chunk_size=IMPORT_CHUNK_SIZE, description='Bulk import'):
+    """
+    Stream a CSV or NDJSON delivery into the inventory.
+    
+    The file is parsed lazily and applied in chunks, so memory use does not
+    grow with the file size. Invalid lines are skipped and reported.
+    
+    Args:
+        inventory_manager (InventoryManager): Inventory to update
+        stream: Text or binary stream with the file contents
+        fmt (str): 'csv' or 'ndjson'
+        chunk_size (int): Number of lines per bulk write
+        description (str): Description of the recorded transactions
+    
+    Returns:
+        dict: Import summary with 'processed', 'inserted', 'updated',
+            'skipped' and the first 'errors'
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    
+    errors = []
+    skipped = 0
+    
+    def valid_items():
+        nonlocal skipped
+        for line_number, record in read_records(stream, fmt):
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                yield normalize_record(record)
+            except ValueError as e:
+                skipped += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': line_number, 'error': str(e)})
+    
+    summary = inventory_manager.import_items(valid_items(), chunk_size=chunk_size, description=description)
+    summary['skipped'] = skipped
+    summary['errors'] = errors
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Import inventory from CSV or NDJSON files')
+    parser.add_argument('files', nargs='+', help='CSV (with a header row) or NDJSON files to import')
+    parser.add_argument('--format', choices=FORMATS, help='File format (default: from the file extension)')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Lines per bulk write')
+    parser.add_argument('--description', type=str, default='Bulk import', help='Description of the recorded transactions')
+    args = parser.parse_args()
+    
+    inventory_manager = InventoryManager()
+    
+    try:
+        for path in args.files:
+            fmt = args.format or detect_format(path)
+            if fmt is None:
+                print(f"Error: Cannot tell the format of {path}; use --format")
+                continue
+            
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                summary = import_inventory(
+                    inventory_manager, f, fmt, chunk_size=args.chunk_size, description=args.description
+                )
+            
+            print(f"{path}: {summary['processed']} lines imported "
+                  f"({summary['inserted']} new items, {summary['updated']} updated), {summary['skipped']} skipped")
+            for error in summary['errors']:
+                print(f"  line {error['line']}: {error['error']}")
+    finally:
+        inventory_manager.close()
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@ import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
+from inventory_manager import InventoryManager
+
 # Load environment variables
 load_dotenv()
 
@@ -19,6 +21,10 @@ def init_database():
     db.inventory.drop()
     db.recipes.drop()
     db.transactions.drop()
+    # Sequence numbers, snapshots and alerts refer to the dropped transactions and items
+    db.counters.drop()
+    db.snapshots.drop()
+    db.alerts.drop()
     
     # Create sample inventory items
     inventory_items = [
@@ -227,9 +233,10 @@ def init_database():
         }
     ]
     
-    # Insert inventory items
-    db.inventory.insert_many(inventory_items)
-    print(f"Inserted {len(inventory_items)} inventory items")
+    # Insert inventory items through the bulk import path
+    inventory_manager = InventoryManager(client=client)
+    summary = inventory_manager.import_items(inventory_items, description='Initial stock')
+    print(f"Inserted {summary['inserted']} inventory items")
     
     # Create sample recipes
     recipes = [
@@ -345,8 +352,9 @@ def init_database():
         }
     ]
     
-    # Insert recipes
-    db.recipes.insert_many(recipes)
+    # Insert recipes through the manager, which stamps their location
+    for recipe in recipes:
+        inventory_manager.add_recipe(recipe['name'], recipe['ingredients'], recipe['instructions'], recipe['category'])
     print(f"Inserted {len(recipes)} recipes")
     
     print("Database initialization complete!")
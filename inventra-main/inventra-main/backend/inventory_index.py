@@ -0,0 +1,260 @@
+import os
+import math
+import numbers
+import time
+import threading
+import numpy as np
+
+from storage import updated_millis
+
+INVENTORY_INDEX_ENABLED = os.getenv('INVENTRA_INVENTORY_INDEX', '1') == '1'
+# Seconds between checks that the index still matches the database. Writes made
+# by other server processes are picked up after at most this long; 0 checks
+# before every use
+INVENTORY_INDEX_VERIFY_INTERVAL = float(os.getenv('INVENTRA_INVENTORY_INDEX_VERIFY_INTERVAL', 5))
+# Seconds between full reloads, which also pick up renames made by other processes
+INVENTORY_INDEX_RESYNC_INTERVAL = float(os.getenv('INVENTRA_INVENTORY_INDEX_RESYNC_INTERVAL', 300))
+
+def _to_float(value):
+    # Missing or non-numeric values (stored by a client) become NaN, which is
+    # never low on stock and is left out of the totals like the database does
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return math.nan
+    return float(value)
+
+def _to_number(value):
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+class InventoryIndex:
+    """
+    In-memory copy of the quantities and thresholds of one location's inventory.
+    
+    Item names map to slots in NumPy arrays, so ingredient lookups, feasibility
+    estimates and the low stock listing need no database query. The database
+    stays the source of truth: quantities read from the index are never used
+    to compute what is written, InventoryManager applies its own writes to the
+    index once they succeeded, and every verify_interval seconds the index
+    compares its totals with the database's (one aggregate query) and reloads
+    itself when they differ, e.g. after writes made by another server process.
+    The totals include the sum of the items' update times, so writes that
+    leave the quantities adding up to the same are noticed too.
+    """
+    def __init__(self, inventory_manager, verify_interval=INVENTORY_INDEX_VERIFY_INTERVAL,
+                 resync_interval=INVENTORY_INDEX_RESYNC_INTERVAL):
+        """
+        Args:
+            inventory_manager (InventoryManager): Manager whose storage is indexed
+            verify_interval (float): Seconds between consistency checks
+            resync_interval (float): Seconds between full reloads
+        """
+        self.inventory_manager = inventory_manager
+        self.verify_interval = verify_interval
+        self.resync_interval = resync_interval
+        self.resync_count = 0
+        self.drift_count = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._verified_at = 0.0
+        self._generation = 0
+        self._reset(0)
+    
+    def _reset(self, capacity):
+        self._slots = {}
+        self._slot_by_id = {}
+        self._ids = [None] * capacity
+        self._names = [None] * capacity
+        self._units = [None] * capacity
+        self._quantity = np.full(capacity, np.nan)
+        self._threshold = np.full(capacity, np.nan)
+        # updated_at in milliseconds since the epoch, summed like the database does
+        self._updated = np.zeros(capacity, dtype=np.int64)
+        self._live = np.zeros(capacity, dtype=bool)
+        self._free = []
+        self._size = 0
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._slots)
+    
+    def resync(self):
+        """
+        Reload the index from the database.
+        """
+        with self._load_lock:
+            with self._lock:
+                generation = self._generation
+            items = self.inventory_manager.storage.list_items()
+            with self._lock:
+                self._reset(max(len(items), 16))
+                for item in items:
+                    self._set(self._allocate(item), item)
+                self._loaded = True
+                self._loaded_at = self._verified_at = time.monotonic()
+                if generation != self._generation:
+                    # A local write landed while loading; check the result on next use
+                    self._verified_at = 0.0
+                self.resync_count += 1
+    
+    def verify(self):
+        """
+        Compare the totals of the index with the database and reload on drift.
+        
+        Returns:
+            bool: True if the index matched the database
+        """
+        totals = self.inventory_manager.storage.inventory_totals()
+        with self._lock:
+            live = self._live[:self._size]
+            matches = (
+                totals['count'] == len(self._slots)
+                and math.isclose(_to_float(totals['quantity']), float(np.nansum(self._quantity[:self._size][live])),
+                                 rel_tol=1e-9, abs_tol=1e-6)
+                and math.isclose(_to_float(totals['threshold']), float(np.nansum(self._threshold[:self._size][live])),
+                                 rel_tol=1e-9, abs_tol=1e-6)
+                and totals['updated'] == int(self._updated[:self._size][live].sum())
+            )
+            if matches:
+                self._verified_at = time.monotonic()
+                return True
+            self.drift_count += 1
+        print(f"Inventory index of location {self.inventory_manager.location} drifted from the database, reloading")
+        self.resync()
+        return False
+    
+    def invalidate(self, *args, **kwargs):
+        """
+        Drop the index so the next use reloads it. Accepts and ignores any
+        arguments so it can be registered as an InventoryManager write listener.
+        """
+        with self._lock:
+            self._loaded = False
+            self._generation += 1
+    
+    def _ensure_current(self):
+        now = time.monotonic()
+        if not self._loaded or now - self._loaded_at >= self.resync_interval:
+            self.resync()
+        elif now - self._verified_at >= self.verify_interval:
+            self.verify()
+    
+    def _allocate(self, item):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._size
+            if slot == len(self._ids):
+                self._grow()
+            self._size += 1
+        self._slots[item['name']] = slot
+        self._slot_by_id[str(item['_id'])] = slot
+        self._live[slot] = True
+        return slot
+    
+    def _grow(self):
+        capacity = max(2 * len(self._ids), 16)
+        extra = capacity - len(self._ids)
+        self._ids.extend([None] * extra)
+        self._names.extend([None] * extra)
+        self._units.extend([None] * extra)
+        self._quantity = np.concatenate([self._quantity, np.full(extra, np.nan)])
+        self._threshold = np.concatenate([self._threshold, np.full(extra, np.nan)])
+        self._updated = np.concatenate([self._updated, np.zeros(extra, dtype=np.int64)])
+        self._live = np.concatenate([self._live, np.zeros(extra, dtype=bool)])
+    
+    def _set(self, slot, item):
+        self._ids[slot] = item['_id']
+        self._names[slot] = item['name']
+        self._units[slot] = item.get('unit')
+        self._quantity[slot] = _to_float(item.get('quantity'))
+        self._threshold[slot] = _to_float(item.get('threshold'))
+        self._updated[slot] = updated_millis(item.get('updated_at'))
+    
+    def _item(self, slot):
+        return {
+            '_id': self._ids[slot],
+            'name': self._names[slot],
+            'quantity': _to_number(self._quantity[slot]),
+            'unit': self._units[slot],
+            'threshold': _to_number(self._threshold[slot])
+        }
+    
+    def get_items(self, names):
+        """
+        Look up several inventory items by name.
+        
+        Args:
+            names (iterable): Item names
+        
+        Returns:
+            dict: Items with '_id', 'name', 'quantity', 'unit' and 'threshold',
+                keyed by name; unknown names are left out
+        """
+        self._ensure_current()
+        with self._lock:
+            return {name: self._item(self._slots[name]) for name in names if name in self._slots}
+    
+    def quantities(self, names):
+        """
+        Get the quantities of several items as an array, 0 for unknown items.
+        """
+        self._ensure_current()
+        with self._lock:
+            slots = [self._slots.get(name, -1) for name in names]
+            quantities = np.zeros(len(slots))
+            known = np.array([slot >= 0 for slot in slots], dtype=bool)
+            if known.any():
+                quantities[known] = self._quantity[np.array(slots)[known]]
+        return np.nan_to_num(quantities, nan=0.0)
+    
+    def low_stock_names(self):
+        """
+        Get the names of the items that are below their threshold.
+        """
+        self._ensure_current()
+        with self._lock:
+            size = self._size
+            with np.errstate(invalid='ignore'):
+                low = self._live[:size] & (self._quantity[:size] < self._threshold[:size])
+            return [self._names[slot] for slot in np.flatnonzero(low)]
+    
+    def upsert(self, item):
+        """
+        Apply a written item (the full document, or at least '_id', 'name',
+        'quantity', 'unit', 'threshold' and 'updated_at' as written; without
+        'updated_at' the next check reloads the index).
+        """
+        with self._lock:
+            self._generation += 1
+            if not self._loaded:
+                return
+            slot = self._slot_by_id.get(str(item['_id']))
+            if slot is None:
+                slot = self._allocate(item)
+            elif self._names[slot] != item['name']:
+                # Renamed
+                self._slots.pop(self._names[slot], None)
+                self._slots[item['name']] = slot
+            self._set(slot, item)
+    
+    def remove(self, item_id):
+        """
+        Remove a deleted item.
+        """
+        with self._lock:
+            self._generation += 1
+            if not self._loaded:
+                return
+            slot = self._slot_by_id.pop(str(item_id), None)
+            if slot is None:
+                return
+            self._slots.pop(self._names[slot], None)
+            self._ids[slot] = self._names[slot] = self._units[slot] = None
+            self._quantity[slot] = self._threshold[slot] = np.nan
+            self._updated[slot] = 0
+            self._live[slot] = False
+            self._free.append(slot)
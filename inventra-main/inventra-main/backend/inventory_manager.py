@@ -1,44 +1,149 @@
-import os
-import json
+import threading
 from datetime import datetime
-from bson import ObjectId
-from pymongo import MongoClient
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-# MongoDB connection string
-MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
-
-class JSONEncoder(json.JSONEncoder):
-    """
-    Custom JSON encoder to handle MongoDB ObjectId and datetime objects
-    """
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return json.JSONEncoder.default(self, obj)
+from storage import MONGO_URI, create_storage
+from transaction_log import TRANSACTION_WRITE_BEHIND, TransactionWriter
+from alerts import ALERTS_ENABLED, is_low_stock, threshold_crossings
+from inventory_index import INVENTORY_INDEX_ENABLED, InventoryIndex
+from recipe_index import RECIPE_INDEX_ENABLED, RecipeIndex
+from json_provider import to_json_compatible
 
 class InventoryManager:
-    def __init__(self, db_name='inventra'):
+    def __init__(self, db_name='inventra', client=None, create_indexes=True, storage=None, location=None):
         """
-        Initialize the inventory manager with MongoDB connection.
+        Initialize the inventory manager with its storage backend.
+        
+        A manager works on the inventory, recipes and transactions of one
+        location (restaurant site); every query and write is scoped to it.
         
         Args:
             db_name (str): Name of the MongoDB database
+            client: Existing MongoDB client to use instead of connecting
+                to MONGO_URI (e.g. an in-memory client for benchmarks)
+            create_indexes (bool): Create the indexes before returning. Servers
+                pass False and call ensure_indexes_async() so startup does not
+                wait on the database
+            storage (StorageBackend): Storage backend to use. Defaults to the
+                backend selected by INVENTRA_STORAGE (MongoDB unless set to sqlite)
+            location (str): Location to work on (default: the location of
+                storage, or INVENTRA_LOCATION). A given storage is shared, scoped
+                to this location
+        """
+        self.db_name = db_name
+        self.indexes_ready = False
+        self._index_thread = None
+        self._listeners = []
+        self.transaction_writer = None
+        if storage is None:
+            storage = create_storage(db_name, client=client)
+        self.storage = storage.for_location(location) if location is not None else storage
+        self.location = self.storage.location
+        # Quantities and thresholds kept in memory for ingredient lookups and
+        # the low stock listing; writes never rely on them
+        self.inventory_index = InventoryIndex(self) if INVENTORY_INDEX_ENABLED else None
+        # Recipes using each ingredient, for finding the recipes an inventory change affects
+        self.recipe_index = RecipeIndex(self) if RECIPE_INDEX_ENABLED else None
+        
+        if create_indexes:
+            self.ensure_indexes()
+    
+    def add_listener(self, callback):
+        """
+        Register a callback run after every inventory or recipe write.
+        
+        Args:
+            callback (callable): Called as callback(kind, names) where kind is
+                'inventory' or 'recipes' and names lists the affected item or
+                recipe names (None when unknown)
         """
-        self.client = MongoClient(MONGO_URI)
-        self.db = self.client[db_name]
-        self.inventory_collection = self.db['inventory']
-        self.recipes_collection = self.db['recipes']
-        self.transactions_collection = self.db['transactions']
+        self._listeners.append(callback)
+    
+    def _notify(self, kind, names=None):
+        for callback in self._listeners:
+            try:
+                callback(kind, names)
+            except Exception as e:
+                print(f"Error in {kind} write listener: {e}")
+    
+    def ensure_indexes(self):
+        """
+        Create the indexes used by the inventory queries.
+        """
+        self.storage.ensure_indexes()
+        self.indexes_ready = True
+    
+    def ensure_indexes_async(self):
+        """
+        Create the indexes in a background thread.
         
-        # Create indexes for better performance
-        self.inventory_collection.create_index('name', unique=True)
-        self.recipes_collection.create_index('name', unique=True)
+        Returns:
+            threading.Thread: The thread creating the indexes
+        """
+        if self._index_thread is None or not self._index_thread.is_alive():
+            self._index_thread = threading.Thread(
+                target=self._ensure_indexes_in_background, name='index-builder', daemon=True
+            )
+            self._index_thread.start()
+        return self._index_thread
+    
+    def _ensure_indexes_in_background(self):
+        try:
+            self.ensure_indexes()
+        except Exception as e:
+            print(f"Error creating indexes: {e}")
+    
+    def start_sync(self):
+        """
+        Start background replication to the central database, if the storage
+        backend has one (the SQLite backend syncs its transaction log).
+        """
+        self.storage.start_sync()
+    
+    def start_transaction_writer(self):
+        """
+        Write the transaction log in the background (write-behind) instead of
+        inside each request, unless INVENTRA_TRANSACTION_WRITE_BEHIND is 0.
+        
+        Returns:
+            TransactionWriter: The writer, or None if write-behind is disabled
+        """
+        if TRANSACTION_WRITE_BEHIND and self.transaction_writer is None:
+            self.transaction_writer = TransactionWriter(self.storage).start()
+        return self.transaction_writer
+    
+    def ping(self, timeout=1.0):
+        """
+        Check that the database is reachable.
+        
+        Args:
+            timeout (float): Maximum seconds to wait, including server selection
+            
+        Returns:
+            bool: True if the database answered the ping
+        """
+        return self.storage.ping(timeout)
+    
+    def reconnect(self):
+        """
+        Reopen the database connection.
+        
+        Database connections are not fork-safe, so each forked server worker
+        must call this before using a manager created in the parent process.
+        """
+        self.storage.reconnect()
+        if self.inventory_index is not None:
+            self.inventory_index.invalidate()
+        if self.recipe_index is not None:
+            self.recipe_index.invalidate()
+    
+    def close(self):
+        """
+        Close the database connection, writing any buffered transactions first.
+        """
+        if self.transaction_writer is not None:
+            self.transaction_writer.close()
+            self.transaction_writer = None
+        self.storage.close()
     
     def get_all_inventory(self):
         """
@@ -47,8 +152,8 @@ class InventoryManager:
         Returns:
             list: List of inventory items
         """
-        inventory = list(self.inventory_collection.find())
-        return json.loads(JSONEncoder().encode(inventory))
+        inventory = self.storage.list_items()
+        return to_json_compatible(inventory)
     
     def add_inventory_item(self, name, quantity, unit, category='Other', threshold=10):
         """
@@ -65,15 +170,16 @@ class InventoryManager:
             dict: The added inventory item
         """
         # Check if item already exists
-        existing_item = self.inventory_collection.find_one({'name': name})
+        existing_item = self.storage.get_item_by_name(name)
         if existing_item:
             # Update quantity if item exists
-            self.inventory_collection.update_one(
-                {'_id': existing_item['_id']},
-                {'$inc': {'quantity': quantity}}
-            )
-            updated_item = self.inventory_collection.find_one({'_id': existing_item['_id']})
-            return json.loads(JSONEncoder().encode(updated_item))
+            self.storage.increment_item(existing_item['_id'], quantity)
+            updated_item = self.storage.get_item(existing_item['_id'])
+            self._record_transaction('add', name, quantity, existing_item.get('unit', unit), 'Added stock', delta=quantity)
+            self._update_index(updated_item)
+            self._check_thresholds([(existing_item, updated_item)])
+            self._notify('inventory', [name])
+            return to_json_compatible(updated_item)
         
         # Create new item if it doesn't exist
         new_item = {
@@ -86,13 +192,83 @@ class InventoryManager:
             'updated_at': datetime.now()
         }
         
-        result = self.inventory_collection.insert_one(new_item)
-        new_item['_id'] = result.inserted_id
+        self.storage.insert_item(new_item)
+        self._update_index(new_item)
         
         # Record transaction
-        self._record_transaction('add', name, quantity, unit, 'Initial stock')
+        self._record_transaction('add', name, quantity, unit, 'Initial stock', delta=quantity)
+        self._notify('inventory', [name])
+        
+        return to_json_compatible(new_item)
+    
+    def import_items(self, items, chunk_size=500, description='Bulk import'):
+        """
+        Add stock for many items at once, e.g. a supplier delivery.
+        
+        Items are applied in chunks: each chunk is one bulk upsert (new items
+        are created, existing ones get their quantity incremented) plus one
+        bulk insert of the transactions.
+        
+        Args:
+            items (iterable): Dicts with 'name', 'quantity' and 'unit', and
+                optionally 'category' and 'threshold' (used for new items)
+            chunk_size (int): Number of items per bulk write
+            description (str): Description of the recorded transactions
+            
+        Returns:
+            dict: Number of items 'processed', 'inserted' and 'updated'
+        """
+        summary = {'processed': 0, 'inserted': 0, 'updated': 0}
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                self._import_chunk(chunk, description, summary)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk, description, summary)
+        return summary
+    
+    def _import_chunk(self, chunk, description, summary):
+        # Lines for the same item are merged so every name is upserted once
+        merged = {}
+        transactions = []
+        now = datetime.now()
+        for item in chunk:
+            name = item['name']
+            if name in merged:
+                merged[name]['quantity'] += item['quantity']
+            else:
+                merged[name] = {
+                    'name': name,
+                    'quantity': item['quantity'],
+                    'unit': item['unit'],
+                    'category': item.get('category', 'Other'),
+                    'threshold': item.get('threshold', 10),
+                    'created_at': now
+                }
+            transactions.append({
+                'action': 'add',
+                'item_name': name,
+                'quantity': item['quantity'],
+                'unit': item['unit'],
+                'description': description,
+                'timestamp': now,
+                'delta': item['quantity']
+            })
         
-        return json.loads(JSONEncoder().encode(new_item))
+        if self.transaction_writer is not None:
+            result = self.storage.upsert_items(list(merged.values()), [])
+            self._record_transactions(transactions)
+        else:
+            result = self.storage.upsert_items(list(merged.values()), transactions)
+        summary['processed'] += len(chunk)
+        summary['inserted'] += result['inserted']
+        summary['updated'] += result['updated']
+        # The resulting quantities are not read back, so the index is reloaded
+        if self.inventory_index is not None:
+            self.inventory_index.invalidate()
+        self._notify('inventory', list(merged))
     
     def update_inventory_item(self, item_id, update_data):
         """
@@ -106,21 +282,27 @@ class InventoryManager:
             dict: The updated inventory item or None if not found
         """
         try:
-            # Convert string ID to ObjectId
-            object_id = ObjectId(item_id)
-            
             # Add updated_at timestamp
             update_data['updated_at'] = datetime.now()
+            # An item stays at the location it was created at
+            update_data.pop('location', None)
             
-            # Update the item
-            result = self.inventory_collection.update_one(
-                {'_id': object_id},
-                {'$set': update_data}
-            )
+            # Quantity edits and renames are recorded so stock history can be
+            # replayed, and quantity or threshold edits can trigger a low stock alert
+            previous_item = None
+            if 'quantity' in update_data or 'name' in update_data or 'threshold' in update_data:
+                previous_item = self.storage.get_item(item_id)
             
-            if result.modified_count > 0:
-                updated_item = self.inventory_collection.find_one({'_id': object_id})
-                return json.loads(JSONEncoder().encode(updated_item))
+            # Update the item
+            if self.storage.update_item(item_id, update_data):
+                updated_item = self.storage.get_item(item_id)
+                if updated_item:
+                    self._update_index(updated_item)
+                if previous_item and updated_item:
+                    self._record_update(previous_item, updated_item)
+                    self._check_thresholds([(previous_item, updated_item)])
+                self._notify('inventory', [updated_item['name']] if updated_item else None)
+                return to_json_compatible(updated_item)
             return None
         except Exception as e:
             print(f"Error updating inventory item: {e}")
@@ -137,13 +319,19 @@ class InventoryManager:
             bool: True if deleted successfully, False otherwise
         """
         try:
-            # Convert string ID to ObjectId
-            object_id = ObjectId(item_id)
-            
             # Delete the item
-            result = self.inventory_collection.delete_one({'_id': object_id})
-            
-            return result.deleted_count > 0
+            item = self.storage.get_item(item_id)
+            deleted = self.storage.delete_item(item_id)
+            if deleted:
+                if self.inventory_index is not None:
+                    self.inventory_index.remove(item_id)
+                if item:
+                    self._record_transaction(
+                        'delete', item['name'], item['quantity'], item.get('unit'),
+                        'Item deleted', delta=-item['quantity']
+                    )
+                self._notify('inventory', [item['name']] if item else None)
+            return deleted
         except Exception as e:
             print(f"Error deleting inventory item: {e}")
             return False
@@ -163,41 +351,48 @@ class InventoryManager:
         
         ingredients_needed = detection_results['ingredients_needed']
         update_results = []
+        transactions = []
+        changes = []
+        detected_summary = ', '.join(
+            f"{food['name']} (x{food['count']})" for food in detection_results['detected_foods']
+        )
+        
+        # Look up every ingredient at once
+        inventory_items = self._find_items_by_name(ingredient['name'] for ingredient in ingredients_needed)
         
         for ingredient in ingredients_needed:
             name = ingredient['name']
             quantity = ingredient['quantity']
             unit = ingredient['unit']
             
-            # Check if ingredient exists in inventory
-            inventory_item = self.inventory_collection.find_one({'name': name})
+            inventory_item = inventory_items.get(name)
             
             if not inventory_item:
                 # Add new ingredient to inventory with zero quantity
                 self.add_inventory_item(name, 0, unit)
-                inventory_item = self.inventory_collection.find_one({'name': name})
+                inventory_item = self.storage.get_item_by_name(name)
             
-            # Calculate new quantity (subtract used ingredients)
-            current_quantity = inventory_item['quantity']
-            new_quantity = max(0, current_quantity - quantity)  # Prevent negative quantities
-            
-            # Update inventory
-            self.inventory_collection.update_one(
-                {'_id': inventory_item['_id']},
-                {'$set': {
-                    'quantity': new_quantity,
-                    'updated_at': datetime.now()
-                }}
-            )
+            # Subtract the used quantity in the database, which stops at zero;
+            # the quantity known here may be stale if another process wrote since
+            previous_item, updated_item = self.storage.deduct_item(inventory_item['_id'], quantity)
+            if previous_item is None:
+                # Deleted meanwhile
+                continue
+            current_quantity = previous_item['quantity']
+            new_quantity = updated_item['quantity']
+            inventory_items[name] = updated_item
+            changes.append((previous_item, updated_item))
+            self._update_index(updated_item)
             
             # Record transaction
-            self._record_transaction(
+            transactions.append(self._transaction(
                 'subtract', 
                 name, 
                 quantity, 
                 unit, 
-                f"Used in detected food: {', '.join([f'{food['name']} (x{food['count']})' for food in detection_results['detected_foods']])}"
-            )
+                f"Used in detected food: {detected_summary}",
+                delta=new_quantity - current_quantity
+            ))
             
             # Add to update results
             update_results.append({
@@ -208,6 +403,10 @@ class InventoryManager:
                 'unit': unit
             })
         
+        self._record_transactions(transactions)
+        self._check_thresholds(changes)
+        self._notify('inventory', [update['name'] for update in update_results])
+        
         return {
             'success': True,
             'updates': update_results
@@ -220,8 +419,8 @@ class InventoryManager:
         Returns:
             list: List of recipes
         """
-        recipes = list(self.recipes_collection.find())
-        return json.loads(JSONEncoder().encode(recipes))
+        recipes = self.storage.list_recipes()
+        return to_json_compatible(recipes)
     
     def add_recipe(self, name, ingredients, instructions='', category='Other'):
         """
@@ -237,9 +436,9 @@ class InventoryManager:
             dict: The added recipe
         """
         # Check if recipe already exists
-        existing_recipe = self.recipes_collection.find_one({'name': name})
+        existing_recipe = self.storage.get_recipe_by_name(name)
         if existing_recipe:
-            return json.loads(JSONEncoder().encode(existing_recipe))
+            return to_json_compatible(existing_recipe)
         
         # Create new recipe
         new_recipe = {
@@ -251,10 +450,12 @@ class InventoryManager:
             'updated_at': datetime.now()
         }
         
-        result = self.recipes_collection.insert_one(new_recipe)
-        new_recipe['_id'] = result.inserted_id
+        self.storage.insert_recipe(new_recipe)
+        if self.recipe_index is not None:
+            self.recipe_index.upsert(new_recipe)
+        self._notify('recipes', [name])
         
-        return json.loads(JSONEncoder().encode(new_recipe))
+        return to_json_compatible(new_recipe)
     
     def update_recipe(self, recipe_id, update_data):
         """
@@ -268,21 +469,20 @@ class InventoryManager:
             dict: The updated recipe or None if not found
         """
         try:
-            # Convert string ID to ObjectId
-            object_id = ObjectId(recipe_id)
-            
             # Add updated_at timestamp
             update_data['updated_at'] = datetime.now()
+            update_data.pop('location', None)
             
             # Update the recipe
-            result = self.recipes_collection.update_one(
-                {'_id': object_id},
-                {'$set': update_data}
-            )
-            
-            if result.modified_count > 0:
-                updated_recipe = self.recipes_collection.find_one({'_id': object_id})
-                return json.loads(JSONEncoder().encode(updated_recipe))
+            if self.storage.update_recipe(recipe_id, update_data):
+                updated_recipe = self.storage.get_recipe(recipe_id)
+                if self.recipe_index is not None:
+                    if updated_recipe:
+                        self.recipe_index.upsert(updated_recipe)
+                    else:
+                        self.recipe_index.remove(recipe_id)
+                self._notify('recipes', [updated_recipe['name']] if updated_recipe else None)
+                return to_json_compatible(updated_recipe)
             return None
         except Exception as e:
             print(f"Error updating recipe: {e}")
@@ -299,17 +499,36 @@ class InventoryManager:
             bool: True if deleted successfully, False otherwise
         """
         try:
-            # Convert string ID to ObjectId
-            object_id = ObjectId(recipe_id)
-            
             # Delete the recipe
-            result = self.recipes_collection.delete_one({'_id': object_id})
-            
-            return result.deleted_count > 0
+            deleted = self.storage.delete_recipe(recipe_id)
+            if deleted:
+                if self.recipe_index is not None:
+                    self.recipe_index.remove(recipe_id)
+                self._notify('recipes')
+            return deleted
         except Exception as e:
             print(f"Error deleting recipe: {e}")
             return False
     
+    def get_recipes_using(self, ingredient_names):
+        """
+        Get the recipes that use any of several ingredients.
+        
+        Args:
+            ingredient_names (iterable): Ingredient names
+            
+        Returns:
+            list: Matching recipes
+        """
+        ingredient_names = list(ingredient_names)
+        if self.recipe_index is not None:
+            # Find the recipes in memory and fetch only those by ID
+            recipe_ids = self.recipe_index.recipe_ids_using(ingredient_names)
+            recipes = self.storage.get_recipes_by_ids(list(recipe_ids)) if recipe_ids else []
+        else:
+            recipes = self.storage.get_recipes_using(ingredient_names) if ingredient_names else []
+        return to_json_compatible(recipes)
+    
     def prepare_recipe(self, recipe_id):
         """
         Prepare a recipe and update inventory accordingly.
@@ -317,82 +536,151 @@ class InventoryManager:
         Args:
             recipe_id (str): ID of the recipe to prepare
             
+        Returns:
+            dict: Result of the operation
+        """
+        result = self.prepare_recipes([{'recipe_id': recipe_id, 'servings': 1}])
+        if result['success']:
+            result['message'] = f"Recipe '{result['prepared'][0]['name']}' prepared successfully"
+        return result
+    
+    def prepare_recipes(self, orders):
+        """
+        Prepare several recipes, each any number of servings, in one operation.
+        
+        The ingredient requirements of all orders are added up and deducted
+        in one operation that checks each item has enough in the database (see
+        StorageBackend.deduct_quantities); nothing is deducted unless every
+        order can be prepared.
+        
+        Args:
+            orders (list): Dicts with 'recipe_id' and optional 'servings' (default 1)
+            
         Returns:
             dict: Result of the operation
         """
         try:
-            # Convert string ID to ObjectId
-            object_id = ObjectId(recipe_id)
+            # Add up the servings per recipe
+            servings_by_recipe = {}
+            for order in orders:
+                servings = order.get('servings', 1)
+                if isinstance(servings, bool) or not isinstance(servings, (int, float)) or servings <= 0:
+                    return {'success': False, 'message': f"Invalid servings for recipe {order.get('recipe_id')}"}
+                recipe_id = str(order['recipe_id'])
+                servings_by_recipe[recipe_id] = servings_by_recipe.get(recipe_id, 0) + servings
             
-            # Get the recipe
-            recipe = self.recipes_collection.find_one({'_id': object_id})
-            if not recipe:
-                return {'success': False, 'message': 'Recipe not found'}
+            if not servings_by_recipe:
+                return {'success': False, 'message': 'No recipes to prepare'}
             
-            # Check if all ingredients are available in sufficient quantities
-            insufficient_ingredients = []
-            for ingredient in recipe['ingredients']:
-                inventory_item = self.inventory_collection.find_one({'name': ingredient['name']})
-                
-                if not inventory_item or inventory_item['quantity'] < ingredient['quantity']:
-                    insufficient_ingredients.append({
-                        'name': ingredient['name'],
-                        'required': ingredient['quantity'],
-                        'available': inventory_item['quantity'] if inventory_item else 0,
-                        'unit': ingredient['unit']
+            # Get all recipes in one query
+            recipes = {str(recipe['_id']): recipe for recipe in self.storage.get_recipes_by_ids(servings_by_recipe)}
+            missing_recipes = [recipe_id for recipe_id in servings_by_recipe if recipe_id not in recipes]
+            if missing_recipes:
+                return {
+                    'success': False,
+                    'message': 'Recipe not found',
+                    'missing_recipes': missing_recipes
+                }
+            
+            # Total requirement of every ingredient across all orders
+            required = {}
+            units = {}
+            for recipe_id, servings in servings_by_recipe.items():
+                for ingredient in recipes[recipe_id]['ingredients']:
+                    name = ingredient['name']
+                    required[name] = required.get(name, 0) + ingredient['quantity'] * servings
+                    units.setdefault(name, ingredient['unit'])
+            
+            # Find the ingredients in one lookup. Their quantities are checked by
+            # the write itself, as the ones known here may be stale
+            inventory_items = self._find_items_by_name(required)
+            missing_ingredients = [name for name in required if name not in inventory_items]
+            if missing_ingredients:
+                return {
+                    'success': False,
+                    'message': 'Insufficient ingredients',
+                    'insufficient_ingredients': [
+                        {'name': name, 'required': required[name], 'available': 0, 'unit': units[name]}
+                        for name in missing_ingredients
+                    ]
+                }
+            
+            # One transaction per recipe ingredient keeps the history per recipe
+            transactions = []
+            now = datetime.now()
+            for recipe_id, servings in servings_by_recipe.items():
+                recipe = recipes[recipe_id]
+                description = f"Used in recipe: {recipe['name']}"
+                if servings != 1:
+                    description += f" (x{servings})"
+                for ingredient in recipe['ingredients']:
+                    transactions.append({
+                        'action': 'subtract',
+                        'item_name': ingredient['name'],
+                        'quantity': ingredient['quantity'] * servings,
+                        'unit': ingredient['unit'],
+                        'description': description,
+                        'timestamp': now,
+                        'delta': -ingredient['quantity'] * servings
                     })
             
-            if insufficient_ingredients:
+            amounts = {inventory_items[name]['_id']: quantity for name, quantity in required.items()}
+            if self.transaction_writer is not None:
+                deducted = self.storage.deduct_quantities(amounts, [])
+                if deducted is not None:
+                    self._record_transactions(transactions)
+            else:
+                deducted = self.storage.deduct_quantities(amounts, transactions)
+            
+            if deducted is None:
+                # Report the quantities that fell short
+                items = {item['name']: item for item in self.storage.get_items_by_names(list(required))}
+                for item in items.values():
+                    self._update_index(item)
+                insufficient_ingredients = []
+                for name, quantity in required.items():
+                    available = items[name]['quantity'] if name in items else 0
+                    if available < quantity:
+                        insufficient_ingredients.append({
+                            'name': name,
+                            'required': quantity,
+                            'available': available,
+                            'unit': units[name]
+                        })
                 return {
                     'success': False,
                     'message': 'Insufficient ingredients',
                     'insufficient_ingredients': insufficient_ingredients
                 }
             
-            # Update inventory by subtracting used ingredients
             inventory_updates = []
-            for ingredient in recipe['ingredients']:
-                inventory_item = self.inventory_collection.find_one({'name': ingredient['name']})
-                
-                # Calculate new quantity
-                current_quantity = inventory_item['quantity']
-                used_quantity = ingredient['quantity']
-                new_quantity = current_quantity - used_quantity
-                
-                # Update inventory
-                self.inventory_collection.update_one(
-                    {'_id': inventory_item['_id']},
-                    {'$set': {
-                        'quantity': new_quantity,
-                        'updated_at': datetime.now()
-                    }}
-                )
-                
-                # Record transaction
-                self._record_transaction(
-                    'subtract', 
-                    ingredient['name'], 
-                    used_quantity, 
-                    ingredient['unit'], 
-                    f"Used in recipe: {recipe['name']}"
-                )
-                
-                # Add to update results
+            changes = []
+            for name, quantity in required.items():
+                previous_item, updated_item = deducted[inventory_items[name]['_id']]
+                self._update_index(updated_item)
                 inventory_updates.append({
-                    'name': ingredient['name'],
-                    'previous_quantity': current_quantity,
-                    'used_quantity': used_quantity,
-                    'new_quantity': new_quantity,
-                    'unit': ingredient['unit']
+                    'name': name,
+                    'previous_quantity': previous_item['quantity'],
+                    'used_quantity': quantity,
+                    'new_quantity': updated_item['quantity'],
+                    'unit': units[name]
                 })
+                changes.append((previous_item, updated_item))
+            
+            self._check_thresholds(changes)
+            self._notify('inventory', list(required))
             
             return {
                 'success': True,
-                'message': f"Recipe '{recipe['name']}' prepared successfully",
+                'message': f"Prepared {len(servings_by_recipe)} recipe(s)",
+                'prepared': [
+                    {'recipe_id': recipe_id, 'name': recipes[recipe_id]['name'], 'servings': servings}
+                    for recipe_id, servings in servings_by_recipe.items()
+                ],
                 'inventory_updates': inventory_updates
             }
         except Exception as e:
-            print(f"Error preparing recipe: {e}")
+            print(f"Error preparing recipes: {e}")
             return {'success': False, 'message': str(e)}
     
     def get_low_stock_items(self):
@@ -402,22 +690,83 @@ class InventoryManager:
         Returns:
             list: List of low stock items
         """
-        low_stock_items = list(self.inventory_collection.find({
-            '$expr': {'$lt': ['$quantity', '$threshold']}
-        }))
+        if self.inventory_index is not None:
+            # Find the items in memory and fetch only those by name
+            names = self.inventory_index.low_stock_names()
+            items = self.storage.get_items_by_names(names) if names else []
+            low_stock_items = [item for item in items if is_low_stock(item)]
+        else:
+            low_stock_items = self.storage.low_stock_items()
         
-        return json.loads(JSONEncoder().encode(low_stock_items))
+        return to_json_compatible(low_stock_items)
     
-    def _record_transaction(self, action, item_name, quantity, unit, description=''):
+    def get_recent_alerts(self, limit=50):
         """
-        Record an inventory transaction.
+        Get the most recent low stock alerts with their delivery status.
         
         Args:
-            action (str): Type of action (add, subtract, update)
+            limit (int): Maximum number of alerts
+            
+        Returns:
+            list: Alerts, newest first
+        """
+        alerts = self.storage.list_alerts(limit)
+        return to_json_compatible(alerts)
+    
+    def get_dashboard_summary(self):
+        """
+        Get the figures shown on the dashboard.
+        
+        Returns:
+            dict: Totals, per-category counts, chart data, low stock items
+                and recent transactions
+        """
+        summary = self.storage.dashboard_summary()
+        return to_json_compatible(summary)
+    
+    def _find_items_by_name(self, names):
+        """
+        Look up several inventory items, from the in-memory index when enabled.
+        
+        Returns:
+            dict: Inventory items keyed by name
+        """
+        names = list(names)
+        if self.inventory_index is not None:
+            items = self.inventory_index.get_items(names)
+            # Items added by another process since the index was loaded
+            unknown = [name for name in names if name not in items]
+            if unknown:
+                items.update(self._find_items_in_storage(unknown))
+            return items
+        return self._find_items_in_storage(names)
+    
+    def _find_items_in_storage(self, names):
+        items = {item['name']: item for item in self.storage.get_items_by_names(names)}
+        for item in items.values():
+            self._update_index(item)
+        return items
+    
+    def _update_index(self, item):
+        if self.inventory_index is not None:
+            self.inventory_index.upsert(item)
+    
+    def _transaction(self, action, item_name, quantity, unit, description='', delta=None, previous_name=None):
+        """
+        Build an inventory transaction document.
+        
+        Args:
+            action (str): Type of action (add, subtract, update, delete)
             item_name (str): Name of the inventory item
             quantity (float): Quantity involved in the transaction
             unit (str): Unit of measurement
             description (str): Description of the transaction
+            delta (float): Signed change of the stored quantity, used to replay
+                the stock history
+            previous_name (str): Former name of a renamed item
+        
+        Returns:
+            dict: The transaction
         """
         transaction = {
             'action': action,
@@ -427,5 +776,65 @@ class InventoryManager:
             'description': description,
             'timestamp': datetime.now()
         }
+        if delta is not None:
+            transaction['delta'] = delta
+        if previous_name is not None:
+            transaction['previous_name'] = previous_name
+        return transaction
+    
+    def _record_transaction(self, action, item_name, quantity, unit, description='', delta=None, previous_name=None):
+        """
+        Record an inventory transaction (see _transaction for the arguments).
+        """
+        self._record_transactions([
+            self._transaction(action, item_name, quantity, unit, description, delta, previous_name)
+        ])
+    
+    def _record_update(self, previous_item, updated_item):
+        try:
+            quantity_delta = updated_item['quantity'] - previous_item['quantity']
+        except TypeError:
+            # Non-numeric quantity stored by a client; nothing to replay
+            quantity_delta = 0
+        renamed = updated_item['name'] != previous_item['name']
+        if quantity_delta or renamed:
+            self._record_transaction(
+                'update', updated_item['name'], updated_item['quantity'], updated_item.get('unit'),
+                'Item updated', delta=quantity_delta,
+                previous_name=previous_item['name'] if renamed else None
+            )
+    
+    def _check_thresholds(self, changes):
+        """
+        Queue a low stock alert for every item a write moved below its threshold.
+        
+        Args:
+            changes (list): (item before the write, item after the write) tuples
+        """
+        if not ALERTS_ENABLED:
+            return
+        alerts = threshold_crossings(changes)
+        if alerts:
+            # The inventory write already succeeded; a lost alert must not fail it
+            try:
+                self.storage.insert_alerts(alerts)
+            except Exception as e:
+                print(f"Error queueing low stock alerts: {e}")
+    
+    def _record_transactions(self, transactions):
+        """
+        Record transactions through the write-behind writer when it is running.
         
-        self.transactions_collection.insert_one(transaction)
\ No newline at end of file
+        Args:
+            transactions (list): Transaction documents
+        """
+        if not transactions:
+            return
+        # Stamped now so the transactions keep the location when they are
+        # buffered or spilled; they are numbered when they are stored
+        for transaction in transactions:
+            transaction['location'] = self.location
+        if self.transaction_writer is not None:
+            self.transaction_writer.write(transactions)
+        else:
+            self.storage.insert_transactions(transactions)
@@ -0,0 +1,54 @@
+import orjson
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+# Dict keys that are not strings (e.g. the model's class indices) are converted
+# to strings, and numpy arrays and scalars are serialized natively
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def json_default(obj):
+    """
+    Serialize the types orjson does not handle itself. Datetimes are handled
+    natively (as ISO 8601 strings).
+    """
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj):
+    """
+    Serialize an object to JSON.
+    
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    return orjson.dumps(obj, default=json_default, option=ORJSON_OPTIONS)
+
+def to_json_compatible(obj):
+    """
+    Convert MongoDB documents to plain JSON types (ObjectIds and datetimes
+    become strings).
+    
+    Args:
+        obj: Document, list of documents or any other JSON serializable value
+    
+    Returns:
+        The same value made of dicts, lists, strings, numbers, booleans and None
+    """
+    return orjson.loads(dumps(obj))
+
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider using orjson, which also serializes ObjectIds and
+    datetimes, so documents can be passed to jsonify() as they are.
+    """
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Build the response from the encoded bytes without a round trip through str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype='application/json')
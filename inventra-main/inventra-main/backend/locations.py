@@ -0,0 +1,120 @@
+import os
+
+from storage import check_location
+from inventory_manager import InventoryManager
+from feasibility import RecipeFeasibility
+from cache import CachedValue
+from snapshots import InventorySnapshots
+from forecasting import DemandForecaster
+from alerts import ALERTS_ENABLED, AlertNotifier
+from search import SearchIndex
+
+# Locations (restaurant sites) served, comma separated. The default location
+# (INVENTRA_LOCATION) is always served
+LOCATIONS = [name.strip() for name in os.getenv('INVENTRA_LOCATIONS', '').split(',') if name.strip()]
+
+class UnknownLocationError(LookupError):
+    """
+    Raised when a request names a location the server does not serve.
+    """
+
+class Location:
+    """
+    The inventory of one location and the services built on it.
+    """
+    def __init__(self, inventory_manager, dashboard_cache_ttl=5.0):
+        """
+        Args:
+            inventory_manager (InventoryManager): Manager scoped to the location
+            dashboard_cache_ttl (float): Seconds the dashboard summary is reused
+        """
+        self.name = inventory_manager.location
+        self.inventory_manager = inventory_manager
+        self.recipe_feasibility = RecipeFeasibility(inventory_manager)
+        self.dashboard_summary = CachedValue(inventory_manager.get_dashboard_summary, ttl=dashboard_cache_ttl)
+        inventory_manager.add_listener(self.dashboard_summary.invalidate)
+        self.snapshots = InventorySnapshots(inventory_manager)
+        self.demand_forecaster = DemandForecaster(inventory_manager)
+        self.alert_notifier = AlertNotifier(inventory_manager)
+        self.search = SearchIndex(inventory_manager)
+    
+    def start_background_tasks(self):
+        """
+        Start the write-behind transaction log, periodic snapshots and low
+        stock alert delivery of the location.
+        """
+        self.inventory_manager.start_transaction_writer()
+        self.snapshots.start()
+        if ALERTS_ENABLED:
+            self.alert_notifier.start()
+
+class LocationRegistry:
+    """
+    The locations served by the API.
+    
+    All locations share the database connection of the default location's
+    manager; only their queries differ.
+    """
+    def __init__(self, inventory_manager, names=LOCATIONS, dashboard_cache_ttl=5.0):
+        """
+        Args:
+            inventory_manager (InventoryManager): Manager of the default location
+            names (list): Other locations served
+            dashboard_cache_ttl (float): Seconds each dashboard summary is reused
+        """
+        self.default = Location(inventory_manager, dashboard_cache_ttl)
+        self._locations = {self.default.name: self.default}
+        for name in names:
+            if name not in self._locations:
+                manager = InventoryManager(storage=inventory_manager.storage, location=check_location(name),
+                                           create_indexes=False)
+                self._locations[name] = Location(manager, dashboard_cache_ttl)
+    
+    def __iter__(self):
+        return iter(list(self._locations.values()))
+    
+    @property
+    def names(self):
+        return list(self._locations)
+    
+    def get(self, name=None):
+        """
+        Get a location by name.
+        
+        Args:
+            name (str): Name of the location (default: the default location)
+        
+        Raises:
+            UnknownLocationError: If the location is not served
+        """
+        if not name:
+            return self.default
+        try:
+            return self._locations[name]
+        except KeyError:
+            raise UnknownLocationError(f"Unknown location: {name}")
+    
+    def reconnect(self):
+        """
+        Reopen the shared database connection (see InventoryManager.reconnect).
+        """
+        default_manager = self.default.inventory_manager
+        default_manager.reconnect()
+        for location in self:
+            if location is not self.default:
+                location.inventory_manager.storage = default_manager.storage.for_location(location.name)
+                if location.inventory_manager.inventory_index is not None:
+                    location.inventory_manager.inventory_index.invalidate()
+    
+    def start_background_tasks(self):
+        for location in self:
+            location.start_background_tasks()
+    
+    def close(self):
+        """
+        Write the buffered transactions of every location and close the connection.
+        """
+        for location in self:
+            if location is not self.default and location.inventory_manager.transaction_writer is not None:
+                location.inventory_manager.transaction_writer.close()
+        self.default.inventory_manager.close()
@@ -0,0 +1,445 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime
+import numpy as np
+
+from object_detection import FoodDetector, ModelNotReadyError
+
+# Directory that weights files selected through the API must be in
+MODEL_DIR = os.getenv('INVENTRA_MODEL_DIR', '.')
+# File shared by all server processes naming the models to serve
+MODEL_MANIFEST = os.getenv('INVENTRA_MODEL_MANIFEST', 'models.json')
+# Seconds between checks of the manifest and the weights files for changes
+MODEL_POLL_INTERVAL = float(os.getenv('INVENTRA_MODEL_POLL_INTERVAL', 10))
+# Latencies kept per model version for the percentiles
+MODEL_STATS_WINDOW = int(os.getenv('INVENTRA_MODEL_STATS_WINDOW', 1000))
+
+def file_digest(path):
+    """
+    Short SHA-256 of a file, identifying a weights file across processes.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()[:12]
+
+class ModelStats:
+    """
+    Running latency and detection statistics of one model version.
+    """
+    def __init__(self, window=MODEL_STATS_WINDOW):
+        self.requests = 0
+        self.errors = 0
+        self.detections = 0
+        self.confidence_sum = 0.0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, latency, detections=None):
+        """
+        Record one detection request.
+        
+        Args:
+            latency (float): Seconds the request took
+            detections (list): Detections returned, or None if the request failed
+        """
+        with self._lock:
+            self.requests += 1
+            if detections is None:
+                self.errors += 1
+                return
+            self._latencies.append(latency)
+            self.detections += len(detections)
+            self.confidence_sum += sum(detection['confidence'] for detection in detections)
+    
+    def summary(self):
+        """
+        Returns:
+            dict: Request and error counts, detections per request, mean
+                confidence and latency percentiles of the recent requests
+        """
+        with self._lock:
+            succeeded = self.requests - self.errors
+            summary = {
+                'requests': self.requests,
+                'errors': self.errors,
+                'detections_per_request': round(self.detections / succeeded, 3) if succeeded else None,
+                'mean_confidence': round(self.confidence_sum / self.detections, 4) if self.detections else None,
+                'latency_ms': None
+            }
+            if self._latencies:
+                latencies = np.array(self._latencies) * 1000
+                summary['latency_ms'] = {
+                    'mean': round(float(latencies.mean()), 2),
+                    'p50': round(float(np.percentile(latencies, 50)), 2),
+                    'p95': round(float(np.percentile(latencies, 95)), 2)
+                }
+        return summary
+
+class LoadedModel:
+    """
+    A weights file and the detector serving it.
+    """
+    def __init__(self, path, detector):
+        self.path = path
+        self.detector = detector
+        self.mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        self.loaded_at = datetime.now()
+        self._version = None
+    
+    @property
+    def version(self):
+        """
+        str: File name and content digest, the same in every server process.
+        
+        Hashing a weights file takes a while, so it is done on first use
+        rather than when the registry is created (e.g. on import of app.py).
+        """
+        if self._version is None:
+            digest = file_digest(self.path) if os.path.exists(self.path) else 'missing'
+            self._version = f"{os.path.basename(self.path)}@{digest}"
+        return self._version
+    
+    def same_file(self, path):
+        return (
+            os.path.realpath(path) == os.path.realpath(self.path)
+            and (os.path.getmtime(path) if os.path.exists(path) else None) == self.mtime
+        )
+
+class ModelRegistry:
+    """
+    Serves detections from the active model and optionally a candidate model.
+    
+    The models to serve are named in a manifest file shared by all server
+    processes. Each process polls the manifest and the weights files, and
+    loads and warms up a changed model in the background before swapping it
+    in, so requests keep being served by the previous model meanwhile. A
+    share of the detections can be routed to the candidate, and latency and
+    detection statistics are kept per model version to compare them.
+    """
+    def __init__(self, model_path='best.pt', manifest_path=MODEL_MANIFEST, model_dir=MODEL_DIR,
+                 poll_interval=MODEL_POLL_INTERVAL, lazy=True):
+        """
+        Args:
+            model_path (str): Weights file served when there is no manifest
+            manifest_path (str): Path of the manifest file
+            model_dir (str): Directory weights files selected through configure() must be in
+            poll_interval (float): Seconds between checks for changes
+            lazy (bool): Defer loading the active model until load(), load_async()
+                or the first detection
+        """
+        self.default_model_path = model_path
+        self.manifest_path = manifest_path
+        self.model_dir = model_dir
+        self.poll_interval = poll_interval
+        self.last_error = None
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._failed = {}
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        
+        manifest = self.read_manifest() or {}
+        active_path = manifest.get('active') or model_path
+        # Routing is replaced as a whole, so a request never sees a half-applied change
+        self._routes = (LoadedModel(active_path, FoodDetector(model_path=active_path, lazy=lazy)), None, 0)
+    
+    @property
+    def active(self):
+        """
+        LoadedModel: The model serving most detections.
+        """
+        return self._routes[0]
+    
+    @property
+    def candidate(self):
+        """
+        LoadedModel: The model under evaluation, or None.
+        """
+        return self._routes[1]
+    
+    @property
+    def is_ready(self):
+        """
+        bool: Whether the active model is loaded and can serve detections.
+        """
+        return self.active.detector.is_ready
+    
+    @property
+    def load_error(self):
+        return self.active.detector.load_error
+    
+    def load(self, warmup=True):
+        """
+        Load the active model in the calling thread (see FoodDetector.load).
+        """
+        active = self.active
+        active.detector.load(warmup=warmup)
+        # Hash the weights now too, so preforked workers inherit the version
+        active.version
+    
+    def load_async(self, warmup=True):
+        """
+        Load the active model in a background thread (see FoodDetector.load_async).
+        """
+        return self.active.detector.load_async(warmup=warmup)
+    
+    def detect(self, image_path):
+        """
+        Detect food items with the active model, or the candidate for its share of the traffic.
+        
+        Args:
+            image_path (str): Path to the image file
+        
+        Returns:
+            dict: Detection results (see FoodDetector.detect) and the
+                'model_version' that produced them
+        """
+        return self._route(lambda detector: detector.detect(image_path))
+    
+    def detect_upload(self, image_data):
+        """
+        Detect food items in an uploaded image, routed like detect().
+        
+        Args:
+            image_data (bytes): Contents of the image file
+        
+        Returns:
+            dict: Detection results (see FoodDetector.detect_upload) and the
+                'model_version' that produced them
+        """
+        return self._route(lambda detector: detector.detect_upload(image_data))
+    
+    def _route(self, run):
+        active, candidate, candidate_percent = self._routes
+        model = active
+        if candidate is not None and random.random() * 100 < candidate_percent:
+            model = candidate
+        
+        stats = self._stats_for(model.version)
+        start = time.perf_counter()
+        try:
+            results = run(model.detector)
+        except (ModelNotReadyError, FileNotFoundError, ValueError):
+            # Not the model's fault (e.g. an image that cannot be decoded)
+            raise
+        except Exception:
+            stats.record(time.perf_counter() - start)
+            raise
+        stats.record(time.perf_counter() - start, results['detections'])
+        results['model_version'] = model.version
+        return results
+    
+    def _stats_for(self, version):
+        with self._stats_lock:
+            if version not in self._stats:
+                self._stats[version] = ModelStats()
+            return self._stats[version]
+    
+    def read_manifest(self):
+        """
+        Read the manifest.
+        
+        Returns:
+            dict: 'active', 'candidate' and 'candidate_percent', or None if
+                there is no (valid) manifest
+        """
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.last_error = f"Invalid model manifest: {e}"
+            print(f"Error reading model manifest {self.manifest_path}: {e}")
+            return None
+        return manifest if isinstance(manifest, dict) else None
+    
+    def configure(self, **changes):
+        """
+        Change the models served by every server process.
+        
+        The manifest is updated and this process applies it right away (in
+        the background if polling is running); other processes pick it up
+        within the poll interval.
+        
+        Args:
+            active (str): Weights file of the active model
+            candidate (str): Weights file of the candidate model, or None to remove it
+            candidate_percent (float): Share of detections (0-100) routed to the candidate
+        
+        Returns:
+            dict: The new manifest
+        
+        Raises:
+            ValueError: If a weights file or the percentage is invalid
+        """
+        manifest = self.read_manifest() or {
+            'active': self.active.path,
+            'candidate': self.candidate.path if self.candidate else None,
+            'candidate_percent': self._routes[2]
+        }
+        if changes.get('active') is not None:
+            manifest['active'] = self._check_weights(changes['active'])
+        if 'candidate' in changes:
+            manifest['candidate'] = self._check_weights(changes['candidate']) if changes['candidate'] else None
+        if 'candidate_percent' in changes:
+            percent = changes['candidate_percent']
+            if isinstance(percent, bool) or not isinstance(percent, (int, float)) or not 0 <= percent <= 100:
+                raise ValueError('candidate_percent must be a number between 0 and 100')
+            manifest['candidate_percent'] = percent
+        if not manifest.get('candidate'):
+            manifest['candidate'] = None
+            manifest['candidate_percent'] = 0
+        
+        self._write_manifest(manifest)
+        if self._thread is not None and self._thread.is_alive():
+            self._wake.set()
+        else:
+            self.sync()
+        return manifest
+    
+    def promote(self):
+        """
+        Make the candidate the active model, reusing its warm detector.
+        
+        Raises:
+            ValueError: If there is no candidate
+        """
+        manifest = self.read_manifest() or {}
+        candidate = manifest.get('candidate') or (self.candidate.path if self.candidate else None)
+        if not candidate:
+            raise ValueError('There is no candidate model to promote')
+        return self.configure(active=candidate, candidate=None)
+    
+    def _check_weights(self, path):
+        if not isinstance(path, str) or not path.endswith('.pt'):
+            raise ValueError('Model must be a .pt weights file')
+        model_dir = os.path.realpath(self.model_dir)
+        if os.path.commonpath([model_dir, os.path.realpath(path)]) != model_dir:
+            raise ValueError(f"Model must be in {self.model_dir}")
+        if not os.path.isfile(path):
+            raise ValueError(f"Model file not found: {path}")
+        return path
+    
+    def _write_manifest(self, manifest):
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Replace the file atomically so other processes never read a partial manifest
+        with open(self.manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+    
+    def sync(self):
+        """
+        Apply the manifest and reload weights files that changed on disk.
+        
+        New models are loaded and warmed up before they are swapped in; a
+        model that fails to load leaves the previous one in place.
+        """
+        with self._sync_lock:
+            manifest = self.read_manifest() or {'active': self.default_model_path}
+            active, candidate, candidate_percent = self._routes
+            current = [model for model in (active, candidate) if model is not None]
+            
+            new_active = self._resolve(manifest.get('active') or self.default_model_path, current) or active
+            new_candidate = None
+            if manifest.get('candidate'):
+                new_candidate = self._resolve(manifest['candidate'], current)
+            candidate_percent = float(manifest.get('candidate_percent') or 0) if new_candidate else 0
+            
+            if (new_active, new_candidate, candidate_percent) != self._routes:
+                self._routes = (new_active, new_candidate, candidate_percent)
+                print(f"Serving model {new_active.version}" + (
+                    f" with {candidate_percent:g}% of detections on {new_candidate.version}" if new_candidate else ''
+                ))
+    
+    def _resolve(self, path, current):
+        """
+        Get the loaded model for a weights file, loading it if it is new or changed.
+        
+        Returns:
+            LoadedModel: The model, or None if it failed to load
+        """
+        for model in current:
+            if model.same_file(path):
+                return model
+        
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if self._failed.get(path) == mtime:
+            return None  # Already failed; retry once the file changes
+        try:
+            detector = FoodDetector(model_path=path, lazy=True)
+            detector.load(warmup=True)
+        except Exception as e:
+            self._failed[path] = mtime
+            self.last_error = f"Error loading model {path}: {e}"
+            print(self.last_error)
+            return None
+        self._failed.pop(path, None)
+        self.last_error = None
+        model = LoadedModel(path, detector)
+        # Hash the weights here, in the background, rather than on the next detection
+        model.version
+        return model
+    
+    def status(self):
+        """
+        Describe the served models and their statistics in this process.
+        
+        Returns:
+            dict: 'active' and 'candidate' models, 'candidate_percent',
+                'manifest' and 'last_error'
+        """
+        active, candidate, candidate_percent = self._routes
+        return {
+            'active': self._describe(active),
+            'candidate': self._describe(candidate) if candidate else None,
+            'candidate_percent': candidate_percent,
+            'manifest': self.manifest_path,
+            'last_error': self.last_error
+        }
+    
+    def _describe(self, model):
+        return {
+            'path': model.path,
+            'version': model.version,
+            'ready': model.detector.is_ready,
+            'loaded_at': model.loaded_at.isoformat(),
+            'classes': model.detector.class_names,
+            'stats': self._stats_for(model.version).summary()
+        }
+    
+    def start(self):
+        """
+        Poll the manifest and the weights files in a background thread.
+        
+        Returns:
+            threading.Thread: The polling thread
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='model-registry', daemon=True)
+            self._thread.start()
+        return self._thread
+    
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error reloading models: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
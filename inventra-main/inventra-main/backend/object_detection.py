@@ -1,22 +1,100 @@
+import io
 import os
+import math
+import threading
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from PIL import Image
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from image_store import annotated_images
+from preprocessing import MODEL_INPUT_SIZE, image_preprocessor
+
+# Seconds a detection waits for a model that is still loading
+MODEL_WAIT_TIMEOUT = float(os.getenv('INVENTRA_MODEL_WAIT_TIMEOUT', 30))
+# Largest image accepted for detection, in bytes of the upload and in pixels
+MAX_UPLOAD_BYTES = int(os.getenv('INVENTRA_DETECT_MAX_UPLOAD_BYTES', 15 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.getenv('INVENTRA_DETECT_MAX_IMAGE_PIXELS', 50_000_000))
+
+class ModelNotReadyError(RuntimeError):
+    """
+    Raised when a detection is requested before the model has finished loading.
+    """
+
+def decode_image(image_data, max_size=MODEL_INPUT_SIZE, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Decode an uploaded image at reduced resolution.
+    
+    JPEG images are decoded directly at 1/2, 1/4 or 1/8 scale (DCT scaling), so
+    a phone photo never exists in memory at full resolution. Other formats are
+    decoded fully and then scaled down. The EXIF orientation is applied.
+    
+    Args:
+        image_data (bytes): Contents of the image file
+        max_size (int): Longest side of the decoded image in pixels
+        max_pixels (int): Largest image size accepted in pixels
+        
+    Returns:
+        tuple: (BGR image as a numpy array, scale of the decoded image relative
+            to the original)
+    
+    Raises:
+        ValueError: If the image cannot be decoded or is too large
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        # Only the header has been read so far
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ValueError(f"Image is too large ({width}x{height} pixels)")
+        
+        scale = min(1.0, max_size / max(width, height))
+        if scale < 1.0:
+            image.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    except UnidentifiedImageError:
+        raise ValueError('Unsupported or corrupt image file')
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Could not decode the image: {e}")
+    
+    decoded = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+    decoded_height, decoded_width = decoded.shape[:2]
+    if max(decoded_height, decoded_width) > max_size:
+        resize = max_size / max(decoded_height, decoded_width)
+        size = (round(decoded_width * resize), round(decoded_height * resize))
+        decoded = cv2.resize(decoded, size, interpolation=cv2.INTER_AREA)
+    return decoded, max(decoded.shape[:2]) / max(width, height)
 
 class FoodDetector:
-    def __init__(self, model_path='best.pt'):
+    def __init__(self, model_path='best.pt', model=None, lazy=False, image_store=None, preprocessor=None):
         """
         Initialize the food detector with a YOLOv8 model.
         
         Args:
             model_path (str): Path to the YOLOv8 model file
+            model: Already constructed model to use instead of loading
+                model_path (e.g. a stub model for benchmarks)
+            lazy (bool): Defer loading the model until load(), load_async()
+                or the first detection
+            image_store (AnnotatedImageStore): Store for the annotated images
+                (default: the shared store)
+            preprocessor (ImagePreprocessor): Threads and buffers preparing
+                uploads for the model (default: the shared preprocessor)
         """
         self.model_path = model_path
-        self.model = YOLO(model_path)
+        self.model = None
+        self.image_store = image_store if image_store is not None else annotated_images
+        self.preprocessor = preprocessor if preprocessor is not None else image_preprocessor
+        self.load_error = None
+        
+        # The YOLO predictor keeps per-call state, so threaded servers must not
+        # run inference on the same model concurrently
+        self._inference_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._load_thread = None
+        self._ready = threading.Event()
         
-        # Define the mapping of class indices to food names
-        # This should match the classes your model was trained on
+        # Mapping of class indices to food names, used for weights without
+        # class names in their metadata (see _use_model)
         self.class_names = {
             0: 'burger',
             1: 'chicken nuggest',
@@ -102,6 +180,111 @@ class FoodDetector:
                 {'name': 'vegetables', 'quantity': 50, 'unit': 'g'}
             ]
         }
+        
+        if model is not None:
+            self._use_model(model)
+            self._ready.set()
+        elif not lazy:
+            self.load(warmup=False)
+    
+    @property
+    def is_ready(self):
+        """
+        bool: Whether the model is loaded and can serve detections.
+        """
+        return self._ready.is_set()
+    
+    def load(self, warmup=True):
+        """
+        Load the model (importing torch and ultralytics on first use).
+        
+        Args:
+            warmup (bool): Run a dummy inference so the first real detection
+                does not pay the graph initialization cost
+        """
+        with self._load_lock:
+            if self._ready.is_set():
+                return
+            
+            try:
+                from ultralytics import YOLO
+                
+                model = YOLO(self.model_path)
+                if warmup:
+                    self._warmup(model)
+            except Exception as e:
+                self.load_error = str(e)
+                raise
+            
+            self._use_model(model)
+            self.load_error = None
+            self._ready.set()
+    
+    def _use_model(self, model):
+        """
+        Serve detections with a model, taking the class names from its metadata.
+        """
+        names = getattr(model, 'names', None)
+        if names:
+            # The names stored in the weights always match the classes the model was trained on
+            self.class_names = dict(enumerate(names)) if isinstance(names, (list, tuple)) else dict(names)
+        self.model = model
+    
+    def load_async(self, warmup=True):
+        """
+        Load the model in a background thread.
+        
+        Args:
+            warmup (bool): Run a dummy inference after loading
+            
+        Returns:
+            threading.Thread: The loading thread, or None if already loaded
+        """
+        with self._load_lock:
+            if self._ready.is_set():
+                return None
+            if self._load_thread is None or not self._load_thread.is_alive():
+                self._load_thread = threading.Thread(
+                    target=self._load_in_background, args=(warmup,), name='model-loader', daemon=True
+                )
+                self._load_thread.start()
+            return self._load_thread
+    
+    def _load_in_background(self, warmup):
+        try:
+            self.load(warmup=warmup)
+        except Exception as e:
+            print(f"Error loading model {self.model_path}: {e}")
+    
+    def _warmup(self, model):
+        """
+        Run inference on a blank image to initialize the model.
+        """
+        dummy_image = np.zeros((640, 640, 3), dtype=np.uint8)
+        model(dummy_image, verbose=False)
+    
+    def _wait_for_model(self, timeout=MODEL_WAIT_TIMEOUT):
+        """
+        Make sure the model is loaded before running inference.
+        
+        Loads the model synchronously if nothing has started loading it, and
+        otherwise waits for the background load to finish.
+        
+        Raises:
+            ModelNotReadyError: If the model is not ready within the timeout
+        """
+        if self._ready.is_set():
+            return
+        
+        if self._load_thread is None:
+            self.load()
+        else:
+            self._load_thread.join(timeout)
+        
+        if not self._ready.is_set():
+            if self.load_error:
+                raise ModelNotReadyError(f"Detection model failed to load: {self.load_error}")
+            raise ModelNotReadyError('Detection model is still loading')
     
     def detect(self, image_path):
         """
@@ -116,12 +299,88 @@ class FoodDetector:
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image file not found: {image_path}")
         
-        # Perform detection using YOLOv8
-        results = self.model(image_path)
+        with open(image_path, 'rb') as f:
+            return self.detect_upload(f.read())
+    
+    def detect_upload(self, image_data):
+        """
+        Detect food items in an uploaded image without writing it to disk.
+        
+        The image is decoded at reduced resolution (see decode_image) and
+        letterboxed into a reusable model input buffer on the preprocessing
+        threads, outside the inference lock, so concurrent uploads are prepared
+        while the model runs. The bounding boxes are scaled back to the
+        coordinates of the original image.
+        
+        Args:
+            image_data (bytes): Contents of the image file
+            
+        Returns:
+            dict: Detection results with food items and their ingredients
+        """
+        image, scale, model_input = self.preprocessor.run(self._preprocess, image_data)
+        try:
+            # Perform detection using YOLOv8
+            self._wait_for_model()
+            with self._inference_lock:
+                results = self.model(model_input.tensor(), verbose=False)
+            detections = self._parse_detections(results, scale * model_input.ratio, model_input.pad)
+        finally:
+            model_input.release()
+        
+        # Create annotated image
+        annotated_image_key = self._create_annotated_image(image_data, detections, image, scale)
+        
+        detection_results = self._summarize_detections(detections)
+        detection_results['annotated_image_path'] = self.image_store.path(annotated_image_key)
+        detection_results['annotated_image_url'] = self.image_store.url(annotated_image_key)
+        return detection_results
+    
+    def _preprocess(self, image_data):
+        """
+        Decode an upload and prepare the model input.
+        
+        Returns:
+            tuple: (decoded BGR image, its scale relative to the original,
+                ModelInput)
+        """
+        # Decode once at the size needed by both the model and the annotated image
+        image, scale = decode_image(image_data, max(MODEL_INPUT_SIZE, self.image_store.max_size))
+        return image, scale, self.preprocessor.letterbox(image)
+    
+    def detect_images(self, images):
+        """
+        Detect food items in a batch of already decoded images with a single model call.
+        
+        Args:
+            images (list): Images as BGR numpy arrays
+            
+        Returns:
+            list: Detection results for each image (without annotated images)
+        """
+        if not images:
+            return []
+        
+        self._wait_for_model()
+        with self._inference_lock:
+            results = self.model(list(images), verbose=False)
+        return [self._summarize_detections(self._parse_detections([result])) for result in results]
+    
+    def _parse_detections(self, results, scale=1.0, pad=(0, 0)):
+        """
+        Convert raw model results into a list of detections.
         
-        # Process detection results
+        Args:
+            results (list): Results returned by the model
+            scale (float): Scale of the image the model ran on relative to the
+                original, whose coordinates the bounding boxes are returned in
+            pad (tuple): Letterbox border (left, top) of the model input in pixels
+            
+        Returns:
+            list: Detections with food name, confidence and bounding box
+        """
         detections = []
-        detected_foods = {}
+        offset = np.array([pad[0], pad[1], pad[0], pad[1]])
         
         for result in results:
             boxes = result.boxes.cpu().numpy()
@@ -130,7 +389,7 @@ class FoodDetector:
                 # Get class ID, confidence score, and bounding box
                 class_id = int(box.cls[0])
                 confidence = float(box.conf[0])
-                x1, y1, x2, y2 = box.xyxy[0].astype(int)
+                x1, y1, x2, y2 = (np.maximum(box.xyxy[0] - offset, 0) / scale).astype(int)
                 
                 # Get food name from class ID
                 food_name = self.class_names.get(class_id, f"Unknown-{class_id}")
@@ -141,14 +400,44 @@ class FoodDetector:
                     'confidence': confidence,
                     'bbox': [int(x1), int(y1), int(x2), int(y2)]
                 })
-                
-                # Count occurrences of each food type
-                if food_name in detected_foods:
-                    detected_foods[food_name] += 1
-                else:
-                    detected_foods[food_name] = 1
         
-        # Calculate ingredients needed based on detected foods
+        return detections
+    
+    def _summarize_detections(self, detections):
+        """
+        Count detected foods and calculate the ingredients they need.
+        
+        Args:
+            detections (list): Detections from _parse_detections
+            
+        Returns:
+            dict: Detections, per-food counts and ingredients needed
+        """
+        # Count occurrences of each food type
+        detected_foods = {}
+        for detection in detections:
+            food_name = detection['food_name']
+            if food_name in detected_foods:
+                detected_foods[food_name] += 1
+            else:
+                detected_foods[food_name] = 1
+        
+        return {
+            'detections': detections,
+            'detected_foods': [{'name': k, 'count': v} for k, v in detected_foods.items()],
+            'ingredients_needed': self.calculate_ingredients(detected_foods)
+        }
+    
+    def calculate_ingredients(self, detected_foods):
+        """
+        Calculate the combined ingredients needed for the detected foods.
+        
+        Args:
+            detected_foods (dict): Mapping of food name to detected count
+            
+        Returns:
+            list: Ingredients with quantities summed across all foods
+        """
         ingredients_needed = []
         for food_name, count in detected_foods.items():
             if food_name in self.food_ingredients:
@@ -171,35 +460,37 @@ class FoodDetector:
                 combined_ingredients[name] = ingredient.copy()
         
         # Convert back to list
-        final_ingredients = list(combined_ingredients.values())
-        
-        # Create annotated image
-        annotated_image_path = self._create_annotated_image(image_path, detections)
-        
-        return {
-            'detections': detections,
-            'detected_foods': [{'name': k, 'count': v} for k, v in detected_foods.items()],
-            'ingredients_needed': final_ingredients,
-            'annotated_image_path': annotated_image_path
-        }
+        return list(combined_ingredients.values())
     
-    def _create_annotated_image(self, image_path, detections):
+    def _create_annotated_image(self, image_data, detections, image=None, scale=1.0):
         """
-        Create an annotated image with bounding boxes and labels.
+        Create an annotated thumbnail with bounding boxes and labels, unless
+        the same image with the same detections is already stored.
         
         Args:
-            image_path (str): Path to the original image
+            image_data (bytes): Contents of the original image
             detections (list): List of detection results
+            image (np.ndarray): Already decoded image to draw on (decoded from
+                image_data if not given)
+            scale (float): Scale of the decoded image relative to the original
             
         Returns:
-            str: Path to the annotated image
+            str: Key of the annotated image in the image store
         """
-        # Read the image
-        image = cv2.imread(image_path)
+        key = self.image_store.key_for(image_data, detections)
+        if self.image_store.touch(key):
+            return key
+        
+        # Scale the image down before drawing, so the boxes are drawn and
+        # encoded at the stored size
+        if image is None:
+            image, scale = decode_image(image_data, self.image_store.max_size)
+        image, thumbnail_scale = self.image_store.thumbnail(image)
+        scale *= thumbnail_scale
         
         # Draw bounding boxes and labels
         for detection in detections:
-            x1, y1, x2, y2 = detection['bbox']
+            x1, y1, x2, y2 = (round(value * scale) for value in detection['bbox'])
             food_name = detection['food_name']
             confidence = detection['confidence']
             
@@ -217,13 +508,6 @@ class FoodDetector:
             cv2.putText(image, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
         
         # Save the annotated image
-        output_dir = 'static/annotated'
-        os.makedirs(output_dir, exist_ok=True)
-        
-        base_filename = os.path.basename(image_path)
-        annotated_filename = f"annotated_{base_filename}"
-        annotated_path = os.path.join(output_dir, annotated_filename)
-        
-        cv2.imwrite(annotated_path, image)
+        self.image_store.put(key, image)
         
-        return annotated_path
\ No newline at end of file
+        return key
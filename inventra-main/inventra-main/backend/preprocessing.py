@@ -0,0 +1,176 @@
+import os
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# Longest side of the images the model is run on; uploads are decoded at this
+# size (or the annotated image size, if larger) instead of their full resolution
+MODEL_INPUT_SIZE = int(os.getenv('INVENTRA_MODEL_INPUT_SIZE', 640))
+# Threads decoding and letterboxing uploads; OpenCV and Pillow release the GIL,
+# so they run in parallel with each other and with inference
+PREPROCESS_WORKERS = int(os.getenv('INVENTRA_PREPROCESS_WORKERS', min(4, os.cpu_count() or 1)))
+# Model input buffers kept for reuse, each about 6 MB at the default input size.
+# A buffer is held from preprocessing until inference is done; requests beyond
+# this many in flight allocate a temporary buffer
+PREPROCESS_BUFFERS = int(os.getenv('INVENTRA_PREPROCESS_BUFFERS', PREPROCESS_WORKERS + 2))
+
+# Model stride; input sides must be multiples of it
+MODEL_STRIDE = 32
+# Gray used by YOLO for the letterbox borders
+PAD_VALUE = 114 / 255
+
+@functools.lru_cache(maxsize=None)
+def _torch():
+    # Imported on first use, like the model itself (see FoodDetector.load)
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+class ModelInput:
+    """
+    A letterboxed, normalized image in a buffer borrowed from an ImagePreprocessor.
+    
+    Coordinates on the model input map back to the letterboxed image as
+    (x - pad[0]) / ratio and (y - pad[1]) / ratio. release() must be called
+    once inference is done, so the buffer can be reused.
+    """
+    def __init__(self, preprocessor, buffer, array, ratio, pad):
+        self._preprocessor = preprocessor
+        self._buffer = buffer
+        self.array = array
+        self.ratio = ratio
+        self.pad = pad
+    
+    def tensor(self):
+        """
+        Get the input as a (1, 3, height, width) RGB batch in [0, 1]: a torch
+        tensor sharing the buffer's memory, or the NumPy array without torch.
+        """
+        torch = _torch()
+        return torch.from_numpy(self.array) if torch is not None else self.array
+    
+    def release(self):
+        """
+        Return the buffer to the pool. The input must not be used afterwards.
+        """
+        if self._buffer is not None:
+            self._preprocessor._release(self._buffer)
+            self._buffer = None
+            self.array = None
+
+class ImagePreprocessor:
+    """
+    Thread pool that prepares images for the model, and a pool of reusable
+    model input buffers.
+    
+    Images are letterboxed (scaled to fit the input size and padded to a
+    multiple of the stride, as YOLO does itself) and normalized into
+    preallocated buffers, so a request does not allocate and free several
+    megabytes of intermediate arrays. Buffers are allocated on first use, so
+    processes that never run detections do not pay for them.
+    """
+    def __init__(self, workers=PREPROCESS_WORKERS, buffers=PREPROCESS_BUFFERS, size=MODEL_INPUT_SIZE,
+                 stride=MODEL_STRIDE):
+        """
+        Args:
+            workers (int): Number of preprocessing threads
+            buffers (int): Number of input buffers kept for reuse
+            size (int): Longest side of the model input, rounded up to a multiple of stride
+            stride (int): Model stride
+        """
+        self.workers = max(1, workers)
+        self.buffers = max(1, buffers)
+        self.stride = stride
+        self.size = -(-size // stride) * stride
+        # Temporary buffers allocated because all pooled buffers were in use
+        self.overflow_count = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._free = None
+    
+    def run(self, func, *args, **kwargs):
+        """
+        Run a function on the preprocessing threads and wait for its result.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preprocess')
+            executor = self._executor
+        return executor.submit(func, *args, **kwargs).result()
+    
+    def close(self):
+        """
+        Stop the preprocessing threads and drop the buffers.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._free = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+    
+    def _allocate(self):
+        # Normalized CHW input, and the resized HWC image it is converted from;
+        # smaller inputs use the start of the same memory
+        return (np.empty(3 * self.size * self.size, dtype=np.float32),
+                np.empty(self.size * self.size * 3, dtype=np.uint8))
+    
+    def _acquire(self):
+        with self._lock:
+            if self._free is None:
+                self._free = [self._allocate() for _ in range(self.buffers)]
+            if self._free:
+                return self._free.pop()
+            self.overflow_count += 1
+        return self._allocate()
+    
+    def _release(self, buffer):
+        with self._lock:
+            if self._free is not None and len(self._free) < self.buffers:
+                self._free.append(buffer)
+    
+    def letterbox(self, image):
+        """
+        Letterbox and normalize an image into a pooled buffer.
+        
+        Args:
+            image (np.ndarray): BGR image
+        
+        Returns:
+            ModelInput: The model input; release it after inference
+        """
+        height, width = image.shape[:2]
+        ratio = min(self.size / height, self.size / width)
+        new_width, new_height = round(width * ratio), round(height * ratio)
+        # Pad to the next multiple of the stride only, not to a square
+        input_width = new_width + (self.size - new_width) % self.stride
+        input_height = new_height + (self.size - new_height) % self.stride
+        left = round((input_width - new_width) / 2 - 0.1)
+        top = round((input_height - new_height) / 2 - 0.1)
+        right, bottom = left + new_width, top + new_height
+        
+        buffer = self._acquire()
+        normalized, resized = buffer
+        if (new_width, new_height) != (width, height):
+            resized = cv2.resize(image, (new_width, new_height),
+                                 dst=resized[:new_height * new_width * 3].reshape(new_height, new_width, 3),
+                                 interpolation=cv2.INTER_LINEAR)
+        else:
+            resized = image
+        
+        array = normalized[:3 * input_height * input_width].reshape(1, 3, input_height, input_width)
+        array[:, :, :top] = PAD_VALUE
+        array[:, :, bottom:] = PAD_VALUE
+        array[:, :, top:bottom, :left] = PAD_VALUE
+        array[:, :, top:bottom, right:] = PAD_VALUE
+        for channel in range(3):
+            # BGR to RGB, scaled to [0, 1]
+            np.multiply(resized[:, :, 2 - channel], 1 / 255, out=array[0, channel, top:bottom, left:right],
+                        dtype=np.float32)
+        return ModelInput(self, buffer, array, ratio, (left, top))
+
+# Shared by all detectors of a process
+image_preprocessor = ImagePreprocessor()
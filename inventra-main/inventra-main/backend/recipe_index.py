@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+
+RECIPE_INDEX_ENABLED = os.getenv('INVENTRA_RECIPE_INDEX', '1') == '1'
+# Seconds between full reloads, which pick up recipes written by other server processes
+RECIPE_INDEX_RESYNC_INTERVAL = float(os.getenv('INVENTRA_RECIPE_INDEX_RESYNC_INTERVAL', 60))
+
+class RecipeIndex:
+    """
+    In-memory reverse index from ingredient names to the recipes of one
+    location that use them.
+    
+    Finding the recipes affected by an inventory change (e.g. the recipes
+    that use cheese, or that a detection may have made infeasible) needs no
+    scan of the recipe documents and their embedded ingredient lists.
+    InventoryManager applies its own recipe writes to the index once they
+    succeeded, and the index reloads itself every resync_interval seconds to
+    pick up recipes written by other server processes.
+    """
+    def __init__(self, inventory_manager, resync_interval=RECIPE_INDEX_RESYNC_INTERVAL):
+        """
+        Args:
+            inventory_manager (InventoryManager): Manager whose recipes are indexed
+            resync_interval (float): Seconds between full reloads
+        """
+        self.inventory_manager = inventory_manager
+        self.resync_interval = resync_interval
+        self.resync_count = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._generation = 0
+        # Ingredient names of every recipe, keyed by recipe ID
+        self._ingredients = {}
+        # Recipe IDs using every ingredient, keyed by ingredient name
+        self._recipes = {}
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._ingredients)
+    
+    def resync(self):
+        """
+        Reload the index from the database.
+        """
+        with self._lock:
+            generation = self._generation
+        recipes = self.inventory_manager.storage.list_recipes()
+        with self._lock:
+            self._ingredients = {}
+            self._recipes = {}
+            for recipe in recipes:
+                self._add(recipe)
+            # A local write that landed while loading may be missing; reload on next use
+            self._loaded = generation == self._generation
+            self._loaded_at = time.monotonic()
+            self.resync_count += 1
+    
+    def invalidate(self, *args, **kwargs):
+        """
+        Drop the index so the next use reloads it. Accepts and ignores any
+        arguments so it can be registered as an InventoryManager write listener.
+        """
+        with self._lock:
+            self._loaded = False
+            self._generation += 1
+    
+    def _ensure_current(self):
+        if not self._loaded or time.monotonic() - self._loaded_at >= self.resync_interval:
+            self.resync()
+    
+    def _add(self, recipe):
+        recipe_id = str(recipe['_id'])
+        names = {ingredient['name'] for ingredient in recipe.get('ingredients') or []}
+        self._ingredients[recipe_id] = names
+        for name in names:
+            self._recipes.setdefault(name, set()).add(recipe_id)
+    
+    def _remove(self, recipe_id):
+        for name in self._ingredients.pop(recipe_id, ()):
+            recipe_ids = self._recipes.get(name)
+            if recipe_ids is not None:
+                recipe_ids.discard(recipe_id)
+                if not recipe_ids:
+                    del self._recipes[name]
+    
+    def recipe_ids_using(self, names):
+        """
+        Get the IDs of the recipes that use any of several ingredients.
+        
+        Args:
+            names (iterable): Ingredient names
+        
+        Returns:
+            set: Recipe IDs as strings
+        """
+        self._ensure_current()
+        with self._lock:
+            recipe_ids = set()
+            for name in names:
+                recipe_ids.update(self._recipes.get(name, ()))
+            return recipe_ids
+    
+    def upsert(self, recipe):
+        """
+        Apply a written recipe (the full document, or at least '_id' and 'ingredients').
+        """
+        with self._lock:
+            self._generation += 1
+            if not self._loaded:
+                return
+            recipe_id = str(recipe['_id'])
+            self._remove(recipe_id)
+            self._add(recipe)
+    
+    def remove(self, recipe_id):
+        """
+        Remove a deleted recipe.
+        """
+        with self._lock:
+            self._generation += 1
+            if self._loaded:
+                self._remove(str(recipe_id))
@@ -0,0 +1,267 @@
+import os
+import re
+import time
+import bisect
+import heapq
+import threading
+
+# Seconds after which an index is rebuilt from the database, picking up
+# writes made by other server processes
+SEARCH_INDEX_TTL = float(os.getenv('INVENTRA_SEARCH_INDEX_TTL', 60))
+# Fuzzy matches less similar than this are not returned
+SEARCH_MIN_SCORE = float(os.getenv('INVENTRA_SEARCH_MIN_SCORE', 0.3))
+
+SEARCH_KINDS = ('inventory', 'recipes')
+
+_SEPARATORS = re.compile(r'[^0-9a-z]+')
+
+def normalize(text):
+    """
+    Lowercase a name and reduce punctuation and whitespace to single spaces.
+    """
+    return _SEPARATORS.sub(' ', str(text).lower()).strip()
+
+def trigrams(text):
+    """
+    Get the trigrams of normalized text. Words are padded, so their first
+    letters and words shorter than three letters get trigrams too.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+class NameIndex:
+    """
+    Trigram and word prefix index over the names of one kind of document.
+    
+    Typed prefixes rank first (the whole name, then any word in it), followed
+    by fuzzy matches ranked by trigram similarity, which tolerate typos and
+    swapped letters such as 'chicken nuggest' or 'fride chicken'.
+    """
+    def __init__(self, min_score=SEARCH_MIN_SCORE):
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._by_name = {}
+        self._postings = {}
+        # Sorted (word, key) pairs for prefix lookups
+        self._words = []
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def add(self, key, name):
+        """
+        Add a document, replacing any document with the same key or name.
+        
+        Args:
+            key (str): ID of the document
+            name (str): Name of the document
+        """
+        with self._lock:
+            self._remove(key)
+            self._remove(self._by_name.get(name))
+            normalized = normalize(name)
+            grams = trigrams(normalized)
+            self._entries[key] = (name, normalized, grams)
+            self._by_name[name] = key
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+            for word in set(normalized.split()):
+                bisect.insort(self._words, (word, key))
+    
+    def remove_name(self, name):
+        with self._lock:
+            self._remove(self._by_name.get(name))
+    
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        name, normalized, grams = entry
+        if self._by_name.get(name) == key:
+            del self._by_name[name]
+        for gram in grams:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+        for word in set(normalized.split()):
+            position = bisect.bisect_left(self._words, (word, key))
+            if position < len(self._words) and self._words[position] == (word, key):
+                del self._words[position]
+    
+    def search(self, query, limit=20):
+        """
+        Find the names best matching a query.
+        
+        Args:
+            query (str): Search text
+            limit (int): Maximum number of matches
+        
+        Returns:
+            list: (key, name, score) tuples, best first; scores are between 0 and 1
+        """
+        normalized_query = normalize(query)
+        if not normalized_query:
+            return []
+        query_grams = trigrams(normalized_query)
+        first_word = normalized_query.split()[0]
+        
+        with self._lock:
+            scores = {}
+            # Fuzzy matches: Dice coefficient of the trigram sets
+            shared = {}
+            for gram in query_grams:
+                for key in self._postings.get(gram, ()):
+                    shared[key] = shared.get(key, 0) + 1
+            for key, count in shared.items():
+                score = 2 * count / (len(query_grams) + len(self._entries[key][2]))
+                if score >= self.min_score:
+                    scores[key] = score
+            
+            # Prefix matches of the whole name or of a word in it
+            position = bisect.bisect_left(self._words, (first_word,))
+            while position < len(self._words) and self._words[position][0].startswith(first_word):
+                key = self._words[position][1]
+                position += 1
+                normalized = self._entries[key][1]
+                coverage = len(normalized_query) / len(normalized)
+                if normalized == normalized_query:
+                    score = 1.0
+                elif normalized.startswith(normalized_query):
+                    score = 0.9 + 0.09 * coverage
+                elif f" {normalized_query}" in f" {normalized}":
+                    score = 0.8 + 0.09 * coverage
+                else:
+                    continue
+                scores[key] = max(scores.get(key, 0.0), score)
+            
+            best = heapq.nsmallest(limit, scores.items(), key=lambda match: (-match[1], self._entries[match[0]][0]))
+            return [(key, self._entries[key][0], score) for key, score in best]
+
+class SearchIndex:
+    """
+    In-memory search over the inventory items and recipes of one location.
+    
+    Each index is built from the database on first use and kept current
+    incrementally: InventoryManager writes mark the names they touched, and
+    the next search re-reads only those documents. Indexes are rebuilt every
+    ttl seconds to pick up writes made by other server processes.
+    """
+    def __init__(self, inventory_manager, ttl=SEARCH_INDEX_TTL):
+        """
+        Args:
+            inventory_manager (InventoryManager): Source of items and recipes
+            ttl (float): Seconds before an index is rebuilt from the database
+        """
+        self.inventory_manager = inventory_manager
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._built_at = {}
+        self._generation = {kind: 0 for kind in SEARCH_KINDS}
+        self._dirty = {kind: set() for kind in SEARCH_KINDS}
+        inventory_manager.add_listener(self._on_write)
+    
+    def _on_write(self, kind, names=None):
+        with self._lock:
+            if kind not in self._dirty:
+                return
+            if names is None:
+                # Unknown documents changed; rebuild on next use
+                self._generation[kind] += 1
+                self._built_at.pop(kind, None)
+            else:
+                self._dirty[kind].update(names)
+    
+    def invalidate(self):
+        """
+        Drop the indexes so the next search rebuilds them.
+        """
+        for kind in SEARCH_KINDS:
+            self._on_write(kind)
+    
+    def _load(self, kind):
+        storage = self.inventory_manager.storage
+        return storage.list_items() if kind == 'inventory' else storage.list_recipes()
+    
+    def _fetch(self, kind, names):
+        storage = self.inventory_manager.storage
+        if kind == 'inventory':
+            return storage.get_items_by_names(names)
+        recipes = (storage.get_recipe_by_name(name) for name in names)
+        return [recipe for recipe in recipes if recipe]
+    
+    def _current(self, kind):
+        """
+        Get the index of a kind, building or refreshing it as needed.
+        """
+        with self._lock:
+            index = self._indexes.get(kind)
+            built_at = self._built_at.get(kind)
+            generation = self._generation[kind]
+            dirty, self._dirty[kind] = self._dirty[kind], set()
+        
+        if index is None or built_at is None or time.monotonic() - built_at >= self.ttl:
+            index = NameIndex()
+            for document in self._load(kind):
+                index.add(str(document['_id']), document['name'])
+            with self._lock:
+                self._indexes[kind] = index
+                if generation == self._generation[kind]:
+                    self._built_at[kind] = time.monotonic()
+            return index
+        
+        if dirty:
+            dirty = list(dirty)
+            documents = self._fetch(kind, dirty)
+            # Names that were renamed or deleted are no longer found
+            for name in dirty:
+                index.remove_name(name)
+            for document in documents:
+                index.add(str(document['_id']), document['name'])
+        return index
+    
+    def search(self, query, kinds=SEARCH_KINDS, limit=20):
+        """
+        Search items and recipes by name.
+        
+        Args:
+            query (str): Search text; may be misspelled
+            kinds (iterable): 'inventory' and/or 'recipes'
+            limit (int): Maximum number of results per kind
+        
+        Returns:
+            dict: For every kind, the matching documents, best first, each
+                with its match 'score'
+        
+        Raises:
+            ValueError: If a kind is unknown
+        """
+        storage = self.inventory_manager.storage
+        results = {}
+        for kind in kinds:
+            if kind not in SEARCH_KINDS:
+                raise ValueError(f"Unknown search type: {kind}")
+            matches = self._current(kind).search(query, limit)
+            if not matches:
+                results[kind] = []
+                continue
+            # Fetch the current documents of the matches in one query
+            if kind == 'inventory':
+                documents = {document['name']: document for document in storage.get_items_by_names(
+                    [name for _, name, _ in matches]
+                )}
+                found = [(documents.get(name), score) for _, name, score in matches]
+            else:
+                documents = {str(document['_id']): document for document in storage.get_recipes_by_ids(
+                    [key for key, _, _ in matches]
+                )}
+                found = [(documents.get(key), score) for key, _, score in matches]
+            results[kind] = [{**document, 'score': round(score, 3)} for document, score in found if document]
+        return results
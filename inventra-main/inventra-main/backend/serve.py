@@ -0,0 +1,165 @@
+import os
+import argparse
+import importlib.util
+import multiprocessing
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def default_workers():
+    """
+    Default number of worker processes.
+    
+    Each worker runs inference on the CPU or GPU, so a few workers with a few
+    threads each is usually better than one worker per core.
+    """
+    return max(1, min(4, multiprocessing.cpu_count() // 2))
+
+def server_options(args):
+    """
+    Build the server options from command line arguments and environment variables.
+    
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+    
+    Returns:
+        dict: Server options
+    """
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': args.keepalive,
+        'max_requests': args.max_requests,
+        'lazy_load': args.lazy_load
+    }
+
+def post_fork(server, worker):
+    """
+    Prepare a freshly forked worker.
+    
+    With preloading, the model is loaded once in the master process and shared
+    copy-on-write with the workers, but MongoClient is not fork-safe and has
+    to reconnect. Without preloading, each worker loads the model in the
+    background and reports not ready until it is done.
+    """
+    import app as inventra_app
+    
+    if server.cfg.preload_app:
+        inventra_app.locations.reconnect()
+    inventra_app.start_background_tasks()
+    
+    torch_threads = os.getenv('INVENTRA_TORCH_THREADS')
+    if torch_threads:
+        # Avoid every worker spawning one intra-op thread per core
+        import torch
+        torch.set_num_threads(int(torch_threads))
+
+def worker_exit(server, worker):
+    """
+    Write the buffered transactions of every location and close the database
+    connection when a worker shuts down.
+    """
+    import app as inventra_app
+    
+    inventra_app.locations.close()
+
+def run_gunicorn(options):
+    """
+    Serve the app with gunicorn using preforked gthread workers.
+    
+    Args:
+        options (dict): Server options from server_options
+    """
+    from gunicorn.app.base import BaseApplication
+    
+    class InventraApplication(BaseApplication):
+        def load_config(self):
+            config = {
+                'bind': options['bind'],
+                'workers': options['workers'],
+                'worker_class': 'gthread',
+                'threads': options['threads'],
+                # Worker heartbeat: gthread workers are restarted only when the
+                # whole process stops responding, never for one slow request
+                'timeout': options['timeout'],
+                'graceful_timeout': options['graceful_timeout'],
+                'keepalive': options['keepalive'],
+                'max_requests': options['max_requests'],
+                'max_requests_jitter': options['max_requests'] // 10 if options['max_requests'] else 0,
+                # Import the app (and load the model) once in the master so
+                # workers share the weights copy-on-write
+                'preload_app': not options['lazy_load'],
+                'post_fork': post_fork,
+                'worker_exit': worker_exit
+            }
+            for key, value in config.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            from app import app, model_registry
+            
+            if not options['lazy_load']:
+                model_registry.load()
+            return app
+    
+    InventraApplication().run()
+
+def run_waitress(options):
+    """
+    Serve the app with waitress on platforms without fork (e.g. Windows).
+    
+    Args:
+        options (dict): Server options from server_options
+    """
+    from waitress import serve
+    from app import app, start_background_tasks
+    
+    start_background_tasks()
+    
+    # waitress is single-process, so give it the threads of all workers
+    serve(
+        app,
+        listen=options['bind'],
+        threads=options['workers'] * options['threads'],
+        # Closes connections idle this long; a running request is not interrupted
+        channel_timeout=options['timeout']
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the Inventra API with a production server')
+    parser.add_argument('--bind', type=str, default=os.getenv('INVENTRA_BIND', '0.0.0.0:5000'),
+                        help='Address to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('INVENTRA_WORKERS', default_workers())),
+                        help='Number of worker processes')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('INVENTRA_THREADS', 4)),
+                        help='Number of request threads per worker')
+    parser.add_argument('--timeout', type=int, default=int(os.getenv('INVENTRA_TIMEOUT', 60)),
+                        help='Seconds before gunicorn restarts an unresponsive worker (waitress: closes idle '
+                             'connections); not a per-request deadline')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.getenv('INVENTRA_GRACEFUL_TIMEOUT', 30)),
+                        help='Seconds in-flight requests get to finish on shutdown')
+    parser.add_argument('--keepalive', type=int, default=int(os.getenv('INVENTRA_KEEPALIVE', 5)),
+                        help='Seconds to keep idle client connections open')
+    parser.add_argument('--max-requests', type=int, default=int(os.getenv('INVENTRA_MAX_REQUESTS', 0)),
+                        help='Restart workers after this many requests (0 disables)')
+    parser.add_argument('--torch-threads', type=int, default=None,
+                        help='Intra-op threads per worker for torch (default: INVENTRA_TORCH_THREADS)')
+    parser.add_argument('--lazy-load', action='store_true', default=os.getenv('INVENTRA_LAZY_LOAD') == '1',
+                        help='Start listening immediately and load the model in each worker in the background')
+    args = parser.parse_args()
+    
+    if args.torch_threads:
+        os.environ['INVENTRA_TORCH_THREADS'] = str(args.torch_threads)
+    
+    options = server_options(args)
+    if importlib.util.find_spec('gunicorn'):
+        run_gunicorn(options)
+    else:
+        run_waitress(options)
+
+if __name__ == '__main__':
+    main()
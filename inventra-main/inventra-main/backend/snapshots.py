@@ -0,0 +1,174 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+# Seconds between periodic snapshots
+SNAPSHOT_INTERVAL = float(os.getenv('INVENTRA_SNAPSHOT_INTERVAL', 3600))
+# Snapshots only cover transactions at least this old, so rows still buffered
+# by the write-behind writer of any worker are never skipped
+SNAPSHOT_SETTLE = float(os.getenv('INVENTRA_SNAPSHOT_SETTLE', 300))
+
+def apply_transaction(state, transaction):
+    """
+    Apply one transaction to an inventory state.
+    
+    Args:
+        state (dict): Items by name, each with 'name', 'quantity' and 'unit'
+        transaction (dict): Transaction with a 'delta'
+    """
+    delta = transaction.get('delta')
+    if delta is None:
+        return
+    name = transaction['item_name']
+    previous_name = transaction.get('previous_name')
+    if previous_name and previous_name in state:
+        state[name] = state.pop(previous_name)
+        state[name]['name'] = name
+    
+    if transaction['action'] == 'delete':
+        state.pop(name, None)
+        return
+    
+    item = state.setdefault(name, {'name': name, 'quantity': 0, 'unit': transaction.get('unit')})
+    item['quantity'] += delta
+
+class InventorySnapshots:
+    """
+    Point-in-time inventory reports from snapshots and the transaction log.
+    
+    A snapshot holds the quantity of every item after a given transaction
+    sequence number. A new snapshot is built from the previous one by
+    replaying the transactions since, and the stock at any time is the
+    nearest earlier snapshot plus the transactions up to that time, so no
+    query replays more than one snapshot interval of history.
+    """
+    def __init__(self, inventory_manager, interval=SNAPSHOT_INTERVAL, settle=SNAPSHOT_SETTLE):
+        """
+        Args:
+            inventory_manager (InventoryManager): Inventory to snapshot
+            interval (float): Seconds between periodic snapshots
+            settle (float): Minimum age in seconds of the transactions a snapshot covers
+        """
+        self.inventory_manager = inventory_manager
+        self.interval = interval
+        self.settle = settle
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def take_snapshot(self, force=False):
+        """
+        Record a new snapshot, unless a recent one exists.
+        
+        The first snapshot copies the current inventory; history before it
+        cannot be reconstructed.
+        
+        Args:
+            force (bool): Take a snapshot even if the last one is recent
+        
+        Returns:
+            dict: The new (or most recent) snapshot
+        """
+        storage = self.inventory_manager.storage
+        with self._lock:
+            base = storage.latest_snapshot()
+            if base is None:
+                return self._bootstrap()
+            
+            now = datetime.now()
+            cutoff = now - timedelta(seconds=self.settle)
+            if base['taken_at'] >= cutoff or (
+                not force and base['taken_at'] > cutoff - timedelta(seconds=self.interval / 2)
+            ):
+                return base
+            
+            state = {item['name']: dict(item) for item in base['items']}
+            last_seq = base['seq']
+            for transaction in storage.transactions_after(base['seq']):
+                # Stop at the first newer transaction so the snapshot covers
+                # exactly the transactions up to its seq
+                if transaction['timestamp'] > cutoff:
+                    break
+                apply_transaction(state, transaction)
+                last_seq = transaction['seq']
+            
+            snapshot = {
+                'taken_at': cutoff,
+                'seq': last_seq,
+                'items': list(state.values()),
+                'created_at': now
+            }
+            return storage.insert_snapshot(snapshot)
+    
+    def _bootstrap(self):
+        # Buffered transactions are numbered when they are stored, so they must
+        # be in the log before the sequence is read. Rows other workers still
+        # buffer get later numbers although the items read below include them;
+        # the first snapshot is best taken before a location sees traffic
+        if self.inventory_manager.transaction_writer is not None:
+            self.inventory_manager.transaction_writer.flush()
+        storage = self.inventory_manager.storage
+        now = datetime.now()
+        snapshot = {
+            'taken_at': now,
+            'seq': storage.current_transaction_seq(),
+            'items': [
+                {'name': item['name'], 'quantity': item['quantity'], 'unit': item.get('unit')}
+                for item in storage.list_items()
+            ],
+            'created_at': now
+        }
+        return storage.insert_snapshot(snapshot)
+    
+    def stock_at(self, when):
+        """
+        Reconstruct the inventory at a point in time.
+        
+        Args:
+            when (datetime): Point in time
+        
+        Returns:
+            dict: 'at', 'snapshot_taken_at', 'transactions_replayed' and
+                'inventory' (name, quantity and unit of every item), or None
+                if there is no snapshot that early
+        """
+        storage = self.inventory_manager.storage
+        snapshot = storage.latest_snapshot(at=when)
+        if snapshot is None:
+            return None
+        
+        state = {item['name']: dict(item) for item in snapshot['items']}
+        replayed = 0
+        for transaction in storage.transactions_after(snapshot['seq'], until=when):
+            apply_transaction(state, transaction)
+            replayed += 1
+        
+        return {
+            'at': when,
+            'snapshot_taken_at': snapshot['taken_at'],
+            'transactions_replayed': replayed,
+            'inventory': sorted(state.values(), key=lambda item: item['name'])
+        }
+    
+    def start(self):
+        """
+        Take snapshots periodically in a background thread.
+        
+        Returns:
+            threading.Thread: The snapshot thread
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='inventory-snapshots', daemon=True)
+            self._thread.start()
+        return self._thread
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.take_snapshot()
+            except Exception as e:
+                print(f"Error taking inventory snapshot: {e}")
+            self._stop_event.wait(self.interval)
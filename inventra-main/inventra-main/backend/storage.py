@@ -0,0 +1,1682 @@
+import os
+import re
+import copy
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from bson import ObjectId
+import pymongo
+from pymongo import MongoClient, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# MongoDB connection string
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
+
+# Storage backend selection ('mongo' or 'sqlite')
+STORAGE_BACKEND = os.getenv('INVENTRA_STORAGE', 'mongo')
+SQLITE_PATH = os.getenv('INVENTRA_SQLITE_PATH', 'inventra.db')
+
+# Location (site) a server works on unless a request names another one. Data
+# stored before locations were introduced is migrated to it
+DEFAULT_LOCATION = os.getenv('INVENTRA_LOCATION', 'default')
+LOCATION_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Transaction log sync from SQLite to the central MongoDB
+SYNC_INTERVAL = float(os.getenv('INVENTRA_SYNC_INTERVAL', 30))
+SYNC_BATCH_SIZE = int(os.getenv('INVENTRA_SYNC_BATCH_SIZE', 500))
+
+UNIX_EPOCH = datetime(1970, 1, 1)
+
+def updated_millis(value):
+    """
+    Convert an 'updated_at' time to milliseconds since the epoch, as summed
+    by StorageBackend.inventory_totals (0 if it is not a time).
+    """
+    if not isinstance(value, datetime):
+        return 0
+    return (value.replace(tzinfo=None) - UNIX_EPOCH) // timedelta(milliseconds=1)
+
+def transaction_counter_id(location):
+    """
+    Get the ID of the MongoDB counter numbering a location's transactions.
+    Each location numbers its own; the default location keeps the counter
+    used before locations were introduced.
+    """
+    return 'transactions' if location == DEFAULT_LOCATION else f"transactions:{location}"
+
+def check_location(location):
+    """
+    Check that a location name is valid (letters, digits, '-' and '_').
+    
+    Raises:
+        ValueError: If the name is not valid
+    """
+    if not isinstance(location, str) or not LOCATION_PATTERN.match(location):
+        raise ValueError(f"Invalid location name: {location!r}")
+    return location
+
+class StorageBackend:
+    """
+    Interface between InventoryManager and the database it stores data in.
+    
+    Documents are plain dicts shaped like the MongoDB documents: every item
+    and recipe has an '_id', and IDs may be passed back as strings.
+    
+    Every document belongs to a location (a restaurant site). A backend only
+    reads and writes the documents of its location, and stamps the location
+    on everything it inserts; for_location() gets a backend for another
+    location sharing the same connection.
+    """
+    location = DEFAULT_LOCATION
+    
+    def for_location(self, location):
+        """
+        Get a backend scoped to another location, sharing this one's connection.
+        
+        Args:
+            location (str): Name of the location
+        
+        Returns:
+            StorageBackend: The scoped backend
+        """
+        scoped = copy.copy(self)
+        scoped.location = check_location(location)
+        return scoped
+    
+    def ensure_indexes(self):
+        raise NotImplementedError
+    
+    def ping(self, timeout=1.0):
+        raise NotImplementedError
+    
+    def reconnect(self):
+        raise NotImplementedError
+    
+    def close(self):
+        raise NotImplementedError
+    
+    def start_sync(self):
+        """
+        Start any background replication. Backends without one do nothing.
+        """
+    
+    # Inventory items
+    
+    def list_items(self, limit=None):
+        raise NotImplementedError
+    
+    def get_item(self, item_id):
+        raise NotImplementedError
+    
+    def get_item_by_name(self, name):
+        raise NotImplementedError
+    
+    def get_items_by_names(self, names):
+        raise NotImplementedError
+    
+    def insert_item(self, item):
+        raise NotImplementedError
+    
+    def insert_items(self, items):
+        raise NotImplementedError
+    
+    def update_item(self, item_id, fields):
+        raise NotImplementedError
+    
+    def increment_item(self, item_id, amount):
+        raise NotImplementedError
+    
+    def deduct_item(self, item_id, amount):
+        """
+        Deduct an amount from the quantity of an item, stopping at zero, in
+        the database rather than from a quantity read before.
+        
+        Args:
+            item_id: ID of the item
+            amount (float): Amount to deduct
+        
+        Returns:
+            tuple: The item before and after the deduction, or (None, None) if
+                it does not exist
+        """
+        raise NotImplementedError
+    
+    def deduct_quantities(self, amounts, transactions):
+        """
+        Deduct an amount from the quantity of several items, all or nothing,
+        and record the matching transactions once they are deducted. Nothing
+        is changed unless every item exists and has at least its amount.
+        
+        Args:
+            amounts (dict): Amount to deduct by item ID
+            transactions (list): Transaction documents to record
+        
+        Returns:
+            dict: The item before and after the deduction by item ID (the keys
+                of amounts), or None if nothing was deducted
+        """
+        raise NotImplementedError
+    
+    def upsert_items(self, items, transactions):
+        """
+        Add stock by item name, creating the items that do not exist yet, and
+        record the matching transactions, as one bulk write.
+        
+        Existing items only get their quantity incremented; the other fields
+        of each item are used when it is created.
+        
+        Args:
+            items (list): Item documents with unique names; 'quantity' is the
+                amount to add
+            transactions (list): Transaction documents to record
+            
+        Returns:
+            dict: Number of items 'inserted' and 'updated'
+        """
+        raise NotImplementedError
+    
+    def delete_item(self, item_id):
+        raise NotImplementedError
+    
+    def low_stock_items(self):
+        raise NotImplementedError
+    
+    def inventory_totals(self):
+        """
+        Get aggregate figures of the inventory in one query, used to check that
+        an in-memory copy of it has not drifted.
+        
+        Every write sets the 'updated_at' of the items it changes, so the sum
+        of those times changes with any write, including ones that leave the
+        quantity and threshold sums as they were (e.g. a transfer between items).
+        
+        Returns:
+            dict: Number of items 'count', the sums of their 'quantity' and
+                'threshold', and the sum of their 'updated_at' times in
+                milliseconds since the epoch as 'updated' (see updated_millis)
+        """
+        raise NotImplementedError
+    
+    def dashboard_summary(self, chart_limit=10, recent_limit=10):
+        """
+        Get everything the dashboard shows in as few queries as possible.
+        
+        Args:
+            chart_limit (int): Number of items in the inventory chart
+            recent_limit (int): Number of recent transactions
+        
+        Returns:
+            dict: 'total_items', 'low_stock_count', 'recipe_count', 'categories'
+                (category and count), 'chart_items', 'low_stock_items' and
+                'recent_transactions'
+        """
+        raise NotImplementedError
+    
+    # Recipes
+    
+    def list_recipes(self):
+        raise NotImplementedError
+    
+    def get_recipe(self, recipe_id):
+        raise NotImplementedError
+    
+    def get_recipes_by_ids(self, recipe_ids):
+        raise NotImplementedError
+    
+    def get_recipe_by_name(self, name):
+        raise NotImplementedError
+    
+    def get_recipes_using(self, ingredient_names):
+        """
+        Get the recipes that use any of several ingredients.
+        """
+        raise NotImplementedError
+    
+    def insert_recipe(self, recipe):
+        raise NotImplementedError
+    
+    def update_recipe(self, recipe_id, fields):
+        raise NotImplementedError
+    
+    def delete_recipe(self, recipe_id):
+        raise NotImplementedError
+    
+    # Transactions
+    
+    def insert_transactions(self, transactions):
+        """
+        Store transactions. Transactions without a 'seq' are numbered here,
+        when they are stored, rather than when they are recorded; see
+        number_transactions.
+        
+        Args:
+            transactions (list): Transaction documents
+        """
+        raise NotImplementedError
+    
+    def number_transactions(self, transactions):
+        """
+        Give the transactions that have no 'seq' the next sequence numbers of
+        their location's log, in the order given, with one counter update per
+        location. Transactions without a location are stamped with this one.
+        
+        Numbering at insert time keeps the counter off the request path when
+        the write-behind writer stores the log, and means a transaction stored
+        after a snapshot always has a higher number than the snapshot.
+        
+        Args:
+            transactions (list): Transaction documents
+        """
+        unnumbered = {}
+        for transaction in transactions:
+            # Transactions recovered from a spill file keep the location they were recorded at
+            location = transaction.setdefault('location', self.location)
+            if transaction.get('seq') is None:
+                unnumbered.setdefault(location, []).append(transaction)
+        for location, group in unnumbered.items():
+            storage = self if location == self.location else self.for_location(location)
+            first_seq = storage.next_transaction_seq(len(group))
+            for offset, transaction in enumerate(group):
+                transaction['seq'] = first_seq + offset
+    
+    def next_transaction_seq(self, count=1):
+        """
+        Reserve a block of transaction sequence numbers.
+        
+        Sequence numbers increase monotonically across all server processes
+        writing to the same location.
+        
+        Args:
+            count (int): Number of sequence numbers to reserve
+        
+        Returns:
+            int: The first reserved sequence number
+        """
+        raise NotImplementedError
+    
+    def current_transaction_seq(self):
+        """
+        Get the last reserved transaction sequence number (0 if none).
+        """
+        raise NotImplementedError
+    
+    def transactions_after(self, seq, until=None):
+        """
+        Iterate over the transactions after a sequence number, in sequence order.
+        
+        Args:
+            seq (int): Sequence number to start after
+            until (datetime): Only transactions with a timestamp up to this time
+        """
+        raise NotImplementedError
+    
+    def daily_consumption(self, since):
+        """
+        Get the quantity of every item used per day.
+        
+        Args:
+            since (datetime): Start of the period
+        
+        Returns:
+            list: Dicts with 'item_name', 'day' (YYYY-MM-DD) and 'quantity'
+        """
+        raise NotImplementedError
+    
+    # Snapshots
+    
+    def latest_snapshot(self, at=None):
+        """
+        Get the most recent inventory snapshot, or the most recent one taken
+        at or before a point in time.
+        
+        Args:
+            at (datetime): Point in time
+        
+        Returns:
+            dict: Snapshot with 'taken_at', 'seq' and 'items', or None
+        """
+        raise NotImplementedError
+    
+    def insert_snapshot(self, snapshot):
+        raise NotImplementedError
+    
+    # Alert outbox
+    
+    def insert_alerts(self, alerts):
+        raise NotImplementedError
+    
+    def claim_alerts(self, limit, stale_before):
+        """
+        Claim the oldest pending alerts for delivery.
+        
+        Claimed alerts get the status 'sending', so notifiers running in
+        other server processes never deliver the same alert. Claims older than
+        stale_before were left by a notifier that died and are taken over.
+        
+        Args:
+            limit (int): Maximum number of alerts to claim
+            stale_before (datetime): Claims made before this time are taken over
+        
+        Returns:
+            list: The claimed alerts, oldest first
+        """
+        raise NotImplementedError
+    
+    def finish_alerts(self, alert_ids, status):
+        """
+        Release claimed alerts and count the delivery attempt.
+        
+        Args:
+            alert_ids (list): IDs of claimed alerts
+            status (str): 'sent', 'suppressed', 'failed' or 'pending' to retry
+        """
+        raise NotImplementedError
+    
+    def alerted_items(self, names, since):
+        """
+        Get the items among names that had an alert sent since a point in time.
+        
+        Returns:
+            set: Item names
+        """
+        raise NotImplementedError
+    
+    def list_alerts(self, limit=50):
+        raise NotImplementedError
+
+class MongoStorage(StorageBackend):
+    """
+    MongoDB storage (the default).
+    
+    Every query filters on 'location' and every index starts with it, so each
+    query only reads the index entries of its own site and the collections can
+    be sharded on location.
+    """
+    # Indexes created before locations were introduced, replaced by the
+    # location-prefixed ones. The unique name index would keep two sites from
+    # stocking an item with the same name
+    LEGACY_INDEXES = (
+        ('inventory', 'name_1'),
+        ('recipes', 'name_1'),
+        ('transactions', 'timestamp_-1'),
+        ('transactions', 'action_1_timestamp_1'),
+        ('transactions', 'seq_1'),
+        ('snapshots', 'taken_at_-1'),
+        ('alerts', 'status_1_created_at_1'),
+        ('alerts', 'item_name_1_processed_at_-1'),
+    )
+    
+    def __init__(self, db_name='inventra', client=None, location=DEFAULT_LOCATION):
+        """
+        Args:
+            db_name (str): Name of the MongoDB database
+            client: Existing MongoDB client to use instead of connecting to MONGO_URI
+            location (str): Location whose documents are read and written
+        """
+        self.db_name = db_name
+        self.location = check_location(location)
+        self._connect(client if client is not None else MongoClient(MONGO_URI))
+    
+    def _connect(self, client):
+        self.client = client
+        self.db = self.client[self.db_name]
+        self.inventory_collection = self.db['inventory']
+        self.recipes_collection = self.db['recipes']
+        self.transactions_collection = self.db['transactions']
+        self.counters_collection = self.db['counters']
+        self.snapshots_collection = self.db['snapshots']
+        self.alerts_collection = self.db['alerts']
+        self._transactions_supported = None
+    
+    def _scoped(self, query=None):
+        """
+        Restrict a query to the documents of this location.
+        """
+        return {'location': self.location, **(query or {})}
+    
+    def _supports_transactions(self):
+        """
+        Whether the server runs multi-document transactions: replica set
+        members and mongos routers do, standalone servers do not.
+        """
+        if self._transactions_supported is None:
+            try:
+                hello = self.client.admin.command('hello')
+            except Exception:
+                return False
+            self._transactions_supported = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+        return self._transactions_supported
+    
+    def ensure_indexes(self):
+        self._migrate_locations()
+        self.inventory_collection.create_index([('location', pymongo.ASCENDING), ('name', pymongo.ASCENDING)], unique=True)
+        self.recipes_collection.create_index([('location', pymongo.ASCENDING), ('name', pymongo.ASCENDING)], unique=True)
+        # Multikey index over the embedded ingredient names, for get_recipes_using
+        self.recipes_collection.create_index([('location', pymongo.ASCENDING), ('ingredients.name', pymongo.ASCENDING)])
+        self.transactions_collection.create_index([('location', pymongo.ASCENDING), ('timestamp', pymongo.DESCENDING)])
+        self.transactions_collection.create_index([
+            ('location', pymongo.ASCENDING), ('action', pymongo.ASCENDING), ('timestamp', pymongo.ASCENDING)
+        ])
+        # Transactions recorded before sequence numbers were introduced have none
+        self.transactions_collection.create_index(
+            [('location', pymongo.ASCENDING), ('seq', pymongo.ASCENDING)],
+            unique=True, partialFilterExpression={'seq': {'$exists': True}}
+        )
+        self.snapshots_collection.create_index([('location', pymongo.ASCENDING), ('taken_at', pymongo.DESCENDING)])
+        self.alerts_collection.create_index([
+            ('location', pymongo.ASCENDING), ('status', pymongo.ASCENDING), ('created_at', pymongo.ASCENDING)
+        ])
+        self.alerts_collection.create_index([
+            ('location', pymongo.ASCENDING), ('item_name', pymongo.ASCENDING), ('processed_at', pymongo.DESCENDING)
+        ])
+        self.alerts_collection.create_index([('location', pymongo.ASCENDING), ('created_at', pymongo.DESCENDING)])
+    
+    def _migrate_locations(self):
+        """
+        Move documents stored before locations were introduced to the default
+        location and drop the indexes that did not include the location.
+        """
+        for collection in (self.inventory_collection, self.recipes_collection, self.transactions_collection,
+                           self.snapshots_collection, self.alerts_collection):
+            collection.update_many({'location': {'$exists': False}}, {'$set': {'location': DEFAULT_LOCATION}})
+        for collection_name, index_name in self.LEGACY_INDEXES:
+            if index_name in self.db[collection_name].index_information():
+                self.db[collection_name].drop_index(index_name)
+    
+    def ping(self, timeout=1.0):
+        try:
+            with pymongo.timeout(timeout):
+                self.client.admin.command('ping')
+            return True
+        except Exception:
+            return False
+    
+    def reconnect(self):
+        self._connect(MongoClient(MONGO_URI))
+    
+    def close(self):
+        self.client.close()
+    
+    def list_items(self, limit=None):
+        cursor = self.inventory_collection.find(self._scoped())
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+    
+    def get_item(self, item_id):
+        return self.inventory_collection.find_one(self._scoped({'_id': ObjectId(item_id)}))
+    
+    def get_item_by_name(self, name):
+        return self.inventory_collection.find_one(self._scoped({'name': name}))
+    
+    def get_items_by_names(self, names):
+        return list(self.inventory_collection.find(self._scoped({'name': {'$in': list(names)}})))
+    
+    def insert_item(self, item):
+        item['location'] = self.location
+        result = self.inventory_collection.insert_one(item)
+        item['_id'] = result.inserted_id
+        return item
+    
+    def insert_items(self, items):
+        for item in items:
+            item['location'] = self.location
+        if items:
+            self.inventory_collection.insert_many(items)
+        return items
+    
+    def update_item(self, item_id, fields):
+        result = self.inventory_collection.update_one(self._scoped({'_id': ObjectId(item_id)}), {'$set': fields})
+        return result.modified_count > 0
+    
+    def increment_item(self, item_id, amount):
+        self.inventory_collection.update_one(
+            self._scoped({'_id': ObjectId(item_id)}),
+            {'$inc': {'quantity': amount}, '$set': {'updated_at': datetime.now()}}
+        )
+    
+    def deduct_item(self, item_id, amount):
+        query = self._scoped({'_id': ObjectId(item_id)})
+        while True:
+            now = datetime.now()
+            previous_item = self.inventory_collection.find_one_and_update(
+                {**query, 'quantity': {'$gte': amount}},
+                {'$inc': {'quantity': -amount}, '$set': {'updated_at': now}}
+            )
+            if previous_item is not None:
+                return previous_item, {**previous_item, 'quantity': previous_item['quantity'] - amount, 'updated_at': now}
+            # Not enough left; empty the item instead
+            previous_item = self.inventory_collection.find_one_and_update(
+                {**query, 'quantity': {'$not': {'$gte': amount}}},
+                {'$set': {'quantity': 0, 'updated_at': now}}
+            )
+            if previous_item is not None:
+                return previous_item, {**previous_item, 'quantity': 0, 'updated_at': now}
+            # Neither matched if the item was deleted, or restocked in between
+            if self.inventory_collection.find_one(query) is None:
+                return None, None
+    
+    def deduct_quantities(self, amounts, transactions):
+        item_ids = {ObjectId(item_id): item_id for item_id in amounts}
+        if not item_ids:
+            deducted = {}
+        elif self._supports_transactions():
+            with self.client.start_session() as session:
+                deducted = session.with_transaction(lambda session: self._deduct_in_transaction(item_ids, amounts, session))
+        else:
+            deducted = self._deduct_without_transaction(item_ids, amounts)
+        if deducted is not None:
+            self.insert_transactions(transactions)
+        return deducted
+    
+    def _items_to_deduct(self, item_ids, amounts, session=None):
+        """
+        Read the items to deduct from.
+        
+        Returns:
+            dict: The items by ObjectId, or None if one is missing or short
+        """
+        items = {
+            item['_id']: item
+            for item in self.inventory_collection.find(self._scoped({'_id': {'$in': list(item_ids)}}), session=session)
+        }
+        if len(items) < len(item_ids) or any(items[_id]['quantity'] < amounts[item_id] for _id, item_id in item_ids.items()):
+            return None
+        return items
+    
+    def _deductions(self, items, item_ids, amounts, now, upsert=False):
+        # Each write only matches the item with the quantity it was read with,
+        # so the quantities reported before and after are the real ones
+        return [
+            UpdateOne(
+                self._scoped({'_id': _id, 'quantity': items[_id]['quantity']}),
+                {'$inc': {'quantity': -amounts[item_id]}, '$set': {'updated_at': now}},
+                upsert=upsert
+            )
+            for _id, item_id in item_ids.items()
+        ]
+    
+    def _deducted(self, items, item_ids, amounts, now):
+        return {
+            item_id: (items[_id], {**items[_id], 'quantity': items[_id]['quantity'] - amounts[item_id], 'updated_at': now})
+            for _id, item_id in item_ids.items()
+        }
+    
+    def _deduct_in_transaction(self, item_ids, amounts, session):
+        """
+        Read and deduct the items in a session transaction, so other requests
+        never see part of the deduction. An item changed by another writer
+        meanwhile aborts the transaction with a write conflict, and
+        with_transaction runs this again.
+        """
+        items = self._items_to_deduct(item_ids, amounts, session)
+        if items is None:
+            return None
+        now = datetime.now()
+        result = self.inventory_collection.bulk_write(self._deductions(items, item_ids, amounts, now), session=session)
+        if result.matched_count < len(item_ids):
+            session.abort_transaction()
+            return None
+        return self._deducted(items, item_ids, amounts, now)
+    
+    def _deduct_without_transaction(self, item_ids, amounts):
+        """
+        Fallback for standalone servers, which have no transactions.
+        
+        The deductions are written in one ordered bulk write, each matching
+        only the quantity read. If another writer changed an item in between,
+        the deductions written before it are given back, with their previous
+        update times, and the items are read again. Other requests can see
+        such a partial deduction until it is given back.
+        """
+        while True:
+            items = self._items_to_deduct(item_ids, amounts)
+            if items is None:
+                return None
+            now = datetime.now()
+            # An item that changed does not match its filter, so the upsert
+            # tries to insert a document with the item's _id; that fails with
+            # a duplicate key error, which stops the bulk write there. An
+            # upsert only succeeds for an item deleted meanwhile
+            operations = self._deductions(items, item_ids, amounts, now, upsert=True)
+            try:
+                result = self.inventory_collection.bulk_write(operations, ordered=True)
+                applied, upserted = len(operations), set(result.upserted_ids.values())
+            except BulkWriteError as e:
+                error = e.details['writeErrors'][0]
+                if error['code'] != 11000:
+                    raise
+                applied, upserted = error['index'], {upsert['_id'] for upsert in e.details['upserted']}
+            if applied == len(operations) and not upserted:
+                return self._deducted(items, item_ids, amounts, now)
+            
+            if upserted:
+                self.inventory_collection.delete_many(self._scoped({'_id': {'$in': list(upserted)}}))
+            restore = [
+                UpdateOne(
+                    self._scoped({'_id': _id}),
+                    {'$inc': {'quantity': amounts[item_id]}, '$set': {'updated_at': items[_id].get('updated_at')}}
+                )
+                for _id, item_id in list(item_ids.items())[:applied]
+                if _id not in upserted
+            ]
+            if restore:
+                self.inventory_collection.bulk_write(restore, ordered=False)
+    
+    def upsert_items(self, items, transactions):
+        if not items:
+            return {'inserted': 0, 'updated': 0}
+        now = datetime.now()
+        result = self.inventory_collection.bulk_write([
+            UpdateOne(
+                # The location and name of a new item are taken from the filter
+                self._scoped({'name': item['name']}),
+                {
+                    '$inc': {'quantity': item['quantity']},
+                    '$set': {'updated_at': now},
+                    '$setOnInsert': {
+                        key: value for key, value in item.items()
+                        if key not in ('location', 'name', 'quantity', 'updated_at')
+                    }
+                },
+                upsert=True
+            )
+            for item in items
+        ], ordered=False)
+        self.insert_transactions(transactions)
+        return {'inserted': result.upserted_count, 'updated': result.matched_count}
+    
+    def delete_item(self, item_id):
+        result = self.inventory_collection.delete_one(self._scoped({'_id': ObjectId(item_id)}))
+        return result.deleted_count > 0
+    
+    def low_stock_items(self):
+        return list(self.inventory_collection.find(self._scoped({
+            '$expr': {'$lt': ['$quantity', '$threshold']}
+        })))
+    
+    def inventory_totals(self):
+        totals = list(self.inventory_collection.aggregate([
+            {'$match': self._scoped()},
+            {'$group': {
+                '_id': None,
+                'count': {'$sum': 1},
+                'quantity': {'$sum': '$quantity'},
+                'threshold': {'$sum': '$threshold'},
+                # Subtracting two dates gives milliseconds
+                'updated': {'$sum': {'$subtract': ['$updated_at', UNIX_EPOCH]}}
+            }}
+        ]))
+        if not totals:
+            return {'count': 0, 'quantity': 0, 'threshold': 0, 'updated': 0}
+        return {key: totals[0][key] for key in ('count', 'quantity', 'threshold', 'updated')}
+    
+    def dashboard_summary(self, chart_limit=10, recent_limit=10):
+        # All inventory figures come from a single pass over the location's items
+        facets = next(self.inventory_collection.aggregate([{'$match': self._scoped()}, {'$facet': {
+            'totals': [{'$count': 'count'}],
+            'categories': [
+                {'$group': {'_id': {'$ifNull': ['$category', 'Other']}, 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}}
+            ],
+            'chart_items': [
+                {'$limit': chart_limit},
+                {'$project': {'_id': 0, 'name': 1, 'quantity': 1, 'unit': 1}}
+            ],
+            'low_stock_items': [
+                {'$match': {'$expr': {'$lt': ['$quantity', '$threshold']}}},
+                {'$project': {'name': 1, 'quantity': 1, 'unit': 1, 'threshold': 1, 'category': 1}}
+            ]
+        }}]))
+        recent_transactions = list(self.transactions_collection.find(
+            self._scoped(), {'_id': 0}
+        ).sort('timestamp', pymongo.DESCENDING).limit(recent_limit))
+        
+        return {
+            'total_items': facets['totals'][0]['count'] if facets['totals'] else 0,
+            'low_stock_count': len(facets['low_stock_items']),
+            'recipe_count': self.recipes_collection.count_documents(self._scoped()),
+            'categories': [{'category': entry['_id'], 'count': entry['count']} for entry in facets['categories']],
+            'chart_items': facets['chart_items'],
+            'low_stock_items': facets['low_stock_items'],
+            'recent_transactions': recent_transactions
+        }
+    
+    def list_recipes(self):
+        return list(self.recipes_collection.find(self._scoped()))
+    
+    def get_recipe(self, recipe_id):
+        return self.recipes_collection.find_one(self._scoped({'_id': ObjectId(recipe_id)}))
+    
+    def get_recipes_by_ids(self, recipe_ids):
+        return list(self.recipes_collection.find(
+            self._scoped({'_id': {'$in': [ObjectId(recipe_id) for recipe_id in recipe_ids]}})
+        ))
+    
+    def get_recipe_by_name(self, name):
+        return self.recipes_collection.find_one(self._scoped({'name': name}))
+    
+    def get_recipes_using(self, ingredient_names):
+        return list(self.recipes_collection.find(self._scoped({'ingredients.name': {'$in': list(ingredient_names)}})))
+    
+    def insert_recipe(self, recipe):
+        recipe['location'] = self.location
+        result = self.recipes_collection.insert_one(recipe)
+        recipe['_id'] = result.inserted_id
+        return recipe
+    
+    def update_recipe(self, recipe_id, fields):
+        result = self.recipes_collection.update_one(self._scoped({'_id': ObjectId(recipe_id)}), {'$set': fields})
+        return result.modified_count > 0
+    
+    def delete_recipe(self, recipe_id):
+        result = self.recipes_collection.delete_one(self._scoped({'_id': ObjectId(recipe_id)}))
+        return result.deleted_count > 0
+    
+    def insert_transactions(self, transactions):
+        if transactions:
+            self.number_transactions(transactions)
+            # Unordered so a replayed duplicate does not stop the rest of the batch
+            self.transactions_collection.insert_many(transactions, ordered=False)
+    
+    def _counter_id(self):
+        return transaction_counter_id(self.location)
+    
+    def next_transaction_seq(self, count=1):
+        counter = self.counters_collection.find_one_and_update(
+            {'_id': self._counter_id()}, {'$inc': {'seq': count}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return counter['seq'] - count + 1
+    
+    def current_transaction_seq(self):
+        counter = self.counters_collection.find_one({'_id': self._counter_id()})
+        return counter['seq'] if counter else 0
+    
+    def transactions_after(self, seq, until=None):
+        query = self._scoped({'seq': {'$gt': seq}})
+        if until is not None:
+            query['timestamp'] = {'$lte': until}
+        return self.transactions_collection.find(query).sort('seq', pymongo.ASCENDING)
+    
+    def daily_consumption(self, since):
+        return [
+            {'item_name': row['_id']['item_name'], 'day': row['_id']['day'], 'quantity': row['quantity']}
+            for row in self.transactions_collection.aggregate([
+                {'$match': self._scoped({'action': 'subtract', 'timestamp': {'$gte': since}})},
+                {'$group': {
+                    '_id': {
+                        'item_name': '$item_name',
+                        'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp'}}
+                    },
+                    'quantity': {'$sum': '$quantity'}
+                }}
+            ])
+        ]
+    
+    def latest_snapshot(self, at=None):
+        query = self._scoped({'taken_at': {'$lte': at}} if at is not None else None)
+        return self.snapshots_collection.find_one(query, sort=[('taken_at', pymongo.DESCENDING)])
+    
+    def insert_snapshot(self, snapshot):
+        snapshot['location'] = self.location
+        result = self.snapshots_collection.insert_one(snapshot)
+        snapshot['_id'] = result.inserted_id
+        return snapshot
+    
+    def insert_alerts(self, alerts):
+        for alert in alerts:
+            alert['location'] = self.location
+        if alerts:
+            self.alerts_collection.insert_many(alerts)
+    
+    def claim_alerts(self, limit, stale_before):
+        claimable = self._scoped({'$or': [
+            {'status': 'pending'},
+            {'status': 'sending', 'claimed_at': {'$lt': stale_before}}
+        ]})
+        alert_ids = [
+            alert['_id']
+            for alert in self.alerts_collection.find(claimable, {'_id': 1}).sort('created_at', pymongo.ASCENDING).limit(limit)
+        ]
+        if not alert_ids:
+            return []
+        # Matching on claimable again leaves alerts another notifier claimed in between
+        claim = str(ObjectId())
+        self.alerts_collection.update_many(
+            {'_id': {'$in': alert_ids}, **claimable},
+            {'$set': {'status': 'sending', 'claimed_by': claim, 'claimed_at': datetime.now()}}
+        )
+        return list(self.alerts_collection.find(self._scoped({'claimed_by': claim})).sort('created_at', pymongo.ASCENDING))
+    
+    def finish_alerts(self, alert_ids, status):
+        if not alert_ids:
+            return
+        self.alerts_collection.update_many(
+            self._scoped({'_id': {'$in': list(alert_ids)}}),
+            {
+                '$set': {'status': status, 'processed_at': datetime.now()},
+                '$inc': {'attempts': 1},
+                '$unset': {'claimed_by': '', 'claimed_at': ''}
+            }
+        )
+    
+    def alerted_items(self, names, since):
+        return set(self.alerts_collection.distinct('item_name', self._scoped({
+            'item_name': {'$in': list(names)},
+            'status': 'sent',
+            'processed_at': {'$gte': since}
+        })))
+    
+    def list_alerts(self, limit=50):
+        return list(self.alerts_collection.find(self._scoped()).sort('created_at', pymongo.DESCENDING).limit(limit))
+
+class SQLiteStorage(StorageBackend):
+    """
+    Embedded SQLite storage for sites without a reliable link to MongoDB.
+    
+    The database runs in WAL mode so reads never block the writer, and the
+    transaction log is replicated to the central MongoDB in batches by a
+    background thread (see TransactionSync).
+    """
+    ITEM_COLUMNS = ('_id', 'location', 'name', 'quantity', 'unit', 'category', 'threshold', 'created_at', 'updated_at')
+    RECIPE_COLUMNS = ('_id', 'location', 'name', 'ingredients', 'instructions', 'category', 'created_at', 'updated_at')
+    TRANSACTION_COLUMNS = (
+        '_id', 'location', 'action', 'item_name', 'quantity', 'unit', 'description', 'timestamp', 'delta',
+        'previous_name'
+    )
+    ALERT_COLUMNS = (
+        '_id', 'location', 'type', 'item_name', 'quantity', 'threshold', 'unit', 'status', 'attempts',
+        'created_at', 'claimed_by', 'claimed_at', 'processed_at'
+    )
+    ALERT_DATETIME_COLUMNS = ('created_at', 'claimed_at', 'processed_at')
+    SNAPSHOT_COLUMNS = ('_id', 'location', 'taken_at', 'seq', 'items', 'created_at')
+    
+    # Tables whose names are unique per location. Databases created before
+    # locations were introduced have names unique across the whole table,
+    # which SQLite cannot change in place, so _migrate rebuilds them
+    NAMED_TABLES = {
+        'inventory': '''
+            CREATE TABLE IF NOT EXISTS inventory (
+                _id TEXT PRIMARY KEY,
+                location TEXT NOT NULL,
+                name TEXT NOT NULL,
+                quantity NUMERIC NOT NULL DEFAULT 0,
+                unit TEXT,
+                category TEXT,
+                threshold NUMERIC NOT NULL DEFAULT 0,
+                created_at TEXT,
+                updated_at TEXT,
+                extra TEXT,
+                UNIQUE (location, name)
+            )
+        ''',
+        'recipes': '''
+            CREATE TABLE IF NOT EXISTS recipes (
+                _id TEXT PRIMARY KEY,
+                location TEXT NOT NULL,
+                name TEXT NOT NULL,
+                ingredients TEXT NOT NULL,
+                instructions TEXT,
+                category TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                extra TEXT,
+                UNIQUE (location, name)
+            )
+        '''
+    }
+    
+    SCHEMA = ';'.join(NAMED_TABLES.values()) + ''';
+        CREATE TABLE IF NOT EXISTS transactions (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            _id TEXT NOT NULL UNIQUE,
+            location TEXT NOT NULL,
+            action TEXT,
+            item_name TEXT,
+            quantity NUMERIC,
+            unit TEXT,
+            description TEXT,
+            timestamp TEXT,
+            delta NUMERIC,
+            previous_name TEXT,
+            synced INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS snapshots (
+            _id TEXT PRIMARY KEY,
+            location TEXT NOT NULL,
+            taken_at TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            items TEXT NOT NULL,
+            created_at TEXT,
+            extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS alerts (
+            _id TEXT PRIMARY KEY,
+            location TEXT NOT NULL,
+            type TEXT NOT NULL,
+            item_name TEXT NOT NULL,
+            quantity NUMERIC,
+            threshold NUMERIC,
+            unit TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT,
+            claimed_by TEXT,
+            claimed_at TEXT,
+            processed_at TEXT,
+            extra TEXT
+        );
+    '''
+    
+    # Columns added to tables of databases created by older versions
+    MIGRATIONS = (
+        ('transactions', 'delta', 'NUMERIC'),
+        ('transactions', 'previous_name', 'TEXT'),
+        ('transactions', 'location', f"TEXT NOT NULL DEFAULT '{check_location(DEFAULT_LOCATION)}'"),
+        ('snapshots', 'location', f"TEXT NOT NULL DEFAULT '{DEFAULT_LOCATION}'"),
+        ('alerts', 'location', f"TEXT NOT NULL DEFAULT '{DEFAULT_LOCATION}'"),
+    )
+    
+    # Every query filters on location, so the indexes start with it. The
+    # unsynced index serves the sync of all locations at once
+    INDEXES = '''
+        DROP INDEX IF EXISTS inventory_low_stock;
+        DROP INDEX IF EXISTS inventory_category;
+        DROP INDEX IF EXISTS transactions_item_timestamp;
+        DROP INDEX IF EXISTS snapshots_taken_at;
+        DROP INDEX IF EXISTS transactions_action_timestamp;
+        DROP INDEX IF EXISTS alerts_status_created;
+        DROP INDEX IF EXISTS alerts_item_processed;
+        CREATE INDEX IF NOT EXISTS inventory_location_low_stock ON inventory (location, (quantity - threshold));
+        CREATE INDEX IF NOT EXISTS inventory_location_category ON inventory (location, category);
+        CREATE INDEX IF NOT EXISTS transactions_unsynced ON transactions (seq) WHERE synced = 0;
+        CREATE INDEX IF NOT EXISTS transactions_location_seq ON transactions (location, seq);
+        CREATE INDEX IF NOT EXISTS transactions_location_item_timestamp ON transactions (location, item_name, timestamp);
+        CREATE INDEX IF NOT EXISTS transactions_location_action_timestamp ON transactions (location, action, timestamp);
+        CREATE INDEX IF NOT EXISTS snapshots_location_taken_at ON snapshots (location, taken_at);
+        CREATE INDEX IF NOT EXISTS alerts_location_status_created ON alerts (location, status, created_at);
+        CREATE INDEX IF NOT EXISTS alerts_location_item_processed ON alerts (location, item_name, processed_at);
+        CREATE INDEX IF NOT EXISTS alerts_location_created ON alerts (location, created_at);
+    '''
+    
+    def __init__(self, path=SQLITE_PATH, sync_db_name='inventra', location=DEFAULT_LOCATION):
+        """
+        Args:
+            path (str): Path of the SQLite database file
+            sync_db_name (str): MongoDB database the transaction log is synced to
+            location (str): Location whose rows are read and written
+        """
+        self.path = path
+        self.sync_db_name = sync_db_name
+        self.location = check_location(location)
+        self._local = threading.local()
+        self._sync = None
+        self._execute_script(self.SCHEMA)
+        self._migrate()
+    
+    @property
+    def connection(self):
+        """
+        sqlite3.Connection: Connection for the calling thread.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            # In WAL mode NORMAL is still crash-safe and avoids an fsync per commit
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+    
+    def _execute_script(self, script):
+        self.connection.executescript(script)
+    
+    def _migrate(self):
+        connection = self.connection
+        for table, create_table in self.NAMED_TABLES.items():
+            columns = [row['name'] for row in connection.execute(f"PRAGMA table_info({table})")]
+            if 'location' not in columns:
+                self._rebuild_with_location(table, columns, create_table)
+        for table, column, column_type in self.MIGRATIONS:
+            columns = {row['name'] for row in connection.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        # Continue the sequence after rows numbered by AUTOINCREMENT
+        connection.execute(
+            "INSERT OR IGNORE INTO counters (name, value) "
+            "SELECT 'transactions', COALESCE(MAX(seq), 0) FROM transactions"
+        )
+    
+    def _rebuild_with_location(self, table, columns, create_table):
+        # Copy the rows into a table with names unique per location; the rows
+        # of the old table all belong to the default location
+        connection = self.connection
+        column_list = ', '.join(columns)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(f"ALTER TABLE {table} RENAME TO {table}_before_locations")
+            connection.execute(create_table)
+            connection.execute(
+                f"INSERT INTO {table} (location, {column_list}) "
+                f"SELECT ?, {column_list} FROM {table}_before_locations",
+                (DEFAULT_LOCATION,)
+            )
+            connection.execute(f"DROP TABLE {table}_before_locations")
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+    
+    def ensure_indexes(self):
+        self._execute_script(self.INDEXES)
+    
+    def ping(self, timeout=1.0):
+        try:
+            self.connection.execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def reconnect(self):
+        # Connections must not be shared with a forked parent process
+        self._local = threading.local()
+    
+    def close(self):
+        if self._sync:
+            self._sync.stop()
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+    
+    def start_sync(self):
+        """
+        Start replicating the transaction log to the central MongoDB.
+        """
+        if self._sync is None or not self._sync.is_alive():
+            self._sync = TransactionSync(self, db_name=self.sync_db_name)
+            self._sync.start()
+        return self._sync
+    
+    # Row conversion
+    
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, ObjectId):
+            return str(value)
+        return value
+    
+    def _to_row(self, document, columns, json_columns=()):
+        """
+        Split a document into column values and a JSON blob of the other fields.
+        """
+        row = {}
+        extra = {}
+        for key, value in document.items():
+            if key in columns:
+                row[key] = json.dumps(value) if key in json_columns else self._encode_value(value)
+            else:
+                extra[key] = self._encode_value(value)
+        return row, extra
+    
+    @staticmethod
+    def _from_row(row, json_columns=(), datetime_columns=('created_at', 'updated_at')):
+        document = {}
+        for key in row.keys():
+            value = row[key]
+            if key == 'extra':
+                if value:
+                    document.update(json.loads(value))
+            elif value is not None and key in json_columns:
+                document[key] = json.loads(value)
+            elif value is not None and key in datetime_columns:
+                document[key] = datetime.fromisoformat(value)
+            else:
+                document[key] = value
+        return document
+    
+    def _insert(self, table, document, columns, json_columns=()):
+        document.setdefault('_id', str(ObjectId()))
+        document['location'] = self.location
+        row, extra = self._to_row(document, columns, json_columns)
+        row['extra'] = json.dumps(extra) if extra else None
+        self.connection.execute(
+            f"INSERT INTO {table} ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+            list(row.values())
+        )
+        return document
+    
+    def _update(self, table, document_id, fields, columns, json_columns=()):
+        fields = {key: value for key, value in fields.items() if key != '_id'}
+        row, extra = self._to_row(fields, columns, json_columns)
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if extra:
+                current = connection.execute(
+                    f"SELECT extra FROM {table} WHERE _id = ? AND location = ?", (str(document_id), self.location)
+                ).fetchone()
+                if current is None:
+                    connection.execute('ROLLBACK')
+                    return False
+                merged = json.loads(current['extra']) if current['extra'] else {}
+                merged.update(extra)
+                row['extra'] = json.dumps(merged)
+            if not row:
+                connection.execute('ROLLBACK')
+                return False
+            cursor = connection.execute(
+                f"UPDATE {table} SET {', '.join(f'{key} = ?' for key in row)} WHERE _id = ? AND location = ?",
+                [*row.values(), str(document_id), self.location]
+            )
+            connection.execute('COMMIT')
+            return cursor.rowcount > 0
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+    
+    def _fetch_one(self, query, params, json_columns=()):
+        row = self.connection.execute(query, params).fetchone()
+        return self._from_row(row, json_columns) if row else None
+    
+    def _fetch_all(self, query, params=(), json_columns=()):
+        return [self._from_row(row, json_columns) for row in self.connection.execute(query, params)]
+    
+    # Inventory items
+    
+    def list_items(self, limit=None):
+        if limit:
+            return self._fetch_all('SELECT * FROM inventory WHERE location = ? LIMIT ?', (self.location, limit))
+        return self._fetch_all('SELECT * FROM inventory WHERE location = ?', (self.location,))
+    
+    def get_item(self, item_id):
+        return self._fetch_one('SELECT * FROM inventory WHERE _id = ? AND location = ?', (str(item_id), self.location))
+    
+    def get_item_by_name(self, name):
+        return self._fetch_one('SELECT * FROM inventory WHERE location = ? AND name = ?', (self.location, name))
+    
+    def get_items_by_names(self, names):
+        names = list(names)
+        if not names:
+            return []
+        return self._fetch_all(
+            f"SELECT * FROM inventory WHERE location = ? AND name IN ({', '.join('?' * len(names))})",
+            [self.location, *names]
+        )
+    
+    def insert_item(self, item):
+        return self._insert('inventory', item, self.ITEM_COLUMNS)
+    
+    def insert_items(self, items):
+        connection = self.connection
+        connection.execute('BEGIN')
+        try:
+            for item in items:
+                self._insert('inventory', item, self.ITEM_COLUMNS)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return items
+    
+    def update_item(self, item_id, fields):
+        return self._update('inventory', item_id, fields, self.ITEM_COLUMNS)
+    
+    def increment_item(self, item_id, amount):
+        self.connection.execute(
+            'UPDATE inventory SET quantity = quantity + ?, updated_at = ? WHERE _id = ? AND location = ?',
+            (amount, datetime.now().isoformat(), str(item_id), self.location)
+        )
+    
+    def deduct_item(self, item_id, amount):
+        now = datetime.now()
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            previous_item = self._fetch_one(
+                'SELECT * FROM inventory WHERE _id = ? AND location = ?', (str(item_id), self.location)
+            )
+            if previous_item is None:
+                connection.execute('ROLLBACK')
+                return None, None
+            connection.execute(
+                'UPDATE inventory SET quantity = CASE WHEN quantity >= ? THEN quantity - ? ELSE 0 END, '
+                'updated_at = ? WHERE _id = ? AND location = ?',
+                (amount, amount, now.isoformat(), str(item_id), self.location)
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        quantity = previous_item['quantity']
+        return previous_item, {**previous_item, 'quantity': quantity - amount if quantity >= amount else 0, 'updated_at': now}
+    
+    def deduct_quantities(self, amounts, transactions):
+        now = datetime.now()
+        item_ids = {str(item_id): item_id for item_id in amounts}
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            items = {}
+            if item_ids:
+                items = {
+                    item['_id']: item
+                    for item in self._fetch_all(
+                        f"SELECT * FROM inventory WHERE location = ? AND _id IN ({', '.join('?' * len(item_ids))})",
+                        [self.location, *item_ids]
+                    )
+                }
+            if len(items) < len(item_ids) or any(items[_id]['quantity'] < amounts[item_id] for _id, item_id in item_ids.items()):
+                connection.execute('ROLLBACK')
+                return None
+            connection.executemany(
+                'UPDATE inventory SET quantity = quantity - ?, updated_at = ? WHERE _id = ? AND location = ?',
+                [(amounts[item_id], now.isoformat(), _id, self.location) for _id, item_id in item_ids.items()]
+            )
+            self.insert_transactions(transactions)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return {
+            item_id: (items[_id], {**items[_id], 'quantity': items[_id]['quantity'] - amounts[item_id], 'updated_at': now})
+            for _id, item_id in item_ids.items()
+        }
+    
+    def upsert_items(self, items, transactions):
+        if not items:
+            return {'inserted': 0, 'updated': 0}
+        now = datetime.now()
+        rows = []
+        for item in items:
+            item = dict(item, updated_at=now, location=self.location)
+            item.setdefault('_id', str(ObjectId()))
+            row, extra = self._to_row(item, self.ITEM_COLUMNS)
+            row['extra'] = json.dumps(extra) if extra else None
+            rows.append(row)
+        columns = list(self.ITEM_COLUMNS) + ['extra']
+        
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            names = [item['name'] for item in items]
+            existing = connection.execute(
+                f"SELECT COUNT(*) FROM inventory WHERE location = ? AND name IN ({', '.join('?' * len(names))})",
+                [self.location, *names]
+            ).fetchone()[0]
+            connection.executemany(
+                f"INSERT INTO inventory ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                'ON CONFLICT(location, name) DO UPDATE SET quantity = quantity + excluded.quantity, '
+                'updated_at = excluded.updated_at',
+                [[row.get(column) for column in columns] for row in rows]
+            )
+            self.insert_transactions(transactions)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return {'inserted': len(items) - existing, 'updated': existing}
+    
+    def delete_item(self, item_id):
+        cursor = self.connection.execute(
+            'DELETE FROM inventory WHERE _id = ? AND location = ?', (str(item_id), self.location)
+        )
+        return cursor.rowcount > 0
+    
+    def low_stock_items(self):
+        # Written against the expression index on (location, quantity - threshold)
+        return self._fetch_all(
+            'SELECT * FROM inventory WHERE location = ? AND (quantity - threshold) < 0', (self.location,)
+        )
+    
+    def inventory_totals(self):
+        # updated_at is stored in ISO format; its milliseconds are characters 21 to 23
+        count, quantity, threshold, updated = self.connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(threshold), 0), '
+            "COALESCE(SUM(CAST(strftime('%s', updated_at) AS INTEGER) * 1000 + CAST(substr(updated_at, 21, 3) AS INTEGER)), 0) "
+            'FROM inventory WHERE location = ?',
+            (self.location,)
+        ).fetchone()
+        return {'count': count, 'quantity': quantity, 'threshold': threshold, 'updated': updated}
+    
+    def dashboard_summary(self, chart_limit=10, recent_limit=10):
+        connection = self.connection
+        categories = connection.execute(
+            "SELECT COALESCE(category, 'Other') AS category, COUNT(*) AS count FROM inventory "
+            'WHERE location = ? GROUP BY 1 ORDER BY count DESC, category', (self.location,)
+        ).fetchall()
+        low_stock_items = self._fetch_all(
+            'SELECT _id, name, quantity, unit, threshold, category FROM inventory '
+            'WHERE location = ? AND (quantity - threshold) < 0', (self.location,)
+        )
+        recent_transactions = connection.execute(
+            f"SELECT {', '.join(column for column in self.TRANSACTION_COLUMNS if column != '_id')} "
+            'FROM transactions WHERE location = ? ORDER BY seq DESC LIMIT ?', (self.location, recent_limit)
+        ).fetchall()
+        
+        return {
+            'total_items': sum(row['count'] for row in categories),
+            'low_stock_count': len(low_stock_items),
+            'recipe_count': connection.execute(
+                'SELECT COUNT(*) FROM recipes WHERE location = ?', (self.location,)
+            ).fetchone()[0],
+            'categories': [dict(row) for row in categories],
+            'chart_items': [
+                dict(row) for row in
+                connection.execute(
+                    'SELECT name, quantity, unit FROM inventory WHERE location = ? LIMIT ?', (self.location, chart_limit)
+                )
+            ],
+            'low_stock_items': low_stock_items,
+            'recent_transactions': [dict(row) for row in recent_transactions]
+        }
+    
+    # Recipes
+    
+    def list_recipes(self):
+        return self._fetch_all('SELECT * FROM recipes WHERE location = ?', (self.location,), ('ingredients',))
+    
+    def get_recipe(self, recipe_id):
+        return self._fetch_one(
+            'SELECT * FROM recipes WHERE _id = ? AND location = ?', (str(recipe_id), self.location), ('ingredients',)
+        )
+    
+    def get_recipes_by_ids(self, recipe_ids):
+        recipe_ids = [str(recipe_id) for recipe_id in recipe_ids]
+        if not recipe_ids:
+            return []
+        return self._fetch_all(
+            f"SELECT * FROM recipes WHERE location = ? AND _id IN ({', '.join('?' * len(recipe_ids))})",
+            [self.location, *recipe_ids], ('ingredients',)
+        )
+    
+    def get_recipe_by_name(self, name):
+        return self._fetch_one(
+            'SELECT * FROM recipes WHERE location = ? AND name = ?', (self.location, name), ('ingredients',)
+        )
+    
+    def get_recipes_using(self, ingredient_names):
+        ingredient_names = list(ingredient_names)
+        if not ingredient_names:
+            return []
+        # Ingredients are stored as JSON, so each recipe of the location is
+        # searched; edge sites have few recipes
+        return self._fetch_all(
+            'SELECT * FROM recipes WHERE location = ? AND EXISTS ('
+            "SELECT 1 FROM json_each(recipes.ingredients) WHERE json_extract(value, '$.name') "
+            f"IN ({', '.join('?' * len(ingredient_names))}))",
+            [self.location, *ingredient_names], ('ingredients',)
+        )
+    
+    def insert_recipe(self, recipe):
+        return self._insert('recipes', recipe, self.RECIPE_COLUMNS, ('ingredients',))
+    
+    def update_recipe(self, recipe_id, fields):
+        return self._update('recipes', recipe_id, fields, self.RECIPE_COLUMNS, ('ingredients',))
+    
+    def delete_recipe(self, recipe_id):
+        cursor = self.connection.execute(
+            'DELETE FROM recipes WHERE _id = ? AND location = ?', (str(recipe_id), self.location)
+        )
+        return cursor.rowcount > 0
+    
+    # Transactions
+    
+    def insert_transactions(self, transactions):
+        if not transactions:
+            return
+        columns = ('seq',) + self.TRANSACTION_COLUMNS
+        self.number_transactions(transactions)
+        rows = []
+        for transaction in transactions:
+            transaction.setdefault('_id', ObjectId())
+            rows.append([self._encode_value(transaction.get(column)) for column in columns])
+        self.connection.executemany(
+            # Transactions keep their ID, so rows replayed from a spill file are ignored
+            f"INSERT OR IGNORE INTO transactions ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            rows
+        )
+    
+    # Sequence numbers are the primary key of the transactions table, so all
+    # locations in one database share the counter; each location still sees
+    # increasing numbers
+    
+    def next_transaction_seq(self, count=1):
+        connection = self.connection
+        # Inside a caller's transaction (e.g. deduct_quantities), which then holds the write lock
+        started = not connection.in_transaction
+        if started:
+            connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute("UPDATE counters SET value = value + ? WHERE name = 'transactions'", (count,))
+            value = connection.execute("SELECT value FROM counters WHERE name = 'transactions'").fetchone()[0]
+            if started:
+                connection.execute('COMMIT')
+        except Exception:
+            if started:
+                connection.execute('ROLLBACK')
+            raise
+        return value - count + 1
+    
+    def current_transaction_seq(self):
+        return self.connection.execute("SELECT value FROM counters WHERE name = 'transactions'").fetchone()[0]
+    
+    def _transaction_from_row(self, row):
+        transaction = {column: row[column] for column in self.TRANSACTION_COLUMNS if row[column] is not None}
+        transaction['_id'] = ObjectId(transaction['_id'])
+        transaction['timestamp'] = datetime.fromisoformat(transaction['timestamp'])
+        return transaction
+    
+    def transactions_after(self, seq, until=None):
+        if until is not None:
+            cursor = self.connection.execute(
+                'SELECT * FROM transactions WHERE location = ? AND seq > ? AND timestamp <= ? ORDER BY seq',
+                (self.location, seq, self._encode_value(until))
+            )
+        else:
+            cursor = self.connection.execute(
+                'SELECT * FROM transactions WHERE location = ? AND seq > ? ORDER BY seq', (self.location, seq)
+            )
+        for row in cursor:
+            transaction = self._transaction_from_row(row)
+            transaction['seq'] = row['seq']
+            yield transaction
+    
+    def daily_consumption(self, since):
+        rows = self.connection.execute(
+            "SELECT item_name, substr(timestamp, 1, 10) AS day, SUM(quantity) AS quantity FROM transactions "
+            "WHERE location = ? AND action = 'subtract' AND timestamp >= ? GROUP BY item_name, day",
+            (self.location, self._encode_value(since))
+        )
+        return [dict(row) for row in rows]
+    
+    # Snapshots
+    
+    def latest_snapshot(self, at=None):
+        if at is not None:
+            row = self.connection.execute(
+                'SELECT * FROM snapshots WHERE location = ? AND taken_at <= ? ORDER BY taken_at DESC LIMIT 1',
+                (self.location, self._encode_value(at))
+            ).fetchone()
+        else:
+            row = self.connection.execute(
+                'SELECT * FROM snapshots WHERE location = ? ORDER BY taken_at DESC LIMIT 1', (self.location,)
+            ).fetchone()
+        if row is None:
+            return None
+        return self._from_row(row, ('items',), ('taken_at', 'created_at'))
+    
+    def insert_snapshot(self, snapshot):
+        return self._insert('snapshots', snapshot, self.SNAPSHOT_COLUMNS, ('items',))
+    
+    # Alert outbox
+    
+    def _fetch_alerts(self, query, params):
+        return [
+            self._from_row(row, datetime_columns=self.ALERT_DATETIME_COLUMNS)
+            for row in self.connection.execute(query, params)
+        ]
+    
+    def insert_alerts(self, alerts):
+        if not alerts:
+            return
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for alert in alerts:
+                self._insert('alerts', alert, self.ALERT_COLUMNS)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+    
+    def claim_alerts(self, limit, stale_before):
+        claim = str(ObjectId())
+        # A single UPDATE is atomic, so concurrent notifiers never claim the same alert
+        self.connection.execute(
+            "UPDATE alerts SET status = 'sending', claimed_by = ?, claimed_at = ? WHERE _id IN ("
+            "SELECT _id FROM alerts WHERE location = ? "
+            "AND (status = 'pending' OR (status = 'sending' AND claimed_at < ?)) "
+            "ORDER BY created_at LIMIT ?)",
+            (claim, self._encode_value(datetime.now()), self.location, self._encode_value(stale_before), limit)
+        )
+        return self._fetch_alerts('SELECT * FROM alerts WHERE claimed_by = ? ORDER BY created_at', (claim,))
+    
+    def finish_alerts(self, alert_ids, status):
+        if not alert_ids:
+            return
+        alert_ids = [str(alert_id) for alert_id in alert_ids]
+        self.connection.execute(
+            "UPDATE alerts SET status = ?, processed_at = ?, attempts = attempts + 1, "
+            f"claimed_by = NULL, claimed_at = NULL WHERE location = ? AND _id IN ({', '.join('?' * len(alert_ids))})",
+            [status, self._encode_value(datetime.now()), self.location, *alert_ids]
+        )
+    
+    def alerted_items(self, names, since):
+        names = list(names)
+        if not names:
+            return set()
+        rows = self.connection.execute(
+            "SELECT DISTINCT item_name FROM alerts WHERE location = ? AND status = 'sent' AND processed_at >= ? "
+            f"AND item_name IN ({', '.join('?' * len(names))})",
+            [self.location, self._encode_value(since), *names]
+        )
+        return {row['item_name'] for row in rows}
+    
+    def list_alerts(self, limit=50):
+        return self._fetch_alerts(
+            'SELECT * FROM alerts WHERE location = ? ORDER BY created_at DESC LIMIT ?', (self.location, limit)
+        )
+    
+    def unsynced_transactions(self, limit):
+        """
+        Get the oldest transactions not yet replicated to MongoDB, of all locations.
+        
+        Returns:
+            list: (seq, transaction document) tuples
+        """
+        rows = self.connection.execute(
+            'SELECT * FROM transactions WHERE synced = 0 ORDER BY seq LIMIT ?', (limit,)
+        ).fetchall()
+        return [(row['seq'], self._transaction_from_row(row)) for row in rows]
+    
+    def mark_synced(self, seqs):
+        """
+        Mark transactions as replicated.
+        
+        Args:
+            seqs (list): Sequence numbers of the replicated transactions
+        """
+        self.connection.executemany('UPDATE transactions SET synced = 1 WHERE seq = ?', [(seq,) for seq in seqs])
+
+class TransactionSync(threading.Thread):
+    """
+    Background thread replicating the SQLite transaction log to MongoDB in batches.
+    
+    Transactions keep their ObjectId, so a batch that is re-sent after a lost
+    acknowledgement is ignored as a duplicate instead of being recorded twice.
+    """
+    def __init__(self, storage, db_name='inventra', interval=SYNC_INTERVAL, batch_size=SYNC_BATCH_SIZE):
+        super().__init__(name='transaction-sync', daemon=True)
+        self.storage = storage
+        self.db_name = db_name
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._client = None
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def run(self):
+        backoff = self.interval
+        while not self._stop_event.is_set():
+            try:
+                self.sync_once()
+                self.last_error = None
+                backoff = self.interval
+            except Exception as e:
+                # The link is down; keep the rows locally and retry with backoff
+                self.last_error = str(e)
+                backoff = min(backoff * 2, self.interval * 10)
+                print(f"Error syncing transactions: {e}")
+            self._stop_event.wait(backoff)
+    
+    def sync_once(self):
+        """
+        Push every pending transaction to MongoDB.
+        
+        Returns:
+            int: Number of transactions synced
+        """
+        if self._client is None:
+            self._client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+        collection = self._client[self.db_name]['transactions']
+        
+        synced = 0
+        while not self._stop_event.is_set():
+            batch = self.storage.unsynced_transactions(self.batch_size)
+            if not batch:
+                break
+            try:
+                collection.insert_many([transaction for _, transaction in batch], ordered=False)
+            except BulkWriteError as e:
+                # Duplicate keys mean the rows were already synced
+                if any(error['code'] != 11000 for error in e.details.get('writeErrors', [])):
+                    raise
+            self.storage.mark_synced([seq for seq, _ in batch])
+            synced += len(batch)
+            if len(batch) < self.batch_size:
+                break
+        return synced
+
+def create_storage(db_name='inventra', client=None, location=DEFAULT_LOCATION):
+    """
+    Create the storage backend selected by INVENTRA_STORAGE.
+    
+    Args:
+        db_name (str): Name of the MongoDB database
+        client: Existing MongoDB client (forces the MongoDB backend)
+        location (str): Location whose data the backend reads and writes
+    
+    Returns:
+        StorageBackend: The storage backend
+    """
+    if client is None and STORAGE_BACKEND == 'sqlite':
+        return SQLiteStorage(SQLITE_PATH, sync_db_name=db_name, location=location)
+    return MongoStorage(db_name, client=client, location=location)
@@ -1,13 +1,25 @@
 import os
+import csv
+import glob
+import json
+import time
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
 from object_detection import FoodDetector
 
-def test_detection(image_path):
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+def test_detection(image_path, model_path='best.pt'):
     """
     Test the food detection functionality.
     
     Args:
         image_path (str): Path to the test image
+        model_path (str): Path to the YOLOv8 model file
     """
     if not os.path.exists(image_path):
         print(f"Error: Image file not found: {image_path}")
@@ -16,7 +28,7 @@ def test_detection(image_path):
     print(f"Testing food detection on image: {image_path}")
     
     # Initialize the food detector
-    detector = FoodDetector(model_path='best.pt')
+    detector = FoodDetector(model_path=model_path)
     
     # Perform detection
     try:
@@ -48,12 +60,303 @@ def test_detection(image_path):
     except Exception as e:
         print(f"Error during detection: {e}")
 
+def find_images(source):
+    """
+    Resolve a directory or glob pattern to a sorted list of image paths.
+    
+    Args:
+        source (str): Directory or glob pattern (e.g. 'archive/**/*.jpg')
+    
+    Returns:
+        list: Image file paths
+    """
+    if os.path.isdir(source):
+        pattern = os.path.join(source, '**', '*')
+    else:
+        pattern = source
+    
+    return sorted(
+        path for path in glob.glob(pattern, recursive=True)
+        if path.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path)
+    )
+
+def decode_image(path):
+    """
+    Decode an image from disk and time it.
+    
+    Returns:
+        tuple: (path, image or None, decode time in seconds)
+    """
+    start = time.perf_counter()
+    image = cv2.imread(path)
+    return path, image, time.perf_counter() - start
+
+def prefetch_batches(paths, batch_size, executor, prefetch=2):
+    """
+    Yield batches of decoded images while the next batches decode in the background.
+    
+    Args:
+        paths (list): Image paths
+        batch_size (int): Number of images per batch
+        executor (ThreadPoolExecutor): Pool that decodes the images
+        prefetch (int): Number of batches to keep decoding ahead of inference
+    
+    Yields:
+        list: (path, image or None, decode time) tuples
+    """
+    pending = deque()
+    remaining = iter(paths)
+    in_flight = batch_size * (prefetch + 1)
+    
+    for path in remaining:
+        pending.append(executor.submit(decode_image, path))
+        if len(pending) >= in_flight:
+            break
+    
+    while pending:
+        batch = [pending.popleft().result() for _ in range(min(batch_size, len(pending)))]
+        for path in remaining:
+            pending.append(executor.submit(decode_image, path))
+            if len(pending) >= in_flight:
+                break
+        yield batch
+
+def load_yolo_labels(label_path, width, height):
+    """
+    Load YOLO-format labels ("class cx cy w h", normalized) as pixel boxes.
+    
+    Returns:
+        list: (class_id, [x1, y1, x2, y2]) tuples
+    """
+    if not os.path.exists(label_path):
+        return []
+    
+    labels = []
+    with open(label_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            class_id = int(parts[0])
+            cx, cy, w, h = (float(value) for value in parts[1:5])
+            labels.append((class_id, [
+                (cx - w / 2) * width, (cy - h / 2) * height,
+                (cx + w / 2) * width, (cy + h / 2) * height
+            ]))
+    return labels
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def score_detections(detections, labels, class_ids, iou_threshold=0.5):
+    """
+    Greedily match detections to labels of the same class by confidence.
+    
+    Args:
+        detections (list): Detections from FoodDetector
+        labels (list): Ground truth from load_yolo_labels
+        class_ids (dict): Mapping of food name to class ID
+        iou_threshold (float): Minimum IoU for a match
+    
+    Returns:
+        dict: Per-class {'tp', 'fp', 'fn'} counts
+    """
+    counts = {}
+    unmatched = list(labels)
+    
+    for detection in sorted(detections, key=lambda d: d['confidence'], reverse=True):
+        class_id = class_ids.get(detection['food_name'], -1)
+        best_index, best_iou = None, iou_threshold
+        for i, (label_class, label_box) in enumerate(unmatched):
+            if label_class != class_id:
+                continue
+            iou = box_iou(detection['bbox'], label_box)
+            if iou >= best_iou:
+                best_index, best_iou = i, iou
+        
+        class_counts = counts.setdefault(class_id, {'tp': 0, 'fp': 0, 'fn': 0})
+        if best_index is None:
+            class_counts['fp'] += 1
+        else:
+            class_counts['tp'] += 1
+            unmatched.pop(best_index)
+    
+    for label_class, _ in unmatched:
+        counts.setdefault(label_class, {'tp': 0, 'fp': 0, 'fn': 0})['fn'] += 1
+    
+    return counts
+
+class ResultWriter:
+    """
+    Write per-image results as JSONL or CSV depending on the file extension.
+    """
+    CSV_FIELDS = ['image', 'num_detections', 'detected_foods', 'decode_ms', 'inference_ms', 'latency_ms', 'tp', 'fp', 'fn', 'error']
+    
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.csv_writer = None
+        if path.lower().endswith('.csv'):
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=self.CSV_FIELDS, extrasaction='ignore')
+            self.csv_writer.writeheader()
+    
+    def write(self, record):
+        if self.csv_writer:
+            row = dict(record)
+            row['detected_foods'] = json.dumps(record.get('detected_foods', []))
+            self.csv_writer.writerow(row)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+    
+    def close(self):
+        self.file.close()
+
+def evaluate_directory(source, model_path='best.pt', output=None, batch_size=16, workers=4,
+                       prefetch=2, labels_dir=None, iou_threshold=0.5):
+    """
+    Run detection over many images with a single model load, batched inference
+    and a parallel decode pipeline.
+    
+    Args:
+        source (str): Directory or glob pattern of images
+        model_path (str): Path to the YOLOv8 model file
+        output (str): Optional .jsonl or .csv path for per-image results
+        batch_size (int): Images per inference call
+        workers (int): Threads decoding images
+        prefetch (int): Batches decoded ahead of inference
+        labels_dir (str): Optional directory of YOLO-format label files to score against
+        iou_threshold (float): Minimum IoU for a detection to match a label
+    
+    Returns:
+        dict: Aggregate statistics for the run
+    """
+    paths = find_images(source)
+    if not paths:
+        print(f"Error: No images found for: {source}")
+        return None
+    
+    print(f"Evaluating {len(paths)} images from {source} (batch size {batch_size}, {workers} decode workers)")
+    
+    detector = FoodDetector(model_path=model_path)
+    class_ids = {name: class_id for class_id, name in detector.class_names.items()}
+    writer = ResultWriter(output) if output else None
+    totals = {}
+    latencies = []
+    processed = 0
+    failed = 0
+    
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch in prefetch_batches(paths, batch_size, executor, prefetch):
+                decoded = [(path, image, decode_time) for path, image, decode_time in batch if image is not None]
+                for path, image, _ in batch:
+                    if image is None:
+                        failed += 1
+                        if writer:
+                            writer.write({'image': path, 'error': 'Could not decode image'})
+                
+                inference_start = time.perf_counter()
+                batch_results = detector.detect_images([image for _, image, _ in decoded])
+                # Inference runs once per batch, so attribute an equal share to each image
+                inference_time = (time.perf_counter() - inference_start) / max(len(decoded), 1)
+                
+                for (path, image, decode_time), results in zip(decoded, batch_results):
+                    latency = decode_time + inference_time
+                    latencies.append(latency)
+                    processed += 1
+                    record = {
+                        'image': path,
+                        'num_detections': len(results['detections']),
+                        'detected_foods': results['detected_foods'],
+                        'detections': results['detections'],
+                        'decode_ms': round(decode_time * 1000, 3),
+                        'inference_ms': round(inference_time * 1000, 3),
+                        'latency_ms': round(latency * 1000, 3)
+                    }
+                    
+                    if labels_dir:
+                        stem = os.path.splitext(os.path.basename(path))[0]
+                        labels = load_yolo_labels(os.path.join(labels_dir, f"{stem}.txt"), image.shape[1], image.shape[0])
+                        counts = score_detections(results['detections'], labels, class_ids, iou_threshold)
+                        for class_id, class_counts in counts.items():
+                            class_totals = totals.setdefault(class_id, {'tp': 0, 'fp': 0, 'fn': 0})
+                            for key, value in class_counts.items():
+                                class_totals[key] += value
+                        record.update({key: sum(c[key] for c in counts.values()) for key in ('tp', 'fp', 'fn')})
+                    
+                    if writer:
+                        writer.write(record)
+    finally:
+        if writer:
+            writer.close()
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    summary = {
+        'images': processed,
+        'failed': failed,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(processed / elapsed, 2) if elapsed > 0 else None,
+        'mean_latency_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'p95_latency_ms': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 3) if latencies else None
+    }
+    
+    print("\nEvaluation Summary:")
+    print("-" * 50)
+    for key, value in summary.items():
+        print(f"  {key}: {value}")
+    
+    if labels_dir:
+        print(f"\nScores (IoU >= {iou_threshold:.2f}):")
+        print("-" * 50)
+        for class_id, counts in sorted(totals.items()):
+            name = detector.class_names.get(class_id, f"Unknown-{class_id}")
+            precision = counts['tp'] / (counts['tp'] + counts['fp']) if counts['tp'] + counts['fp'] else 0.0
+            recall = counts['tp'] / (counts['tp'] + counts['fn']) if counts['tp'] + counts['fn'] else 0.0
+            print(f"  {name}: precision {precision:.3f}, recall {recall:.3f} ({counts['tp']} TP, {counts['fp']} FP, {counts['fn']} FN)")
+        tp = sum(c['tp'] for c in totals.values())
+        fp = sum(c['fp'] for c in totals.values())
+        fn = sum(c['fn'] for c in totals.values())
+        summary['precision'] = tp / (tp + fp) if tp + fp else 0.0
+        summary['recall'] = tp / (tp + fn) if tp + fn else 0.0
+        print(f"  overall: precision {summary['precision']:.3f}, recall {summary['recall']:.3f}")
+    
+    if output:
+        print(f"\nPer-image results written to: {output}")
+    
+    return summary
+
 def main():
     parser = argparse.ArgumentParser(description='Test food detection using YOLOv8 model')
-    parser.add_argument('--image', type=str, required=True, help='Path to the test image')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--image', type=str, help='Path to the test image')
+    source.add_argument('--dir', type=str, help='Directory or glob pattern of images to evaluate in bulk')
+    parser.add_argument('--model', type=str, default='best.pt', help='Path to the YOLOv8 model file')
+    parser.add_argument('--output', type=str, help='Write per-image results to a .jsonl or .csv file (bulk mode)')
+    parser.add_argument('--batch-size', type=int, default=16, help='Images per inference call (bulk mode)')
+    parser.add_argument('--workers', type=int, default=4, help='Image decoding threads (bulk mode)')
+    parser.add_argument('--prefetch', type=int, default=2, help='Batches decoded ahead of inference (bulk mode)')
+    parser.add_argument('--labels', type=str, help='Directory of YOLO-format label files to score against (bulk mode)')
+    parser.add_argument('--iou', type=float, default=0.5, help='IoU threshold for scoring (bulk mode)')
     args = parser.parse_args()
     
-    test_detection(args.image)
+    if args.image:
+        test_detection(args.image, model_path=args.model)
+    else:
+        evaluate_directory(
+            args.dir,
+            model_path=args.model,
+            output=args.output,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            prefetch=args.prefetch,
+            labels_dir=args.labels,
+            iou_threshold=args.iou
+        )
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
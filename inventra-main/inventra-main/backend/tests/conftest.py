@@ -0,0 +1,44 @@
+import mongomock
+import pytest
+
+from benchmark import StubYOLO
+from storage import MongoStorage
+from inventory_manager import InventoryManager
+from image_store import AnnotatedImageStore
+from object_detection import FoodDetector
+from perf_helpers import RoundTrips, synthetic_jpeg
+
+@pytest.fixture
+def storage():
+    storage = MongoStorage(db_name='inventra_perf', client=mongomock.MongoClient())
+    storage.ensure_indexes()
+    return storage
+
+@pytest.fixture
+def round_trips(storage):
+    return RoundTrips(storage)
+
+@pytest.fixture
+def manager(storage, round_trips):
+    manager = InventoryManager(storage=storage, create_indexes=False)
+    if manager.inventory_index is not None:
+        # Consistency checks are timed; keep them out of the per-operation counts
+        manager.inventory_index.verify_interval = float('inf')
+    return manager
+
+@pytest.fixture
+def stub_model():
+    return StubYOLO(num_boxes=8, image_size=(640, 480))
+
+@pytest.fixture
+def detector(tmp_path, stub_model):
+    return FoodDetector(model=stub_model, image_store=AnnotatedImageStore(directory=str(tmp_path / 'annotated')))
+
+@pytest.fixture(scope='session')
+def jpeg_image():
+    return synthetic_jpeg(640, 480)
+
+@pytest.fixture(scope='session')
+def large_jpeg_image():
+    # A 12 megapixel phone photo
+    return synthetic_jpeg(4000, 3000)
@@ -0,0 +1,92 @@
+"""
+Helpers of the performance regression tests: database round trip counting,
+timing, allocation tracking and synthetic images.
+"""
+import os
+import time
+import tracemalloc
+from collections import Counter
+
+import cv2
+import numpy as np
+
+# Multiplies every time budget, for slow or shared machines
+BUDGET_SCALE = float(os.getenv('INVENTRA_PERF_BUDGET_SCALE', 1))
+
+COLLECTIONS = ('inventory', 'recipes', 'transactions', 'counters', 'snapshots', 'alerts')
+
+class CountingCollection:
+    """
+    Wraps a collection and counts every method called on it; each call is
+    one round trip to the database.
+    """
+    def __init__(self, collection, name, counts):
+        self._collection = collection
+        self._name = name
+        self._counts = counts
+    
+    def __getattr__(self, attribute):
+        value = getattr(self._collection, attribute)
+        if not callable(value) or attribute.startswith('_'):
+            return value
+        
+        def counted(*args, **kwargs):
+            self._counts[f"{self._name}.{attribute}"] += 1
+            return value(*args, **kwargs)
+        return counted
+
+class RoundTrips:
+    """
+    Database calls made by a MongoStorage, by collection and method.
+    """
+    def __init__(self, storage):
+        self.counts = Counter()
+        for name in COLLECTIONS:
+            attribute = f"{name}_collection"
+            setattr(storage, attribute, CountingCollection(getattr(storage, attribute), name, self.counts))
+    
+    @property
+    def total(self):
+        return sum(self.counts.values())
+    
+    def reset(self):
+        self.counts.clear()
+
+def time_per_call(func, iterations=50, warmup=3):
+    """
+    Median seconds per call of func.
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def peak_allocation(func):
+    """
+    Peak bytes allocated by Python (and NumPy) during one call of func.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def assert_time_budget(seconds, budget_ms):
+    budget = budget_ms * BUDGET_SCALE / 1000
+    assert seconds <= budget, f"{seconds * 1000:.3f} ms per call exceeds the {budget * 1000:.3f} ms budget"
+
+def synthetic_jpeg(width, height, seed=0):
+    """
+    Encode a photo-like JPEG: smooth gradients with a little noise, which
+    compresses like a real picture (pure noise would not).
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    image = np.clip(image + rng.integers(-8, 9, size=image.shape), 0, 255).astype(np.uint8)
+    return cv2.imencode('.jpg', image)[1].tobytes()
@@ -0,0 +1,73 @@
+"""
+Performance regression tests of the detection hot path, run against a stub
+YOLO model returning synthetic boxes (no weights, torch or GPU needed).
+"""
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from object_detection import decode_image
+from perf_helpers import time_per_call, peak_allocation, assert_time_budget
+
+def test_detect_upload_time(detector, jpeg_image):
+    # Decoding, stub inference, post-processing and an already stored annotated image
+    seconds = time_per_call(lambda: detector.detect_upload(jpeg_image), iterations=30)
+    assert_time_budget(seconds, 50)
+
+def test_annotated_image_time(detector, jpeg_image):
+    image, scale = decode_image(jpeg_image, detector.image_store.max_size)
+    detections = detector._parse_detections(detector.model(image, verbose=False), scale)
+    
+    def annotate():
+        # Empty the store so the image is drawn and encoded every time
+        shutil.rmtree(detector.image_store.directory, ignore_errors=True)
+        detector._create_annotated_image(jpeg_image, detections, image, scale)
+    
+    seconds = time_per_call(annotate, iterations=10, warmup=1)
+    assert_time_budget(seconds, 500)
+
+def test_post_processing_time(detector, jpeg_image):
+    image, scale = decode_image(jpeg_image)
+    results = detector.model(image, verbose=False)
+    
+    seconds = time_per_call(lambda: detector._summarize_detections(detector._parse_detections(results, scale)),
+                            iterations=200)
+    assert_time_budget(seconds, 2)
+
+def test_calculate_ingredients_time(detector):
+    detected_foods = {food: 2 for food in list(detector.food_ingredients)[:6]}
+    
+    seconds = time_per_call(lambda: detector.calculate_ingredients(detected_foods), iterations=500)
+    assert_time_budget(seconds, 1)
+
+def test_detect_upload_allocations(detector, jpeg_image):
+    detector.detect_upload(jpeg_image)
+    
+    # About two copies of the decoded 640x480 image
+    assert peak_allocation(lambda: detector.detect_upload(jpeg_image)) < 4 * 1024 * 1024
+
+def test_large_upload_is_decoded_at_reduced_size(detector, large_jpeg_image):
+    detector.detect_upload(large_jpeg_image)
+    
+    # The full 4000x3000 image alone would take 36 MB
+    assert peak_allocation(lambda: detector.detect_upload(large_jpeg_image)) < 8 * 1024 * 1024
+
+def test_letterbox_time_and_allocations(detector, jpeg_image):
+    image, _ = decode_image(jpeg_image, detector.image_store.max_size)
+    preprocessor = detector.preprocessor
+    
+    def letterbox():
+        preprocessor.letterbox(image).release()
+    
+    letterbox()
+    assert_time_budget(time_per_call(letterbox, iterations=50), 10)
+    # The model input goes into a pooled buffer instead of new arrays
+    assert peak_allocation(letterbox) < 64 * 1024
+
+def test_concurrent_uploads_reuse_buffers(detector, jpeg_image):
+    preprocessor = detector.preprocessor
+    overflow_count = preprocessor.overflow_count
+    
+    with ThreadPoolExecutor(max_workers=preprocessor.buffers) as executor:
+        list(executor.map(detector.detect_upload, [jpeg_image] * 4 * preprocessor.buffers))
+    
+    assert preprocessor.overflow_count == overflow_count
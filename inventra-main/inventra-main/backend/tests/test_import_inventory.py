@@ -0,0 +1,38 @@
+"""
+Tests of the CSV/NDJSON inventory import.
+"""
+import io
+
+import pytest
+
+from import_inventory import parse_number, import_inventory
+
+@pytest.mark.parametrize('value, expected', [
+    (5, 5), (2.5, 2.5), ('12', 12), (' 3.0 ', 3.0), ('1e3', 1000)
+])
+def test_parse_number(value, expected):
+    result = parse_number(value, 'quantity')
+    assert result == expected and type(result) is type(expected)
+
+@pytest.mark.parametrize('value', [
+    'nan', 'NaN', 'inf', '-Infinity', float('nan'), float('inf'), True, 'ten', ''
+])
+def test_parse_number_rejects_non_numbers(value):
+    with pytest.raises(ValueError, match='Invalid quantity'):
+        parse_number(value, 'quantity')
+
+def test_import_skips_nan_and_infinity(manager):
+    # json.loads accepts the NaN and Infinity literals
+    stream = io.StringIO(
+        '{"name": "flour", "quantity": 5, "unit": "kg"}\n'
+        '{"name": "sugar", "quantity": NaN, "unit": "kg"}\n'
+        '{"name": "salt", "quantity": 1, "unit": "kg", "threshold": Infinity}\n'
+    )
+    summary = import_inventory(manager, stream, 'ndjson')
+    assert (summary['processed'], summary['skipped']) == (1, 2)
+    assert [error['line'] for error in summary['errors']] == [2, 3]
+    
+    stream = io.StringIO('name,quantity,unit\nrice,inf,kg\noats,2,kg\n')
+    summary = import_inventory(manager, stream, 'csv')
+    assert (summary['processed'], summary['skipped']) == (1, 1)
+    assert {item['name']: item['quantity'] for item in manager.storage.list_items()} == {'flour': 5, 'oats': 2}
@@ -0,0 +1,173 @@
+"""
+Performance regression tests of InventoryManager against an in-memory
+stand-in for MongoDB (mongomock). Operations must not make more database
+round trips than they do today, and the number must not grow with the
+number of ingredients; in-memory paths must stay within their time budgets.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from inventory_index import InventoryIndex
+from transaction_log import TransactionWriter
+from feasibility import RecipeFeasibility
+from search import NameIndex, SearchIndex
+from perf_helpers import time_per_call, peak_allocation, assert_time_budget
+
+def items(size):
+    """
+    Generate `size` inventory items, every 20th of them low on stock.
+    """
+    now = datetime.now()
+    return [
+        {'name': f"item-{i:05d}", 'quantity': 1000, 'unit': 'g', 'category': 'Other',
+         'threshold': 2000 if i % 20 == 0 else 10, 'created_at': now, 'updated_at': now}
+        for i in range(size)
+    ]
+
+def seed(manager, size):
+    """
+    Insert `size` items directly, in one round trip.
+    
+    Returns:
+        list: Names of the items
+    """
+    documents = items(size)
+    manager.storage.insert_items(documents)
+    return [item['name'] for item in documents]
+
+def ingredients(names, count):
+    return [{'name': name, 'quantity': 1, 'unit': 'g'} for name in names[1:count + 1]]
+
+def measure_round_trips(round_trips, operation):
+    """
+    Round trips of one call of operation, after a warm-up call that loads
+    the in-memory indexes.
+    """
+    operation()
+    round_trips.reset()
+    operation()
+    return round_trips.total
+
+@pytest.mark.parametrize('ingredient_count', [3, 12])
+def test_update_inventory_from_detection_round_trips(manager, round_trips, ingredient_count):
+    names = seed(manager, 200)
+    detection_results = {
+        'ingredients_needed': ingredients(names, ingredient_count),
+        'detected_foods': [{'name': 'burger', 'count': 1}]
+    }
+    
+    total = measure_round_trips(round_trips, lambda: manager.update_inventory_from_detection(detection_results))
+    
+    # One update per ingredient, plus the transaction sequence and the transactions;
+    # no lookups per ingredient
+    assert total <= ingredient_count + 2, dict(round_trips.counts)
+    assert round_trips.counts['inventory.find_one'] == 0
+
+def test_write_behind_round_trips(manager, round_trips, tmp_path):
+    names = seed(manager, 200)
+    manager.transaction_writer = TransactionWriter(manager.storage, spill_dir=str(tmp_path), flush_interval=3600).start()
+    detection_results = {
+        'ingredients_needed': ingredients(names, 12),
+        'detected_foods': [{'name': 'burger', 'count': 1}]
+    }
+    try:
+        total = measure_round_trips(round_trips, lambda: manager.update_inventory_from_detection(detection_results))
+        counts = dict(round_trips.counts)
+    finally:
+        manager.transaction_writer.close()
+    
+    # Only the updates; the writer numbers and stores the transactions later
+    assert total <= 12, counts
+    assert 'counters.find_one_and_update' not in counts
+
+@pytest.mark.parametrize('ingredient_count', [3, 12])
+def test_prepare_recipe_round_trips(manager, round_trips, ingredient_count):
+    names = seed(manager, 200)
+    recipe = manager.add_recipe('Bench recipe', ingredients(names, ingredient_count))
+    
+    total = measure_round_trips(round_trips, lambda: manager.prepare_recipe(recipe['_id']))
+    
+    # Recipe lookup, transaction sequence, one bulk write, one insert of the
+    # transactions and one read of the quantities written
+    assert total <= 5, dict(round_trips.counts)
+
+def test_prepare_recipes_round_trips(manager, round_trips):
+    names = seed(manager, 200)
+    recipes = [manager.add_recipe(f"Recipe {i}", ingredients(names[i * 5:], 5)) for i in range(5)]
+    orders = [{'recipe_id': recipe['_id'], 'servings': 2} for recipe in recipes]
+    
+    total = measure_round_trips(round_trips, lambda: manager.prepare_recipes(orders))
+    
+    assert total <= 5, dict(round_trips.counts)
+
+def test_add_inventory_item_round_trips(manager, round_trips):
+    seed(manager, 200)
+    
+    total = measure_round_trips(round_trips, lambda: manager.add_inventory_item('item-00007', 1, 'g'))
+    
+    assert total <= 5, dict(round_trips.counts)
+
+def test_update_inventory_item_round_trips(manager, round_trips):
+    seed(manager, 200)
+    item_id = str(manager.storage.get_item_by_name('item-00008')['_id'])
+    
+    total = measure_round_trips(round_trips, lambda: manager.update_inventory_item(item_id, {'quantity': 900}))
+    
+    assert total <= 3, dict(round_trips.counts)
+
+def test_import_items_round_trips(manager, round_trips):
+    names = seed(manager, 200)
+    items = [{'name': name, 'quantity': 1, 'unit': 'g'} for name in names[:100]]
+    
+    total = measure_round_trips(round_trips, lambda: manager.import_items(items, chunk_size=50))
+    
+    # Per chunk: transaction sequence, one bulk upsert and one insert of the transactions
+    assert total <= 2 * 3, dict(round_trips.counts)
+
+def test_read_round_trips(manager, round_trips):
+    seed(manager, 200)
+    search_index = SearchIndex(manager)
+    
+    assert measure_round_trips(round_trips, manager.get_low_stock_items) <= 1
+    assert measure_round_trips(round_trips, manager.get_dashboard_summary) <= 3
+    assert measure_round_trips(round_trips, RecipeFeasibility(manager).compute) <= 1
+    assert measure_round_trips(round_trips, lambda: search_index.search('itme-0001')) <= 2
+    assert measure_round_trips(round_trips, manager.inventory_index.verify) == 1
+
+def test_recipes_using_round_trips(manager, round_trips):
+    names = seed(manager, 200)
+    for i in range(50):
+        manager.add_recipe(f"Recipe {i}", ingredients(names[i * 3:], 4))
+    feasibility = RecipeFeasibility(manager)
+    
+    # The recipes are found in memory and fetched by ID; no scan of the ingredient lists
+    assert measure_round_trips(round_trips, lambda: manager.get_recipes_using(['item-00010'])) <= 1
+    assert measure_round_trips(round_trips, lambda: feasibility.for_ingredients(['item-00010', 'item-00020'])) <= 1
+    assert measure_round_trips(round_trips, lambda: manager.get_recipes_using(['unknown'])) == 0
+
+def test_inventory_index_time():
+    # Loaded from a list rather than mongomock, whose inserts slow down with
+    # every document in a uniquely indexed collection
+    documents = [{**item, '_id': ObjectId()} for item in items(5000)]
+    storage = SimpleNamespace(list_items=lambda: documents)
+    index = InventoryIndex(SimpleNamespace(storage=storage, location='perf'), verify_interval=float('inf'))
+    lookup = [item['name'] for item in documents[100:120]]
+    index.get_items(lookup)
+    
+    assert_time_budget(time_per_call(lambda: index.get_items(lookup), iterations=200), 1)
+    assert_time_budget(time_per_call(index.low_stock_names, iterations=100), 5)
+    assert len(index.low_stock_names()) == 250
+    assert peak_allocation(lambda: index.get_items(lookup)) < 64 * 1024
+
+def test_name_search_time():
+    index = NameIndex()
+    for i in range(5000):
+        index.add(str(i), f"Ingredient {i} {'chicken' if i % 50 == 0 else 'tomato'}")
+    index.add('nuggets', 'Chicken Nuggets')
+    
+    assert index.search('chicken nuggest')[0][1] == 'Chicken Nuggets'
+    assert_time_budget(time_per_call(lambda: index.search('chicken nuggest'), iterations=100), 5)
+    assert_time_budget(time_per_call(lambda: index.search('chi'), iterations=100), 10)
@@ -0,0 +1,124 @@
+"""
+Behaviour tests of the storage backends. Every test runs against both
+MongoStorage (on mongomock) and SQLiteStorage, which must agree.
+"""
+import time
+from datetime import datetime
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+from storage import MongoStorage, SQLiteStorage, TransactionSync
+from inventory_manager import InventoryManager
+from snapshots import InventorySnapshots
+
+@pytest.fixture(params=['mongo', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'mongo':
+        storage = MongoStorage(db_name='inventra_test', client=mongomock.MongoClient())
+        storage.ensure_indexes()
+        return storage
+    return SQLiteStorage(path=str(tmp_path / 'inventra.db'))
+
+def add_item(storage, name, quantity):
+    now = datetime.now()
+    return storage.insert_item({
+        'name': name, 'quantity': quantity, 'unit': 'g', 'category': 'Other', 'threshold': 1,
+        'created_at': now, 'updated_at': now
+    })
+
+def quantities(storage):
+    return {item['name']: item['quantity'] for item in storage.list_items()}
+
+def transaction(name, delta):
+    return {
+        'action': 'add' if delta > 0 else 'subtract', 'item_name': name, 'quantity': abs(delta),
+        'unit': 'g', 'description': '', 'timestamp': datetime.now(), 'delta': delta
+    }
+
+def test_deduct_item_stops_at_zero(backend):
+    item = add_item(backend, 'flour', 5)
+    
+    previous_item, updated_item = backend.deduct_item(item['_id'], 3)
+    assert (previous_item['quantity'], updated_item['quantity']) == (5, 2)
+    previous_item, updated_item = backend.deduct_item(item['_id'], 4)
+    assert (previous_item['quantity'], updated_item['quantity']) == (2, 0)
+    assert quantities(backend) == {'flour': 0}
+    assert backend.deduct_item(str(ObjectId()), 1) == (None, None)
+
+def test_deduct_quantities(backend):
+    flour = add_item(backend, 'flour', 10)
+    egg = add_item(backend, 'egg', 4)
+    
+    deducted = backend.deduct_quantities(
+        {flour['_id']: 3, egg['_id']: 2}, [transaction('flour', -3), transaction('egg', -2)]
+    )
+    assert {item_id: (previous['quantity'], updated['quantity']) for item_id, (previous, updated) in deducted.items()} == {
+        flour['_id']: (10, 7), egg['_id']: (4, 2)
+    }
+    assert quantities(backend) == {'flour': 7, 'egg': 2}
+    assert backend.current_transaction_seq() == 2
+
+def test_deduct_quantities_rejects_short_items(backend):
+    flour = add_item(backend, 'flour', 10)
+    egg = add_item(backend, 'egg', 1)
+    
+    # One short item keeps every item, and the log, unchanged
+    assert backend.deduct_quantities(
+        {flour['_id']: 3, egg['_id']: 2}, [transaction('flour', -3), transaction('egg', -2)]
+    ) is None
+    assert backend.deduct_quantities({flour['_id']: 3, str(ObjectId()): 1}, []) is None
+    assert quantities(backend) == {'flour': 10, 'egg': 1}
+    assert backend.current_transaction_seq() == 0
+
+def test_number_transactions(backend):
+    transactions = [transaction('flour', 1), transaction('egg', 1), {**transaction('egg', 2), 'seq': 99}]
+    backend.number_transactions(transactions)
+    assert [t['seq'] for t in transactions] == [1, 2, 99]
+    
+    # A transaction recorded at another location is numbered in that
+    # location's log (SQLite numbers every location in one sequence)
+    other = [{**transaction('flour', 1), 'location': 'north'}, transaction('flour', 1)]
+    backend.number_transactions(other)
+    assert [t['location'] for t in other] == ['north', backend.location]
+    assert other[0]['seq'] <= backend.for_location('north').current_transaction_seq()
+    assert other[1]['seq'] == backend.current_transaction_seq() > 2
+
+def test_snapshot_replay(backend):
+    manager = InventoryManager(storage=backend, create_indexes=False)
+    snapshots = InventorySnapshots(manager, settle=0)
+    flour = manager.add_inventory_item('flour', 10, 'g')
+    snapshots.take_snapshot()
+    
+    time.sleep(0.01)
+    manager.update_inventory_item(str(flour['_id']), {'quantity': 25})
+    recipe = manager.add_recipe('bread', [{'name': 'flour', 'quantity': 4, 'unit': 'g'}])
+    manager.prepare_recipe(str(recipe['_id']))
+    time.sleep(0.01)
+    middle = datetime.now()
+    time.sleep(0.01)
+    manager.add_inventory_item('egg', 6, 'pc')
+    
+    stock = snapshots.stock_at(middle)
+    assert stock['transactions_replayed'] == 2
+    assert {item['name']: item['quantity'] for item in stock['inventory']} == {'flour': 21}
+    # A snapshot built by replaying the log matches the live inventory
+    snapshot = snapshots.take_snapshot(force=True)
+    assert {item['name']: item['quantity'] for item in snapshot['items']} == quantities(backend) == {'flour': 21, 'egg': 6}
+
+def test_transaction_sync(tmp_path):
+    storage = SQLiteStorage(path=str(tmp_path / 'inventra.db'))
+    storage.insert_transactions([transaction('flour', 5), transaction('egg', 2)])
+    client = mongomock.MongoClient()
+    sync = TransactionSync(storage, db_name='inventra_test')
+    sync._client = client
+    
+    assert sync.sync_once() == 2
+    assert sync.sync_once() == 0
+    assert sorted(t['item_name'] for t in client['inventra_test']['transactions'].find()) == ['egg', 'flour']
+    
+    # A batch sent again after a lost acknowledgement is not recorded twice
+    storage.connection.execute('UPDATE transactions SET synced = 0')
+    assert sync.sync_once() == 2
+    assert client['inventra_test']['transactions'].count_documents({}) == 2
@@ -0,0 +1,263 @@
+import os
+import json
+import glob
+import atexit
+import threading
+from datetime import datetime
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process servers only
+    fcntl = None
+
+# Write-behind settings for the transaction (audit) log
+TRANSACTION_WRITE_BEHIND = os.getenv('INVENTRA_TRANSACTION_WRITE_BEHIND', '1') == '1'
+TRANSACTION_BATCH_SIZE = int(os.getenv('INVENTRA_TRANSACTION_BATCH_SIZE', 200))
+TRANSACTION_FLUSH_INTERVAL = float(os.getenv('INVENTRA_TRANSACTION_FLUSH_INTERVAL', 1.0))
+TRANSACTION_SPILL_DIR = os.getenv('INVENTRA_TRANSACTION_SPILL_DIR', 'transaction_spill')
+# fsync every write: survives power loss, not just a process crash, but costs a disk sync per request
+TRANSACTION_FSYNC = os.getenv('INVENTRA_TRANSACTION_FSYNC', '0') == '1'
+
+def _encode(transaction):
+    return json.dumps({
+        key: value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, ObjectId) else value
+        for key, value in transaction.items()
+    })
+
+def _decode(line):
+    transaction = json.loads(line)
+    transaction['_id'] = ObjectId(transaction['_id'])
+    if transaction.get('timestamp'):
+        transaction['timestamp'] = datetime.fromisoformat(transaction['timestamp'])
+    return transaction
+
+class SpillSegment:
+    """
+    Append-only JSON lines file holding transactions that are not yet in the database.
+    
+    The file stays locked while its owner is alive, so other processes only
+    recover segments left behind by a process that died. It is created and
+    locked under a temporary name that recovery ignores, and only then renamed
+    to its .jsonl path, so no other process can take it before it is locked.
+    """
+    def __init__(self, path):
+        self.path = path
+        temporary_path = f"{path}.tmp"
+        self.file = open(temporary_path, 'a', encoding='utf-8')
+        try:
+            if fcntl:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.rename(temporary_path, path)
+        except Exception:
+            self.file.close()
+            try:
+                os.remove(temporary_path)
+            except FileNotFoundError:
+                pass
+            raise
+    
+    def append(self, transactions, fsync=False):
+        self.file.write(''.join(_encode(transaction) + '\n' for transaction in transactions))
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+    
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class TransactionWriter:
+    """
+    Write-behind buffer for the transaction log.
+    
+    Transactions are appended to a local spill file and kept in memory, and a
+    background thread writes them to the database in batches when the buffer
+    is full or the flush interval has passed. The spill file is deleted once
+    its rows are stored, so rows of a crashed process are recovered on the
+    next start. Every transaction gets its '_id' up front, so re-inserting a
+    recovered row that did reach the database is ignored as a duplicate.
+    """
+    def __init__(self, storage, spill_dir=TRANSACTION_SPILL_DIR, batch_size=TRANSACTION_BATCH_SIZE,
+                 flush_interval=TRANSACTION_FLUSH_INTERVAL, fsync=TRANSACTION_FSYNC):
+        """
+        Args:
+            storage (StorageBackend): Storage the transactions are written to
+            spill_dir (str): Directory for the spill files
+            batch_size (int): Buffered transactions that trigger a flush
+            flush_interval (float): Maximum seconds a transaction stays buffered
+            fsync (bool): fsync the spill file on every write
+        """
+        self.storage = storage
+        self.spill_dir = spill_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._segment = None
+        self._pending_segments = []
+        self._recovery_needed = False
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """
+        Recover rows left behind by earlier processes and start the flush thread.
+        
+        Returns:
+            TransactionWriter: self
+        """
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.recover()
+        with self._lock:
+            self._segment = self._new_segment()
+        self._thread = threading.Thread(target=self._run, name='transaction-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+    
+    def _new_segment(self):
+        path = os.path.join(self.spill_dir, f"{os.getpid()}-{ObjectId()}.jsonl")
+        return SpillSegment(path)
+    
+    def write(self, transactions):
+        """
+        Buffer transactions for writing.
+        
+        Args:
+            transactions (list): Transaction documents
+        """
+        if not transactions:
+            return
+        for transaction in transactions:
+            transaction.setdefault('_id', ObjectId())
+        with self._lock:
+            self._segment.append(transactions, fsync=self.fsync)
+            self._buffer.extend(transactions)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+    
+    def flush(self):
+        """
+        Write every buffered transaction to the database.
+        
+        Returns:
+            int: Number of transactions written
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._buffer:
+                    return 0
+                # New writes go to a fresh segment while this batch is stored. If
+                # it cannot be created, the batch stays buffered in the current one
+                if not self._stop_event.is_set():
+                    try:
+                        segment = self._new_segment()
+                    except Exception as e:
+                        self.last_error = str(e)
+                        print(f"Error creating a transaction spill file: {e}")
+                        return 0
+                else:
+                    segment = self._segment
+                batch = self._buffer
+                self._buffer = []
+                self._pending_segments.append(self._segment)
+                self._segment = segment
+            try:
+                self._insert(batch)
+            except Exception as e:
+                # Keep the rows (and their spill files) and retry on the next flush
+                with self._lock:
+                    self._buffer[:0] = batch
+                self.last_error = str(e)
+                print(f"Error writing transactions: {e}")
+                return 0
+            self.last_error = None
+            with self._lock:
+                segments = [segment for segment in self._pending_segments if segment is not self._segment]
+                self._pending_segments = [segment for segment in self._pending_segments if segment is self._segment]
+            for segment in segments:
+                segment.discard()
+            return len(batch)
+    
+    def _insert(self, batch):
+        try:
+            self.storage.insert_transactions(batch)
+        except BulkWriteError as e:
+            # Duplicate keys are rows that were already written
+            if any(error['code'] != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+    
+    def recover(self):
+        """
+        Write the rows of spill files left behind by processes that stopped
+        before flushing them.
+        
+        Returns:
+            int: Number of transactions recovered
+        """
+        recovered = 0
+        self._recovery_needed = False
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, '*.jsonl'))):
+            try:
+                with open(path, 'r+', encoding='utf-8') as f:
+                    if fcntl:
+                        try:
+                            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except OSError:
+                            continue  # Owned by a running process
+                    # A crash mid-write can leave a partial last line
+                    batch = []
+                    for line in f:
+                        try:
+                            batch.append(_decode(line))
+                        except (ValueError, KeyError):
+                            pass
+                    if batch:
+                        self._insert(batch)
+                    recovered += len(batch)
+                os.remove(path)
+            except Exception as e:
+                self._recovery_needed = True
+                print(f"Error recovering transactions from {path}: {e}")
+        return recovered
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            # The thread must outlive any error; the rows stay buffered and spilled
+            try:
+                self.flush()
+                # Retry recovery that failed at startup; without file locks the
+                # writer cannot tell its own spill files from abandoned ones
+                if self._recovery_needed and fcntl and self.last_error is None:
+                    self.recover()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error in the transaction writer: {e}")
+    
+    def close(self):
+        """
+        Stop the flush thread and write the remaining transactions.
+        """
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self._thread = None
+        self.flush()
+        with self._lock:
+            if not self._buffer and self._segment is not None:
+                self._segment.discard()
+                self._segment = None
@@ -20,16 +20,28 @@ import { Bar } from 'react-chartjs-2';
 import { Chart as ChartJS, CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend } from 'chart.js';
 
 // API services
-import { getInventory, getLowStockItems, getRecipes } from '../services/api';
+import { getDashboard } from '../services/api';
 
 // Register ChartJS components
 ChartJS.register(CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend);
 
+// Signed amount of a transaction. 'delta' is the change in stock; older
+// transactions lack it, and their 'quantity' is the amount added or used
+const formatChange = (transaction) => {
+  const delta = transaction.delta ?? (transaction.action === 'add' ? transaction.quantity : -transaction.quantity);
+  return `${delta >= 0 ? '+' : '-'}${Math.abs(delta)}`;
+};
+
 const Dashboard = () => {
   const navigate = useNavigate();
-  const [inventory, setInventory] = useState([]);
-  const [lowStockItems, setLowStockItems] = useState([]);
-  const [recipes, setRecipes] = useState([]);
+  const [summary, setSummary] = useState({
+    total_items: 0,
+    recipe_count: 0,
+    categories: [],
+    chart_items: [],
+    low_stock_items: [],
+    recent_transactions: []
+  });
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -37,15 +49,10 @@ const Dashboard = () => {
     const fetchDashboardData = async () => {
       try {
         setLoading(true);
-        const [inventoryData, lowStockData, recipesData] = await Promise.all([
-          getInventory(),
-          getLowStockItems(),
-          getRecipes()
-        ]);
+        // Totals and lists are computed server-side in one request
+        const summaryData = await getDashboard();
         
-        setInventory(inventoryData);
-        setLowStockItems(lowStockData);
-        setRecipes(recipesData);
+        setSummary(summaryData);
         setError(null);
       } catch (err) {
         console.error('Error fetching dashboard data:', err);
@@ -58,13 +65,15 @@ const Dashboard = () => {
     fetchDashboardData();
   }, []);
 
+  const lowStockItems = summary.low_stock_items;
+
   // Prepare data for inventory chart
   const chartData = {
-    labels: inventory.slice(0, 10).map(item => item.name),
+    labels: summary.chart_items.map(item => item.name),
     datasets: [
       {
         label: 'Current Quantity',
-        data: inventory.slice(0, 10).map(item => item.quantity),
+        data: summary.chart_items.map(item => item.quantity),
         backgroundColor: 'rgba(63, 81, 181, 0.6)',
         borderColor: 'rgba(63, 81, 181, 1)',
         borderWidth: 1,
@@ -117,11 +126,16 @@ const Dashboard = () => {
             <CardHeader title="Inventory Summary" />
             <CardContent>
               <Typography variant="h3" align="center" color="primary">
-                {inventory.length}
+                {summary.total_items}
               </Typography>
               <Typography variant="subtitle1" align="center">
                 Total Items in Inventory
               </Typography>
+              {summary.categories.length > 0 && (
+                <Typography variant="body2" color="text.secondary" align="center">
+                  {summary.categories.map(entry => `${entry.category}: ${entry.count}`).join(' · ')}
+                </Typography>
+              )}
               <Box sx={{ mt: 2 }}>
                 <Button 
                   variant="contained" 
@@ -173,7 +187,7 @@ const Dashboard = () => {
             <CardHeader title="Recipes" />
             <CardContent>
               <Typography variant="h3" align="center" color="primary">
-                {recipes.length}
+                {summary.recipe_count}
               </Typography>
               <Typography variant="subtitle1" align="center">
                 Available Recipes
@@ -197,7 +211,7 @@ const Dashboard = () => {
             <Typography variant="h6" gutterBottom>
               Inventory Levels
             </Typography>
-            {inventory.length > 0 ? (
+            {summary.chart_items.length > 0 ? (
               <Box sx={{ height: 300 }}>
                 <Bar data={chartData} options={chartOptions} />
               </Box>
@@ -222,7 +236,7 @@ const Dashboard = () => {
                     <ListItem>
                       <ListItemText 
                         primary={item.name} 
-                        secondary={`${item.quantity} ${item.unit} remaining (Min: ${item.minQuantity})`} 
+                        secondary={`${item.quantity} ${item.unit} remaining (Min: ${item.threshold})`} 
                       />
                     </ListItem>
                     <Divider component="li" />
@@ -237,6 +251,34 @@ const Dashboard = () => {
           </Paper>
         </Grid>
 
+        {/* Recent Activity */}
+        <Grid item xs={12}>
+          <Paper sx={{ p: 2 }}>
+            <Typography variant="h6" gutterBottom>
+              Recent Activity
+            </Typography>
+            {summary.recent_transactions.length > 0 ? (
+              <List dense>
+                {summary.recent_transactions.map((transaction, index) => (
+                  <React.Fragment key={index}>
+                    <ListItem>
+                      <ListItemText 
+                        primary={`${formatChange(transaction)} ${transaction.unit} ${transaction.item_name}`} 
+                        secondary={`${transaction.description} · ${new Date(transaction.timestamp).toLocaleString()}`} 
+                      />
+                    </ListItem>
+                    {index < summary.recent_transactions.length - 1 && <Divider component="li" />}
+                  </React.Fragment>
+                ))}
+              </List>
+            ) : (
+              <Typography variant="body1" color="text.secondary" align="center" sx={{ py: 5 }}>
+                No inventory activity yet
+              </Typography>
+            )}
+          </Paper>
+        </Grid>
+
         {/* Quick Actions */}
         <Grid item xs={12}>
           <Paper sx={{ p: 2 }}>
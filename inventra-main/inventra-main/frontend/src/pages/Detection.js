@@ -30,6 +30,40 @@ import SaveIcon from '@mui/icons-material/Save';
 // API services
 import { detectFood } from '../services/api';
 
+// Images are scaled down and re-encoded before upload. The model only looks at
+// 640 px, so a full resolution phone photo mostly costs upload time
+const UPLOAD_MAX_SIZE = 1280;
+const UPLOAD_JPEG_QUALITY = 0.85;
+
+// Scale an image (data URL or File) down to UPLOAD_MAX_SIZE and encode it as JPEG
+const resizeImage = (source) => new Promise((resolve, reject) => {
+  const url = typeof source === 'string' ? source : URL.createObjectURL(source);
+  const image = new Image();
+  image.onload = () => {
+    if (url !== source) URL.revokeObjectURL(url);
+    const scale = Math.min(1, UPLOAD_MAX_SIZE / Math.max(image.naturalWidth, image.naturalHeight));
+    // Small JPEG files are sent as they are
+    if (scale === 1 && source.type === 'image/jpeg') {
+      resolve(source);
+      return;
+    }
+    const canvas = document.createElement('canvas');
+    canvas.width = Math.round(image.naturalWidth * scale);
+    canvas.height = Math.round(image.naturalHeight * scale);
+    canvas.getContext('2d').drawImage(image, 0, 0, canvas.width, canvas.height);
+    canvas.toBlob(
+      (blob) => (blob ? resolve(blob) : reject(new Error('Could not encode the image'))),
+      'image/jpeg',
+      UPLOAD_JPEG_QUALITY
+    );
+  };
+  image.onerror = () => {
+    if (url !== source) URL.revokeObjectURL(url);
+    reject(new Error('Could not read the image'));
+  };
+  image.src = url;
+});
+
 const Detection = () => {
   const [activeTab, setActiveTab] = useState(0);
   const [loading, setLoading] = useState(false);
@@ -85,13 +119,13 @@ const Detection = () => {
       setError(null);
 
       const formData = new FormData();
+      const image = await resizeImage(imageSource);
       
       if (activeTab === 0) { // Webcam
-        // Convert base64 to blob
-        const blob = await fetch(imageSource).then(res => res.blob());
-        formData.append('image', blob, 'webcam-capture.jpg');
+        formData.append('image', image, 'webcam-capture.jpg');
       } else { // File upload
-        formData.append('image', imageSource);
+        // Resized images are JPEG whatever the original format was
+        formData.append('image', image, image === imageSource ? imageSource.name : `${imageSource.name.replace(/\.[^.]+$/, '')}.jpg`);
       }
 
       const response = await detectFood(formData);
@@ -307,10 +341,10 @@ const Detection = () => {
               </Alert>
             ) : detectionResults ? (
               <Box className="detection-results">
-                {detectionResults.annotated_image_path && (
+                {detectionResults.annotated_image_url && (
                   <Box sx={{ mb: 3, textAlign: 'center' }}>
                     <img 
-                      src={`http://localhost:5000${detectionResults.annotated_image_path.replace(/^\./, '')}`} 
+                      src={`http://localhost:5000${detectionResults.annotated_image_url}`} 
                       alt="Annotated" 
                       style={{ maxWidth: '100%', borderRadius: '8px', boxShadow: '0 2px 8px rgba(0,0,0,0.1)' }} 
                     />
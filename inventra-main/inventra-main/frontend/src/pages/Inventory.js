@@ -22,7 +22,8 @@ import {
   Alert,
   CircularProgress,
   Snackbar,
-  Chip
+  Chip,
+  InputAdornment
 } from '@mui/material';
 
 // Icons
@@ -30,11 +31,13 @@ import AddIcon from '@mui/icons-material/Add';
 import EditIcon from '@mui/icons-material/Edit';
 import DeleteIcon from '@mui/icons-material/Delete';
 import WarningIcon from '@mui/icons-material/Warning';
+import SearchIcon from '@mui/icons-material/Search';
 
 // API services
-import { getInventory, addInventoryItem, updateInventoryItem, deleteInventoryItem } from '../services/api';
+import { getInventory, addInventoryItem, updateInventoryItem, deleteInventoryItem, searchByName } from '../services/api';
 
 const unitOptions = ['kg', 'g', 'l', 'ml', 'pcs', 'tbsp', 'tsp', 'cup'];
+const SEARCH_DELAY_MS = 250;
 
 const Inventory = () => {
   const [inventory, setInventory] = useState([]);
@@ -55,11 +58,39 @@ const Inventory = () => {
     message: '',
     severity: 'success'
   });
+  const [searchQuery, setSearchQuery] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
 
   useEffect(() => {
     fetchInventory();
   }, []);
 
+  // Search on the server (ranked, typo tolerant) once typing pauses; re-run after the inventory changes
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSearchResults(null);
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const results = await searchByName(query, 'inventory', 50);
+        if (!cancelled) {
+          setSearchResults(results.inventory);
+        }
+      } catch (err) {
+        console.error('Error searching inventory:', err);
+      }
+    }, SEARCH_DELAY_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, inventory]);
+
+  const displayedItems = searchResults ?? inventory;
+
   const fetchInventory = async () => {
     try {
       setLoading(true);
@@ -220,6 +251,22 @@ const Inventory = () => {
         </Alert>
       )}
 
+      <TextField
+        placeholder="Search items"
+        value={searchQuery}
+        onChange={(e) => setSearchQuery(e.target.value)}
+        fullWidth
+        size="small"
+        sx={{ mb: 2 }}
+        InputProps={{
+          startAdornment: (
+            <InputAdornment position="start">
+              <SearchIcon />
+            </InputAdornment>
+          ),
+        }}
+      />
+
       <TableContainer component={Paper}>
         <Table>
           <TableHead>
@@ -233,8 +280,8 @@ const Inventory = () => {
             </TableRow>
           </TableHead>
           <TableBody>
-            {inventory.length > 0 ? (
-              inventory.map((item) => (
+            {displayedItems.length > 0 ? (
+              displayedItems.map((item) => (
                 <TableRow key={item._id}>
                   <TableCell>{item.name}</TableCell>
                   <TableCell>{item.category || '-'}</TableCell>
@@ -265,7 +312,7 @@ const Inventory = () => {
             ) : (
               <TableRow>
                 <TableCell colSpan={6} align="center">
-                  No inventory items found. Add your first item!
+                  {searchResults ? 'No items match your search.' : 'No inventory items found. Add your first item!'}
                 </TableCell>
               </TableRow>
             )}
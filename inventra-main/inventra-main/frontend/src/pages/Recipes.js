@@ -27,7 +27,8 @@ import {
   Select,
   MenuItem,
   OutlinedInput,
-  Tooltip
+  Tooltip,
+  InputAdornment
 } from '@mui/material';
 
 // Icons
@@ -36,19 +37,24 @@ import EditIcon from '@mui/icons-material/Edit';
 import DeleteIcon from '@mui/icons-material/Delete';
 import RestaurantIcon from '@mui/icons-material/Restaurant';
 import WarningIcon from '@mui/icons-material/Warning';
+import SearchIcon from '@mui/icons-material/Search';
 
 // API services
-import { getRecipes, addRecipe, updateRecipe, deleteRecipe, prepareRecipe, getInventory } from '../services/api';
+import { getRecipes, addRecipe, updateRecipe, deleteRecipe, prepareRecipes, getInventory, getRecipeFeasibility, searchByName } from '../services/api';
+
+const SEARCH_DELAY_MS = 250;
 
 const Recipes = () => {
   const [recipes, setRecipes] = useState([]);
   const [inventory, setInventory] = useState([]);
+  const [feasibility, setFeasibility] = useState({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [openDialog, setOpenDialog] = useState(false);
   const [openDeleteDialog, setOpenDeleteDialog] = useState(false);
   const [openPrepareDialog, setOpenPrepareDialog] = useState(false);
   const [currentRecipe, setCurrentRecipe] = useState(null);
+  const [servings, setServings] = useState(1);
   const [formData, setFormData] = useState({
     name: '',
     description: '',
@@ -64,20 +70,50 @@ const Recipes = () => {
     quantity: '',
     unit: 'g'
   });
+  const [searchQuery, setSearchQuery] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
 
   useEffect(() => {
     fetchData();
   }, []);
 
+  // Search on the server (ranked, typo tolerant) once typing pauses; re-run after the recipes change
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSearchResults(null);
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const results = await searchByName(query, 'recipes', 50);
+        if (!cancelled) {
+          setSearchResults(results.recipes);
+        }
+      } catch (err) {
+        console.error('Error searching recipes:', err);
+      }
+    }, SEARCH_DELAY_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, recipes]);
+
+  const displayedRecipes = searchResults ?? recipes;
+
   const fetchData = async () => {
     try {
       setLoading(true);
-      const [recipesData, inventoryData] = await Promise.all([
+      const [recipesData, inventoryData, feasibilityData] = await Promise.all([
         getRecipes(),
-        getInventory()
+        getInventory(),
+        getRecipeFeasibility()
       ]);
       setRecipes(recipesData);
       setInventory(inventoryData);
+      setFeasibility(Object.fromEntries(feasibilityData.map(entry => [entry.recipe_id, entry])));
       setError(null);
     } catch (err) {
       console.error('Error fetching data:', err);
@@ -126,6 +162,7 @@ const Recipes = () => {
 
   const handleOpenPrepareDialog = (recipe) => {
     setCurrentRecipe(recipe);
+    setServings(1);
     setOpenPrepareDialog(true);
   };
 
@@ -246,10 +283,10 @@ const Recipes = () => {
 
   const handlePrepare = async () => {
     try {
-      await prepareRecipe(currentRecipe._id);
+      await prepareRecipes([{ recipe_id: currentRecipe._id, servings }]);
       setSnackbar({
         open: true,
-        message: `Recipe "${currentRecipe.name}" prepared successfully! Inventory updated.`,
+        message: `Recipe "${currentRecipe.name}" (x${servings}) prepared successfully! Inventory updated.`,
         severity: 'success'
       });
       handleClosePrepareDialog();
@@ -272,29 +309,15 @@ const Recipes = () => {
   };
 
   const checkIngredientAvailability = (recipe) => {
-    if (!inventory.length) return { available: false, missingIngredients: [] };
-    
-    const missingIngredients = [];
-    
-    for (const recipeIngredient of recipe.ingredients) {
-      const inventoryItem = inventory.find(item => 
-        item.name.toLowerCase() === recipeIngredient.name.toLowerCase() && 
-        item.unit === recipeIngredient.unit
-      );
-      
-      if (!inventoryItem || inventoryItem.quantity < recipeIngredient.quantity) {
-        missingIngredients.push({
-          name: recipeIngredient.name,
-          required: recipeIngredient.quantity,
-          available: inventoryItem ? inventoryItem.quantity : 0,
-          unit: recipeIngredient.unit
-        });
-      }
-    }
+    // Computed server-side for all recipes at once (see /api/recipes/feasibility)
+    const entry = feasibility[recipe._id];
+    if (!entry) return { available: false, maxServings: 0, limitingIngredient: null, missingIngredients: [] };
     
     return {
-      available: missingIngredients.length === 0,
-      missingIngredients
+      available: entry.max_servings > 0,
+      maxServings: entry.max_servings,
+      limitingIngredient: entry.limiting_ingredient,
+      missingIngredients: entry.insufficient_ingredients
     };
   };
 
@@ -327,9 +350,25 @@ const Recipes = () => {
         </Alert>
       )}
 
+      <TextField
+        placeholder="Search recipes"
+        value={searchQuery}
+        onChange={(e) => setSearchQuery(e.target.value)}
+        fullWidth
+        size="small"
+        sx={{ mb: 3 }}
+        InputProps={{
+          startAdornment: (
+            <InputAdornment position="start">
+              <SearchIcon />
+            </InputAdornment>
+          ),
+        }}
+      />
+
       <Grid container spacing={3}>
-        {recipes.length > 0 ? (
-          recipes.map((recipe) => {
+        {displayedRecipes.length > 0 ? (
+          displayedRecipes.map((recipe) => {
             const availability = checkIngredientAvailability(recipe);
             
             return (
@@ -341,9 +380,15 @@ const Recipes = () => {
                         {recipe.name}
                       </Typography>
                       {availability.available ? (
-                        <Chip label="Can Prepare" color="success" size="small" />
+                        <Tooltip title={availability.limitingIngredient ? `Limited by ${availability.limitingIngredient.name}` : ''}>
+                          <Chip
+                            label={`Can Prepare (${availability.maxServings})`}
+                            color="success"
+                            size="small"
+                          />
+                        </Tooltip>
                       ) : (
-                        <Tooltip title="Missing ingredients">
+                        <Tooltip title={`Missing ingredients: ${availability.missingIngredients.join(', ')}`}>
                           <Chip icon={<WarningIcon />} label="Insufficient Ingredients" color="error" size="small" />
                         </Tooltip>
                       )}
@@ -360,12 +405,7 @@ const Recipes = () => {
                     </Typography>
                     <List dense>
                       {recipe.ingredients.map((ingredient, index) => {
-                        const inventoryItem = inventory.find(item => 
-                          item.name.toLowerCase() === ingredient.name.toLowerCase() && 
-                          item.unit === ingredient.unit
-                        );
-                        
-                        const isAvailable = inventoryItem && inventoryItem.quantity >= ingredient.quantity;
+                        const isAvailable = !availability.missingIngredients.includes(ingredient.name);
                         
                         return (
                           <React.Fragment key={index}>
@@ -419,7 +459,7 @@ const Recipes = () => {
         ) : (
           <Grid item xs={12}>
             <Alert severity="info">
-              No recipes found. Add your first recipe to get started!
+              {searchResults ? 'No recipes match your search.' : 'No recipes found. Add your first recipe to get started!'}
             </Alert>
           </Grid>
         )}
@@ -578,13 +618,23 @@ const Recipes = () => {
             Are you sure you want to prepare "{currentRecipe?.name}"? This will deduct the required ingredients from your inventory.
           </DialogContentText>
           
+          <TextField
+            label="Servings"
+            type="number"
+            value={servings}
+            onChange={(e) => setServings(Math.max(1, parseInt(e.target.value, 10) || 1))}
+            inputProps={{ min: 1, max: feasibility[currentRecipe?._id]?.max_servings || undefined }}
+            sx={{ mt: 2 }}
+            size="small"
+          />
+          
           {currentRecipe && (
             <List sx={{ mt: 2 }}>
               <Typography variant="subtitle2">Required Ingredients:</Typography>
               {currentRecipe.ingredients.map((ingredient, index) => (
                 <ListItem key={index} dense>
                   <ListItemText 
-                    primary={`${ingredient.name}: ${ingredient.quantity} ${ingredient.unit}`} 
+                    primary={`${ingredient.name}: ${ingredient.quantity * servings} ${ingredient.unit}`} 
                   />
                 </ListItem>
               ))}
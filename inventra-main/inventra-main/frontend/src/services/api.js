@@ -1,11 +1,14 @@
 import axios from 'axios';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000/api';
+// Location (restaurant site) whose inventory is managed; the server's default when unset
+const LOCATION = process.env.REACT_APP_LOCATION;
 
 const api = axios.create({
   baseURL: API_URL,
   headers: {
     'Content-Type': 'application/json',
+    ...(LOCATION ? { 'X-Inventra-Location': LOCATION } : {}),
   },
 });
 
@@ -60,6 +63,42 @@ export const getLowStockItems = async () => {
   }
 };
 
+export const getReorderSuggestions = async (leadTime = 2, coverDays = 7) => {
+  try {
+    const response = await api.get('/reorder-suggestions', {
+      params: { lead_time: leadTime, cover_days: coverDays }
+    });
+    return response.data.suggestions;
+  } catch (error) {
+    console.error('Error fetching reorder suggestions:', error);
+    throw error;
+  }
+};
+
+// Search API calls
+export const searchByName = async (query, type = 'all', limit = 20) => {
+  try {
+    const response = await api.get('/search', {
+      params: { q: query, type, limit }
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error searching:', error);
+    throw error;
+  }
+};
+
+// Dashboard API calls
+export const getDashboard = async () => {
+  try {
+    const response = await api.get('/dashboard');
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching dashboard:', error);
+    throw error;
+  }
+};
+
 // Recipe API calls
 export const getRecipes = async () => {
   try {
@@ -71,6 +110,16 @@ export const getRecipes = async () => {
   }
 };
 
+export const getRecipeFeasibility = async () => {
+  try {
+    const response = await api.get('/recipes/feasibility');
+    return response.data.recipes;
+  } catch (error) {
+    console.error('Error fetching recipe feasibility:', error);
+    throw error;
+  }
+};
+
 export const getRecipe = async (id) => {
   try {
     const response = await api.get(`/recipes/${id}`);
@@ -113,7 +162,7 @@ export const deleteRecipe = async (id) => {
 
 export const prepareRecipe = async (id) => {
   try {
-    const response = await api.post(`/recipes/${id}/prepare`);
+    const response = await api.post(`/prepare-recipe/${id}`);
     return response.data;
   } catch (error) {
     console.error('Error preparing recipe:', error);
@@ -121,10 +170,21 @@ export const prepareRecipe = async (id) => {
   }
 };
 
+// orders: [{ recipe_id, servings }]
+export const prepareRecipes = async (orders) => {
+  try {
+    const response = await api.post('/prepare-recipes', { recipes: orders });
+    return response.data;
+  } catch (error) {
+    console.error('Error preparing recipes:', error);
+    throw error;
+  }
+};
+
 // Food Detection API calls
 export const detectFood = async (formData) => {
   try {
-    const response = await axios.post(`${API_URL}/detect`, formData, {
+    const response = await api.post('/detect', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
       },
@@ -142,11 +202,15 @@ export default {
   updateInventoryItem,
   deleteInventoryItem,
   getLowStockItems,
+  getReorderSuggestions,
+  getDashboard,
   getRecipes,
   getRecipe,
+  getRecipeFeasibility,
   addRecipe,
   updateRecipe,
   deleteRecipe,
   prepareRecipe,
+  prepareRecipes,
   detectFood,
 };
\ No newline at end of file